@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import json
+import time
+import aiohttp
+from tqdm import tqdm
+
+_DONE = object()
+
+class AsyncClassifyEngine:
+    """基于asyncio的分类引擎
+
+    所有请求共享一个带keep-alive连接池的aiohttp会话；API key由StarClassifier的
+    key池分配，每个key最多同时有 max_in_flight_per_key 个请求在途。启用对冲时，
+    先返回的请求胜出，落后的请求被取消。
+    分类结果按 flush_size 批量流式写入数据库。SQLite的读写（读取仓库、认领任务、查询缓存、
+    写入结果）都在线程中执行，不阻塞事件循环上的在途请求。
+    """
+
+    def __init__(self, classifier, max_in_flight_per_key=50):
+        self.classifier = classifier
+        self.max_in_flight_per_key = max(1, max_in_flight_per_key)
+        self.api_url = f"{classifier.config['openai']['api_base']}/chat/completions"
+
+    async def _post(self, http, api_key, payload, estimated_tokens):
+        """异步版本的 StarClassifier._post_openai，请求被取消时同样归还key"""
+        key_pool = self.classifier.key_pool
+        start = time.monotonic()
+        try:
+            async with http.post(
+                self.api_url,
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+                json=payload
+            ) as response:
+                status, headers, text = response.status, response.headers, await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            key_pool.release(api_key, estimated_tokens=estimated_tokens)
+            self.classifier._record_llm_call(api_key, 'error', time.monotonic() - start)
+            raise
+        except asyncio.CancelledError:
+            key_pool.release(api_key, estimated_tokens=estimated_tokens)
+            self.classifier._record_llm_call(api_key, 'cancelled', time.monotonic() - start)
+            raise
+
+        try:
+            body = json.loads(text)
+        except ValueError:
+            body = {}
+        latency = time.monotonic() - start
+        key_pool.release(api_key, status, latency, headers,
+                         estimated_tokens, (body.get('usage') or {}).get('total_tokens'))
+        self.classifier._record_llm_call(api_key, status, latency, body.get('usage'))
+        if status == 200 and self.classifier.hedge is not None:
+            self.classifier.hedge.observe(latency)
+        return status, body, text
+
+    async def _send(self, http, api_key, payload, estimated_tokens):
+        """异步版本的 StarClassifier._send_openai，只有200响应能胜出，落后的请求会被取消"""
+        hedge = self.classifier.hedge
+        delay = hedge.delay() if hedge is not None else None
+        if delay is None:
+            return api_key, await self._post(http, api_key, payload, estimated_tokens)
+
+        primary = asyncio.ensure_future(self._post(http, api_key, payload, estimated_tokens))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not hedge.allow():
+                return api_key, await primary
+            # 对冲请求数受max_ratio限制，不占用max_in_flight_per_key，否则并发打满时无法对冲
+            hedge_key, _ = self.classifier.key_pool.try_acquire(estimated_tokens, exclude={api_key}, strict=True)
+            if hedge_key is None:
+                hedge.refund()
+                self.classifier.metrics.count('llm_hedges', outcome='no_key')
+                return api_key, await primary
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        self.classifier.metrics.count('llm_hedges', outcome='sent')
+        secondary = asyncio.ensure_future(self._post(http, hedge_key, payload, estimated_tokens))
+
+        tasks = {primary: api_key, secondary: hedge_key}
+        fallback = None
+        error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = tasks.pop(task)
+                    try:
+                        result = task.result()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        error = error or e
+                        continue
+                    if result[0] != 200:
+                        fallback = fallback or (key, result)
+                        continue
+                    if task is secondary:
+                        hedge.record_win()
+                        self.classifier.metrics.count('llm_hedges', outcome='won')
+                    return key, result
+            if fallback is not None:
+                return fallback
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _call_openai(self, http, prompt, response_format="", max_tokens=None):
+        """异步版本的 StarClassifier._call_openai"""
+        payload = self.classifier._build_openai_payload(prompt, response_format, max_tokens)
+        cache_key, cached = await asyncio.to_thread(self.classifier._get_cached_result, payload)
+        if cached is not None:
+            return cached
+        key_pool = self.classifier.key_pool
+        estimated_tokens = self.classifier._estimate_tokens(payload)
+        failed_keys = set()
+        try:
+            for _ in range(self.classifier.max_attempts):
+                waited_at = time.monotonic()
+                api_key = await key_pool.acquire_async(estimated_tokens, exclude=failed_keys,
+                                                       max_in_flight=self.max_in_flight_per_key)
+                start = time.monotonic()
+                self.classifier.metrics.observe('queue_wait_seconds', start - waited_at, queue='openai_key_pool')
+                try:
+                    api_key, (status, body, text) = await self._send(http, api_key, payload, estimated_tokens)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"OpenAI API调用失败: {str(e) or type(e).__name__}")
+                    failed_keys.add(api_key)
+                    continue
+
+                if status == 200:
+                    content = body["choices"][0]["message"]["content"]
+                    parsed = json.loads(content)
+                    if cache_key:
+                        await asyncio.to_thread(self.classifier.db.put_cached_response, cache_key, content)
+                    return parsed
+
+                print(f"API调用失败: {status}")
+                print(f"API调用失败: {text}")
+                if not self.classifier._is_retryable_status(status):
+                    return None
+                failed_keys.add(api_key)
+            return None
+        except Exception as e:
+            print(f"OpenAI API调用失败: {str(e)}")
+            return None
+
+    async def _classify_repo(self, http, repo):
+        try:
+            result = await self._call_openai(http, self.classifier._build_classify_prompt(repo))
+            return self.classifier._parse_classification(repo, result, self.classifier._classify_fingerprint(repo))
+        except Exception as e:
+            print(f"处理仓库 {repo['name']} 时出错: {str(e)}")
+            return None
+
+    async def _classify_batch(self, http, repos):
+        """异步版本的 StarClassifier._classify_batch_results"""
+        if len(repos) == 1:
+            result = await self._classify_repo(http, repos[0])
+            return [result] if result else []
+        try:
+            prompt = self.classifier._build_batch_classify_prompt(repos)
+            result = await self._call_openai(http, prompt, max_tokens=self.classifier._batch_max_tokens(len(repos)))
+            results, missing = self.classifier._match_batch_results(repos, result)
+        except Exception as e:
+            print(f"批量分类 {len(repos)} 个仓库时出错: {str(e)}")
+            results, missing = [], repos
+        if not missing:
+            return results
+        if len(missing) < len(repos):
+            return results + await self._classify_batch(http, missing)
+        middle = len(repos) // 2
+        return (await self._classify_batch(http, repos[:middle])
+                + await self._classify_batch(http, repos[middle:]))
+
+    async def _flush(self, buffer):
+        """在线程中提交一批结果，不阻塞事件循环"""
+        return await asyncio.to_thread(self.classifier._save_classifications, buffer)
+
+    async def classify(self, repos, total=None, batch_size=1):
+        """并发分类所有仓库
+
+        Args:
+            repos: 可迭代的仓库信息字典
+            total (int): 仓库总数，用于显示进度
+            batch_size (int): 每次请求打包的仓库数量
+
+        Returns:
+            int: 成功分类并写入数据库的仓库数量
+        """
+        concurrency = self.max_in_flight_per_key * len(self.classifier.key_pool.keys)
+
+        # 有界队列：生产者不会一次性为所有仓库创建任务
+        pending = asyncio.Queue(maxsize=concurrency * 2)
+        results = asyncio.Queue()
+        # 对冲请求需要额外的连接
+        connector = aiohttp.TCPConnector(limit=concurrency * (2 if self.classifier.hedge else 1),
+                                         keepalive_timeout=60)
+        connect_timeout, read_timeout = self.classifier.openai_timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+        iterator = iter(repos)
+
+        async def produce():
+            while True:
+                # 遍历仓库时会认领任务、读取数据库，每次在线程中取出一段
+                chunk = await asyncio.to_thread(list, itertools.islice(iterator, batch_size * 50))
+                if not chunk:
+                    break
+                for start in range(0, len(chunk), batch_size):
+                    await pending.put(chunk[start:start + batch_size])
+            for _ in range(concurrency):
+                await pending.put(None)
+
+        async def worker():
+            while True:
+                batch = await pending.get()
+                if batch is None:
+                    return
+                if len(batch) > 1:
+                    await results.put((len(batch), await self._classify_batch(http, batch)))
+                else:
+                    result = await self._classify_repo(http, batch[0])
+                    await results.put((1, [result] if result else []))
+
+        async def consume(progress):
+            success_count = 0
+            buffer = []
+            while True:
+                item = await results.get()
+                if item is _DONE:
+                    break
+                processed, batch_results = item
+                progress.update(processed)
+                buffer.extend(batch_results)
+                if len(buffer) >= self.classifier.flush_size:
+                    success_count += await self._flush(buffer)
+                    buffer = []
+            return success_count + await self._flush(buffer)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+            with tqdm(total=total, desc="分类仓库") as progress:
+                consumer = asyncio.create_task(consume(progress))
+                try:
+                    await asyncio.gather(produce(), *(worker() for _ in range(concurrency)))
+                finally:
+                    await results.put(_DONE)
+                return await consumer
+
+    def run(self, repos, total=None, batch_size=1):
+        return asyncio.run(self.classify(repos, total, max(1, batch_size)))
@@ -0,0 +1,129 @@
+import json
+import os
+
+class BatchApi:
+    """OpenAI兼容Batch API的离线分类
+
+    export把每个待分类仓库写成一行 /chat/completions 请求（custom_id为仓库名），
+    按单个文件的请求数和字节数上限分片；apply_results流式读取平台返回的结果文件，
+    按与classify相同的规则校验分类后批量写入数据库。两个步骤都只读写本地文件，
+    上传文件、创建和下载批处理任务由用户在平台上完成。
+    """
+
+    def __init__(self, classifier, max_requests=50000, max_bytes=190 * 1024 * 1024,
+                 url='/v1/chat/completions', chunk_size=500):
+        self.classifier = classifier
+        self.max_requests = max(1, max_requests)
+        self.max_bytes = max_bytes
+        self.url = url
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _shard_path(output, index):
+        stem, suffix = os.path.splitext(output)
+        return f"{stem}-{index:03d}{suffix or '.jsonl'}"
+
+    def export(self, names, output):
+        """把仓库的分类请求写入分片的JSONL文件
+
+        Args:
+            names (list): 待分类的仓库名
+            output (str): 输出路径，实际文件为 <stem>-001.jsonl、<stem>-002.jsonl ...
+
+        Returns:
+            list: (文件路径, 请求数) 列表
+        """
+        output_dir = os.path.dirname(output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        shards = []
+        file = None
+        size = 0
+        try:
+            for repo in self.classifier.db.iter_repos_by_names(names):
+                prompt = self.classifier._build_classify_prompt(repo)
+                line = json.dumps({
+                    "custom_id": repo['name'],
+                    "method": "POST",
+                    "url": self.url,
+                    "body": self.classifier._build_openai_payload(prompt),
+                }, ensure_ascii=False).encode('utf-8') + b'\n'
+                if file is None or shards[-1][1] >= self.max_requests or size + len(line) > self.max_bytes:
+                    if file is not None:
+                        file.close()
+                    path = self._shard_path(output, len(shards) + 1)
+                    file = open(path, 'wb')
+                    shards.append([path, 0])
+                    size = 0
+                file.write(line)
+                shards[-1][1] += 1
+                size += len(line)
+        finally:
+            if file is not None:
+                file.close()
+        return [tuple(shard) for shard in shards]
+
+    @staticmethod
+    def _parse_line(line):
+        """解析一行批处理结果
+
+        Returns:
+            tuple: (custom_id, result, error)，成功时error为None
+        """
+        item = json.loads(line)
+        custom_id = item.get('custom_id')
+        if item.get('error'):
+            return custom_id, None, str(item['error'])
+        response = item.get('response') or {}
+        if response.get('status_code') != 200:
+            return custom_id, None, f"HTTP {response.get('status_code')}"
+        try:
+            content = response['body']['choices'][0]['message']['content']
+            result = json.loads(content)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            return custom_id, None, f"无法解析模型输出: {str(e)}"
+        if not isinstance(result, dict):
+            return custom_id, None, "模型输出不是JSON对象"
+        return custom_id, result, None
+
+    def _iter_results(self, paths, stats):
+        """逐行读取所有结果文件，生成 (仓库名, 模型输出)"""
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        custom_id, result, error = self._parse_line(line)
+                    except ValueError:
+                        custom_id, result, error = None, None, f"{path}:{line_number} 不是有效的JSON"
+                    if error:
+                        stats['failed'] += 1
+                        if len(stats['errors']) < 10:
+                            stats['errors'].append(f"{custom_id}: {error}")
+                        continue
+                    yield custom_id, result
+
+    def apply_results(self, paths):
+        """流式读取批处理结果文件并批量写入分类和总结
+
+        Args:
+            paths (list): 平台返回的结果JSONL文件
+
+        Returns:
+            dict: applied/failed/unknown 计数和前几条错误信息
+        """
+        classifier = self.classifier
+        stats = {'applied': 0, 'failed': 0, 'unknown': 0, 'errors': []}
+        for chunk in classifier._chunked(self._iter_results(paths, stats), self.chunk_size):
+            results = dict(chunk)
+            # 指纹按当前的仓库信息计算，与classify写入的指纹一致
+            parsed = []
+            for repo in classifier.db.iter_repos_by_names(list(results)):
+                fingerprint = classifier._classify_fingerprint(repo)
+                parsed.append(classifier._parse_classification(repo, results.pop(repo['name']), fingerprint))
+            stats['unknown'] += len(results)
+            stats['applied'] += classifier._save_classifications(
+                [result for result in parsed if result], source='batch'
+            )
+        return stats
@@ -0,0 +1,330 @@
+import base64
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CATEGORIES = ['信息搜集', 'AI应用', '逆向破解', 'Web安全', '云安全', 'DevOps', '开发工具&框架', '其他']
+
+WORDS = [
+    'scanner', 'fuzzer', 'proxy', 'burp', 'plugin', 'llm', 'agent', 'cloud', 'aws', 'kubernetes',
+    'reverse', 'ghidra', 'exploit', 'xss', 'sql', 'injection', 'osint', 'recon', 'wordlist', 'jwt',
+    'docker', 'framework', 'cli', 'tool', 'fast', 'python', 'go', 'rust', '漏洞', '扫描', '逆向', '信息收集',
+]
+
+def fake_repo(index):
+    """第index个模拟仓库，内容只由index决定，多次运行结果一致"""
+    rng = random.Random(index)
+    words = rng.sample(WORDS, 6)
+    return {
+        "name": f"owner{index % 97}/repo-{index}",
+        "description": ' '.join(words),
+        "language": rng.choice(['Python', 'Go', 'Rust', 'JavaScript', 'C']),
+        "topics": words[:3],
+        "readme": f"# repo-{index}\n\n" + ' '.join(rng.choices(WORDS, k=150)),
+        "pushed_at": "2024-01-01T00:00:00Z",
+    }
+
+class MockServer(ThreadingHTTPServer):
+    """带可配置延迟、抖动和429注入的本地HTTP服务
+
+    capacity 不为None时模拟服务端的并发上限：同时处理的请求超过该值时返回429。
+    每个请求以 tail_rate 的概率额外延迟 tail_latency 秒，模拟长尾延迟。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.02, jitter=0.01, error_rate=0.0, retry_after=1, seed=0,
+                 capacity=None, tail_rate=0.0, tail_latency=0.0):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.in_flight = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # 客户端取消请求（如对冲请求中落后的一方）时连接被关闭，不打印异常
+        pass
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {key: 0 for key in self.stats}
+
+    def simulate(self, throttle=True):
+        """记录请求并模拟网络延迟
+
+        Returns:
+            bool: 是否应返回429
+        """
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            if self.rng.random() < self.tail_rate:
+                delay += self.tail_latency
+            throttled = throttle and (self.rng.random() < self.error_rate
+                                      or self.capacity is not None and self.in_flight >= self.capacity)
+            if throttled:
+                self.stats['throttled'] += 1
+            self.in_flight += 1
+        try:
+            time.sleep(delay)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return throttled
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send(self, status, body=b'', headers=None, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+    def log_message(self, *args):
+        pass
+
+class _GitHubHandler(_Handler):
+    def rate_limit_headers(self):
+        server = self.server
+        token = self.headers.get('Authorization', '')
+        with server.lock:
+            used = server.token_usage[token] = server.token_usage.get(token, 0) + 1
+        return {
+            'X-RateLimit-Limit': server.quota,
+            'X-RateLimit-Remaining': max(0, server.quota - used),
+            'X-RateLimit-Reset': int(server.reset_at),
+        }
+
+    def viewer(self):
+        """Authorization头中的token对应的用户名"""
+        token = self.headers.get('Authorization', '').split()[-1:]
+        return self.server.token_users.get(token[0] if token else '', 'bench')
+
+    def throttle(self):
+        self.send(429, {'message': 'API rate limit exceeded (mock)'},
+                  {'Retry-After': self.server.retry_after, **self.rate_limit_headers()})
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/user':
+            server.simulate(throttle=False)
+            login = self.viewer()
+            return self.send(200, {'login': login, 'id': server.user_offset(login) + 1,
+                                   'url': f'{server.url}/users/{login}'}, self.rate_limit_headers())
+
+        match = re.match(r'^/users/([^/]+)$', url.path)
+        if match:
+            server.simulate(throttle=False)
+            login = match.group(1)
+            return self.send(200, {'login': login, 'id': server.user_offset(login) + 1,
+                                   'url': f'{server.url}/users/{login}'}, self.rate_limit_headers())
+
+        match = re.match(r'^/users?(?:/([^/]+))?/starred$', url.path)
+        if match:
+            # PyGithub翻页时不会重试429，列表页只模拟延迟
+            server.simulate(throttle=False)
+            offset = server.user_offset(match.group(1) or self.viewer())
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', ['30'])[0])
+            items = []
+            for position in range((page - 1) * per_page, min(page * per_page, server.repo_count)):
+                index = offset + position
+                repo = fake_repo(index)
+                owner, name = repo['name'].split('/')
+                items.append({
+                    'id': index + 1,
+                    'name': name,
+                    'full_name': repo['name'],
+                    'owner': {'login': owner},
+                    'description': repo['description'],
+                    'language': repo['language'],
+                    'topics': repo['topics'],
+                    'html_url': f"https://github.com/{repo['name']}",
+                    'url': f"{server.url}/repos/{repo['name']}",
+                    'pushed_at': repo['pushed_at'],
+                })
+            headers = self.rate_limit_headers()
+            if page * per_page < server.repo_count:
+                headers['Link'] = f'<{server.url}{url.path}?per_page={per_page}&page={page + 1}>; rel="next"'
+            return self.send(200, items, headers)
+
+        match = re.match(r'^/repos/([^/]+/[^/]+)/readme$', url.path)
+        if match:
+            if server.simulate():
+                return self.throttle()
+            with server.lock:
+                server.stats['readme'] += 1
+            if server.readme_status is not None:
+                return self.send(server.readme_status, {'message': 'mock error'}, self.rate_limit_headers())
+            index = int(match.group(1).rsplit('-', 1)[-1])
+            etag = f'"readme-{index}"'
+            if self.headers.get('If-None-Match') == etag:
+                return self.send(304, headers={'ETag': etag, **self.rate_limit_headers()})
+            readme = fake_repo(index)['readme']
+            if 'raw' in self.headers.get('Accept', ''):
+                return self.send(200, readme.encode('utf-8'), {'ETag': etag, **self.rate_limit_headers()},
+                                 content_type='text/plain; charset=utf-8')
+            body = {'encoding': 'base64', 'content': base64.b64encode(readme.encode('utf-8')).decode('ascii')}
+            return self.send(200, body, {'ETag': etag, **self.rate_limit_headers()})
+
+        server.simulate(throttle=False)
+        self.send(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        server = self.server
+        if urlparse(self.path).path != '/graphql':
+            return self.send(404, {'message': 'Not Found'})
+        body = self.read_json()
+        if server.simulate():
+            return self.throttle()
+        variables = body.get('variables', {})
+        offset = server.user_offset(variables.get('login') or self.viewer())
+        start = int(variables.get('cursor') or 0)
+        end = min(start + variables.get('first', 100), server.repo_count)
+        nodes = []
+        for position in range(start, end):
+            repo = fake_repo(offset + position)
+            nodes.append({
+                'nameWithOwner': repo['name'],
+                'description': repo['description'],
+                'url': f"https://github.com/{repo['name']}",
+                'pushedAt': repo['pushed_at'],
+                'primaryLanguage': {'name': repo['language']},
+                'repositoryTopics': {'nodes': [{'topic': {'name': topic}} for topic in repo['topics']]},
+                'readme': {'text': repo['readme']},
+                'readmeLower': None,
+            })
+        data = {'user' if variables.get('login') else 'viewer': {'starredRepositories': {
+            'pageInfo': {'hasNextPage': end < server.repo_count, 'endCursor': str(end)},
+            'edges': [{'starredAt': '2024-01-01T00:00:00Z'} for _ in nodes],
+            'nodes': nodes,
+        }}}
+        self.send(200, {'data': data}, self.rate_limit_headers())
+
+class MockGitHub(MockServer):
+    """模拟GitHub REST/GraphQL API：star列表分页、topics、README（支持ETag）和限流响应头
+
+    每个用户都star了repo_count个仓库；其他用户的star列表相对token用户偏移
+    user_overlap 之外的部分，用来模拟多个账号之间的重复star。
+    token_users 把token映射到用户名，viewer查询和 /user、/user/starred 按请求使用的token
+    返回对应用户的数据，其他token都属于默认用户bench。
+    readme_status 不为None时README接口固定返回该状态码，模拟服务端错误或仓库没有README。
+    """
+
+    def __init__(self, repo_count=1000, quota=1_000_000, user_overlap=0.5, token_users=None, **kwargs):
+        super().__init__(_GitHubHandler, **kwargs)
+        self.repo_count = repo_count
+        self.quota = quota
+        self.user_overlap = user_overlap
+        self.reset_at = time.time() + 3600
+        self.token_usage = {}
+        self.users = {}
+        self.token_users = dict(token_users or {})
+        self.readme_status = None
+        self.stats['readme'] = 0
+
+    def user_offset(self, login=None):
+        """用户star列表在模拟仓库序列中的起点，默认用户bench为0"""
+        if not login or login == 'bench':
+            return 0
+        with self.lock:
+            position = self.users.setdefault(login, len(self.users) + 1)
+        return int(position * self.repo_count * (1 - self.user_overlap))
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        server = self.server
+        if not urlparse(self.path).path.endswith('/chat/completions'):
+            return self.send(404, {'error': 'not found'})
+        body = self.read_json()
+        if server.simulate():
+            return self.send(429, {'error': {'message': 'rate limited (mock)'}},
+                             {'Retry-After': server.retry_after})
+        prompt = body['messages'][-1]['content']
+        names = re.findall(r'仓库名称：(\S+)', prompt)
+        # 从提示词中的分类列表里选择，分类列表变化后返回的也是新分类
+        match = re.search(r'可选的分类类别：(.+)', prompt)
+        categories = [category.strip() for category in match.group(1).split(',')] if match else CATEGORIES
+        rng = random.Random(prompt)
+
+        def classify(name):
+            return {'name': name, 'category': rng.choice(categories),
+                    'confidence': round(rng.uniform(0.3, 1.0), 2), 'summary': f'{name} 的模拟总结'}
+
+        def batch_item(name):
+            if not server.batch_error_rate or rng.random() >= server.batch_error_rate:
+                return classify(name)
+            # 模型遗漏该项，或返回格式错误的分类
+            return None if rng.random() < 0.5 else {'name': name, 'category': None}
+
+        if '"results"' in prompt:
+            items = [batch_item(name) for name in names]
+            content = {'results': [item for item in items if item is not None]}
+        else:
+            content = classify(names[0] if names else '')
+        content = json.dumps(content, ensure_ascii=False)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = 30 * max(1, len(names))
+        finish_reason = 'stop'
+        max_tokens = body.get('max_tokens')
+        if max_tokens and completion_tokens > max_tokens:
+            # 超过max_tokens的输出被截断，JSON不完整
+            content = content[:len(content) * max_tokens // completion_tokens]
+            completion_tokens = max_tokens
+            finish_reason = 'length'
+        self.send(200, {
+            'choices': [{'message': {'role': 'assistant', 'content': content}, 'finish_reason': finish_reason}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+class MockOpenAI(MockServer):
+    """模拟OpenAI兼容的 /chat/completions 接口，支持单个和批量分类提示词
+
+    每个仓库的输出按30个token计，超过请求的max_tokens时输出被截断；
+    batch_error_rate 为批量请求中每一项被遗漏或返回格式错误的概率。
+    """
+
+    def __init__(self, batch_error_rate=0.0, **kwargs):
+        super().__init__(_OpenAIHandler, **kwargs)
+        self.batch_error_rate = batch_error_rate
@@ -0,0 +1,353 @@
+"""性能基准测试
+
+启动本地模拟的GitHub API和OpenAI兼容接口，用真实的StarClassifier跑完整流程，
+输出可在不同提交之间对比的JSON结果。
+
+用法（在仓库根目录执行）：
+    python -m bench.run --sizes 1000 10000 50000 --output bench.json
+    python -m bench.run --sizes 1000 --scenarios classify --error-rate 0.02 --baseline bench.json
+"""
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench.mock_servers import CATEGORIES, MockGitHub, MockOpenAI, fake_repo
+
+SCENARIOS = ('fetch-rest', 'fetch-graphql', 'classify', 'db')
+
+# 嵌套调用（如批量分类二分重试）只记录最外层的耗时
+_depth = contextvars.ContextVar('bench_depth', default=0)
+
+def timed(fn, samples):
+    """包装函数，把每次最外层调用的耗时（秒）追加到samples"""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            token = _depth.set(_depth.get() + 1)
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _depth.reset(token)
+                if _depth.get() == 0:
+                    samples.append(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _depth.set(_depth.get() + 1)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _depth.reset(token)
+            if _depth.get() == 0:
+                samples.append(time.perf_counter() - start)
+    return wrapper
+
+def timed_writes(fn, stats):
+    """包装数据库批量写入方法，累计写入行数和耗时"""
+    @functools.wraps(fn)
+    def wrapper(self, rows, *args, **kwargs):
+        rows = list(rows)
+        start = time.perf_counter()
+        try:
+            return fn(self, rows, *args, **kwargs)
+        finally:
+            stats['rows'] += len(rows)
+            stats['seconds'] += time.perf_counter() - start
+    return wrapper
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def latency_summary(samples, unit):
+    return {
+        'unit': unit,
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 2) if samples else None,
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2) if samples else None,
+    }
+
+def bench_config(args):
+    """生成指向模拟服务的config.yaml内容，限速参数放宽到不成为瓶颈"""
+    return {
+        'github': {
+            'token': 'bench-token-0',
+            'tokens': [f'bench-token-{index}' for index in range(args.github_tokens)],
+            'username': 'bench',
+            'api_url': args.github_url,
+            'graphql_url': f'{args.github_url}/graphql',
+            'rate_limit': {
+                'requests_per_second': 100000,
+                'burst': 1000,
+                'reserve': 0,
+                'secondary_wait': args.retry_after,
+                'max_retries': 10,
+                'max_deferred_rounds': 5,
+            },
+        },
+        'openai': {
+            'api_base': args.openai_url,
+            'api_keys': [f'bench-key-{index}' for index in range(args.openai_keys)],
+            'model': 'bench-model',
+            'key_pool': {'cooldown': args.retry_after, 'max_attempts': 5},
+            'cache': {'enabled': False},
+            'hedge': {'enabled': args.hedge},
+        },
+        'concurrency': {
+            'fetch': {'max_workers': args.fetch_workers, 'adaptive': {'enabled': args.adaptive, 'max': 64}},
+            'classify': {'max_workers': args.classify_workers, 'max_in_flight_per_key': args.max_in_flight_per_key,
+                         'adaptive': {'enabled': args.adaptive, 'max': 64}},
+        },
+        'database': {'path': 'stars.db', 'flush_size': args.flush_size},
+        'categories': CATEGORIES,
+    }
+
+def seed_database(db, size, flush_size):
+    """写入size个模拟仓库，返回写入耗时"""
+    start = time.perf_counter()
+    batch = []
+    for index in range(size):
+        repo = fake_repo(index)
+        repo['url'] = f"https://github.com/{repo['name']}"
+        batch.append(repo)
+        if len(batch) >= flush_size:
+            db.save_repos(batch)
+            batch = []
+    db.save_repos(batch)
+    return time.perf_counter() - start
+
+def run_child(args):
+    """在独立进程中运行单个场景，保证峰值RSS互不影响"""
+    import yaml
+    from db import Database
+    from star_classifier import StarClassifier
+    from async_classifier import AsyncClassifyEngine
+    from github_graphql import GraphQLStarFetcher
+
+    workdir = tempfile.mkdtemp(prefix='star-bench-')
+    os.chdir(workdir)
+    with open('config.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump(bench_config(args), f, allow_unicode=True)
+
+    samples = []
+    writes = {'rows': 0, 'seconds': 0.0}
+    Database.save_repos = timed_writes(Database.save_repos, writes)
+    Database.update_repo_classification = timed_writes(Database.update_repo_classification, writes)
+
+    classifier = StarClassifier()
+    result = {'scenario': args.child, 'size': args.size}
+    unit = 'repo'
+    start = time.perf_counter()
+    if args.child == 'fetch-rest':
+        StarClassifier._process_single_repo = timed(StarClassifier._process_single_repo, samples)
+        start = time.perf_counter()
+        classifier.fetch_starred_repos('rest')
+    elif args.child == 'fetch-graphql':
+        GraphQLStarFetcher._query = timed(GraphQLStarFetcher._query, samples)
+        unit = 'page'
+        start = time.perf_counter()
+        classifier.fetch_starred_repos('graphql')
+    elif args.child == 'classify':
+        seed_database(classifier.db, args.size, args.flush_size)
+        writes.update(rows=0, seconds=0.0)
+        if args.batch_size > 1:
+            unit = 'batch'
+        StarClassifier._classify_repo_result = timed(StarClassifier._classify_repo_result, samples)
+        StarClassifier._classify_batch_results = timed(StarClassifier._classify_batch_results, samples)
+        AsyncClassifyEngine._classify_repo = timed(AsyncClassifyEngine._classify_repo, samples)
+        AsyncClassifyEngine._classify_batch = timed(AsyncClassifyEngine._classify_batch, samples)
+        start = time.perf_counter()
+        classifier.classify_all_repos(use_async=args.use_async, force=True, batch_size=args.batch_size)
+    elif args.child == 'db':
+        # 只测数据库：批量写入、更新分类和全表流式读取
+        seed_database(classifier.db, args.size, args.flush_size)
+        names = [fake_repo(index)['name'] for index in range(args.size)]
+        for offset in range(0, len(names), args.flush_size):
+            classifier.db.update_repo_classification(
+                (name, CATEGORIES[index % len(CATEGORIES)], 'summary', None, None)
+                for index, name in enumerate(names[offset:offset + args.flush_size])
+            )
+        scan_start = time.perf_counter()
+        scanned = sum(1 for _ in classifier.db.iter_repos())
+        scan_seconds = time.perf_counter() - scan_start
+        result['scan'] = {'rows': scanned, 'rows_per_sec': round(scanned / max(scan_seconds, 1e-9), 1)}
+    elapsed = time.perf_counter() - start
+
+    processed = classifier.db.count_repos() if args.child != 'classify' else \
+        classifier.db.count_repos("classify_fingerprint IS NOT NULL")
+    classifier.classify_executor.shutdown(wait=True)
+    classifier.db.close()
+
+    result.update({
+        'processed': processed,
+        'seconds': round(elapsed, 3),
+        'repos_per_sec': round(processed / max(elapsed, 1e-9), 1),
+        'latency': latency_summary(samples, unit),
+        'db_write': {
+            'rows': writes['rows'],
+            'seconds': round(writes['seconds'], 3),
+            'rows_per_sec': round(writes['rows'] / writes['seconds'], 1) if writes['seconds'] else None,
+        },
+        # Linux下ru_maxrss单位为KB
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.chdir(ROOT)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+def child_command(args, scenario, size, github, openai, result_file):
+    command = [
+        sys.executable, '-m', 'bench.run',
+        '--child', scenario,
+        '--size', str(size),
+        '--github-url', github.url,
+        '--openai-url', openai.url,
+        '--result-file', result_file,
+        '--retry-after', str(args.retry_after),
+        '--github-tokens', str(args.github_tokens),
+        '--openai-keys', str(args.openai_keys),
+        '--fetch-workers', str(args.fetch_workers),
+        '--classify-workers', str(args.classify_workers),
+        '--max-in-flight-per-key', str(args.max_in_flight_per_key),
+        '--batch-size', str(args.batch_size),
+        '--flush-size', str(args.flush_size),
+    ]
+    if args.use_async:
+        command.append('--async')
+    if args.adaptive:
+        command.append('--adaptive')
+    if args.hedge:
+        command.append('--hedge')
+    return command
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_comparison(report, baseline_path):
+    """与之前的结果对比吞吐量、p99和峰值内存"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(item['scenario'], item['size']): item for item in baseline.get('results', [])}
+    print(f"\n与 {baseline_path}（{baseline.get('commit')}）对比：")
+    for item in report['results']:
+        old = previous.get((item['scenario'], item['size']))
+        if not old:
+            continue
+        change = (item['repos_per_sec'] / old['repos_per_sec'] - 1) * 100 if old['repos_per_sec'] else 0
+        print(f"- {item['scenario']} @ {item['size']}: "
+              f"{old['repos_per_sec']} → {item['repos_per_sec']} repos/s ({change:+.1f}%), "
+              f"p99 {old['latency']['p99_ms']} → {item['latency']['p99_ms']} ms, "
+              f"RSS {old['peak_rss_mb']} → {item['peak_rss_mb']} MB")
+
+def run(args):
+    github = MockGitHub(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        retry_after=args.retry_after, capacity=args.capacity).start()
+    openai = MockOpenAI(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.error_rate,
+                        retry_after=args.retry_after, capacity=args.capacity,
+                        tail_rate=args.llm_tail_rate, tail_latency=args.llm_tail_latency).start()
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'params': {key: value for key, value in vars(args).items()
+                   if key not in ('child', 'result_file', 'output', 'baseline', 'verbose')},
+        'results': [],
+    }
+    try:
+        for size in args.sizes:
+            github.repo_count = size
+            for scenario in args.scenarios:
+                github.reset_stats()
+                openai.reset_stats()
+                with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                    result_file = f.name
+                output = None if args.verbose else subprocess.DEVNULL
+                completed = subprocess.run(child_command(args, scenario, size, github, openai, result_file),
+                                           cwd=ROOT, stdout=output, stderr=output)
+                if completed.returncode != 0:
+                    print(f"{scenario} @ {size} 运行失败，退出码 {completed.returncode}（使用 --verbose 查看输出）")
+                    continue
+                with open(result_file, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+                os.remove(result_file)
+                result['mock'] = {'github': dict(github.stats), 'openai': dict(openai.stats)}
+                report['results'].append(result)
+                print(f"{scenario} @ {size}: {result['repos_per_sec']} repos/s, "
+                      f"p50 {result['latency']['p50_ms']} ms, p99 {result['latency']['p99_ms']} ms "
+                      f"(每{result['latency']['unit']}), 写入 {result['db_write']['rows_per_sec']} 行/s, "
+                      f"峰值RSS {result['peak_rss_mb']} MB")
+    finally:
+        github.stop()
+        openai.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+    if args.baseline:
+        print_comparison(report, args.baseline)
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM-Star-Classifier 性能基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000], help='模拟的star仓库数量')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help='要运行的场景')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟GitHub的平均延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.01, help='模拟GitHub延迟的抖动（秒）')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='模拟LLM的平均延迟（秒）')
+    parser.add_argument('--llm-jitter', type=float, default=0.1, help='模拟LLM延迟的抖动（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='README/GraphQL/LLM请求返回429的概率')
+    parser.add_argument('--retry-after', type=float, default=1, help='429响应的Retry-After秒数')
+    parser.add_argument('--github-tokens', type=int, default=1, help='GitHub token数量')
+    parser.add_argument('--openai-keys', type=int, default=4, help='OpenAI API key数量')
+    parser.add_argument('--fetch-workers', type=int, default=16, help='concurrency.fetch.max_workers')
+    parser.add_argument('--classify-workers', type=int, default=32, help='concurrency.classify.max_workers')
+    parser.add_argument('--max-in-flight-per-key', type=int, default=50, help='classify --async 每个key的在途请求数')
+    parser.add_argument('--batch-size', type=int, default=1, help='classify --batch-size')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='使用asyncio分类引擎')
+    parser.add_argument('--adaptive', action='store_true', help='启用获取和分类的AIMD自适应并发')
+    parser.add_argument('--capacity', type=int, help='模拟服务的并发上限，超过时返回429')
+    parser.add_argument('--llm-tail-rate', type=float, default=0.0, help='模拟LLM请求落入长尾的概率')
+    parser.add_argument('--llm-tail-latency', type=float, default=0.0, help='长尾请求额外的延迟（秒）')
+    parser.add_argument('--hedge', action='store_true', help='启用LLM对冲请求')
+    parser.add_argument('--flush-size', type=int, default=100, help='database.flush_size')
+    parser.add_argument('--output', default='bench-results.json', help='结果JSON文件')
+    parser.add_argument('--baseline', help='用于对比的历史结果JSON文件')
+    parser.add_argument('--verbose', action='store_true', help='显示被测进程的输出')
+    # 以下参数由父进程传给子进程
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--github-url', help=argparse.SUPPRESS)
+    parser.add_argument('--openai-url', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+    else:
+        run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import threading
+import time
+from contextlib import contextmanager
+
+class AdaptiveLimiter:
+    """AIMD（加性增、乘性减）自适应并发限制器
+
+    请求成功且延迟不超过基线的latency_tolerance倍时，每完成约"当前上限"个请求上限加1；
+    遇到限流（429/403）或超时时上限乘以decrease。上次减小之前就已发出的请求报告的限流
+    不会再次减小上限，一批同时返回的429只减一次。上限始终在 [min_limit, max_limit] 之内，
+    上限的每次变化都记录下来，用于观察各服务实际能维持的稳定并发数。
+    """
+
+    def __init__(self, name, initial, min_limit=1, max_limit=32, decrease=0.5, latency_tolerance=2.0,
+                 metrics=None):
+        """
+        Args:
+            name (str): 阶段名称，用于指标标签和日志
+            initial (int): 初始并发上限
+            min_limit (int): 并发上限的下界
+            max_limit (int): 并发上限的上界，也是需要准备的工作线程数
+            decrease (float): 限流时上限乘以的系数
+            latency_tolerance (float): 延迟超过基线的该倍数时不再增加上限
+            metrics: 可选的Metrics实例
+        """
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.metrics = metrics
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        # 慢速向上跟随的最小延迟，作为"健康"延迟的基线
+        self._baseline = None
+        self._last_decrease = 0.0
+        self.started_at = time.monotonic()
+        self._changed_at = self.started_at
+        self._weighted = 0.0
+        self.completed = 0
+        self.throttled = 0
+        self.history = [(0.0, self.limit, 'initial')]
+        self._publish('initial')
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        """等待直到在途请求数低于当前上限
+
+        Returns:
+            float: 开始时间（time.monotonic）
+        """
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, success=True):
+        """请求结束；成功且延迟健康时加性增加上限"""
+        latency = time.monotonic() - started
+        with self._cond:
+            self._in_flight -= 1
+            self.completed += 1
+            if success:
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    self._baseline += (latency - self._baseline) * 0.01
+                if latency <= self._baseline * self.latency_tolerance and self._limit < self.max_limit:
+                    self._set_limit(min(self.max_limit, self._limit + 1 / self._limit), 'increase')
+            self._cond.notify_all()
+
+    def backoff(self, reason, started=None):
+        """报告一次限流或超时，乘性减小上限
+
+        在 slot() 中调用时，该请求结束后不再计为成功。
+
+        Args:
+            reason (str): 原因，如 '429'、'403'、'timeout'
+            started (float): 触发限流的请求的开始时间（time.monotonic），默认为当前时间
+        """
+        self._local.throttled = True
+        with self._cond:
+            self.throttled += 1
+            if self.metrics is not None:
+                self.metrics.count('concurrency_throttled', stage=self.name, reason=reason)
+            if (started if started is not None else time.monotonic()) < self._last_decrease:
+                return
+            self._last_decrease = time.monotonic()
+            self._set_limit(max(self.min_limit, self._limit * self.decrease), reason)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """占用一个并发名额执行代码块，抛出异常或期间报告过限流时不计为成功"""
+        started = self.acquire()
+        self._local.throttled = False
+        success = False
+        try:
+            yield
+            success = not self._local.throttled
+        finally:
+            self.release(started, success)
+
+    def _set_limit(self, limit, reason):
+        previous = self.limit
+        now = time.monotonic()
+        self._weighted += previous * (now - self._changed_at)
+        self._changed_at = now
+        self._limit = limit
+        if self.limit != previous:
+            self.history.append((round(now - self.started_at, 3), self.limit, reason))
+            self._publish(reason)
+
+    def _publish(self, reason):
+        if self.metrics is None:
+            return
+        self.metrics.gauge('concurrency_limit', self.limit, stage=self.name)
+        self.metrics.trace('concurrency', stage=self.name, limit=self.limit, in_flight=self._in_flight,
+                           reason=reason)
+
+    def summary(self, points=8):
+        """上限的变化过程和吞吐量
+
+        Returns:
+            str: 一行摘要，包含时间加权平均上限和最多points个采样点
+        """
+        with self._cond:
+            now = time.monotonic()
+            elapsed = max(now - self.started_at, 1e-6)
+            average = (self._weighted + self.limit * (now - self._changed_at)) / elapsed
+            history = list(self.history)
+            completed = self.completed
+            throttled = self.throttled
+        step = max(1, len(history) // points)
+        sampled = history[::step]
+        if sampled[-1] is not history[-1]:
+            sampled.append(history[-1])
+        timeline = ' → '.join(f"{seconds:.0f}s:{limit}" for seconds, limit, _ in sampled)
+        return (f"{self.name} 并发上限 {self.min_limit}-{self.max_limit}，当前 {self.limit}，"
+                f"平均 {average:.1f}，完成 {completed} 个（{completed / elapsed:.1f}/s），"
+                f"限流 {throttled} 次；变化：{timeline}")
@@ -1,208 +1,1263 @@
 import sqlite3
 import json
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from pathlib import Path
+from queue import Queue, Empty
 import os
+from metrics import instrument_public_methods
 
 class DatabaseError(Exception):
     """数据库操作异常基类"""
     pass
 
+# 全文索引的列，顺序与 search_repos 中的BM25权重对应
+FTS_COLUMNS = ('name', 'description', 'topics', 'readme', 'ai_summary')
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0, 3.0)
+# trigram分词需要SQLite 3.34+
+FTS_TOKENIZER = 'trigram'
+FTS_TRIGGERS = ('repositories_fts_insert', 'repositories_fts_delete', 'repositories_fts_update')
+
+def _decode_topics(value):
+    """将JSON字符串转换回列表"""
+    try:
+        return json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return []
+
+class Repo:
+    """仓库记录
+
+    以元组保存一行的列值，同一次查询的所有记录共享列名索引；topics在首次访问时才解析JSON。
+    支持 repo['name'] 和 repo.get('readme') 形式的只读访问，未查询的列通过get返回默认值。
+    """
+
+    __slots__ = ('_index', '_values', '_topics')
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+        self._topics = None
+
+    def __getitem__(self, key):
+        if key == 'topics':
+            if self._topics is None:
+                self._topics = _decode_topics(self._values[self._index['topics']])
+            return self._topics
+        return self._values[self._index[key]]
+
+    def get(self, key, default=None):
+        return self[key] if key in self._index else default
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    def to_dict(self):
+        return {key: self[key] for key in self._index}
+
+    def __repr__(self):
+        return f"Repo({self.to_dict()!r})"
+
 class Database:
-    def __init__(self, db_path='stars.db'):
+    """SQLite存储引擎
+
+    所有写操作都投递到一个专用写线程，由它持有唯一的写连接，
+    并把队列中积压的多个写操作合并到同一个事务里提交（group commit）。
+    读操作使用只读连接池，在WAL模式下与写线程互不阻塞；流式遍历使用独立的只读连接，
+    调用方遍历期间不占用连接池。
+    """
+
+    # 未分类（含"其他"）的仓库，与 classify -u 的语义一致
+    UNCATEGORIZED = "(category IS NULL OR category = '' OR category = '其他')"
+    # 没有任何用户star的仓库
+    UNSTARRED = "NOT EXISTS (SELECT 1 FROM user_stars WHERE user_stars.repo_name = repositories.name)"
+    # 某个用户star的仓库
+    USER_FILTER = 'name IN (SELECT repo_name FROM user_stars WHERE user = ?)'
+
+    def __init__(self, db_path='stars.db', read_pool_size=4, write_batch_size=256, metrics=None,
+                 read_timeout=60):
         self.db_path = db_path
+        # 可选的Metrics实例：记录公开方法耗时、写队列和读连接池的等待时间
+        self.metrics = metrics
+        self.read_pool_size = max(1, read_pool_size)
+        self.write_batch_size = max(1, write_batch_size)
+        # 连接池中的连接都被借出时最多等待的秒数
+        self.read_timeout = read_timeout
+
+        self._write_queue = Queue()
+        self._read_pool = Queue()
+        self._read_conns = []
+        self._read_lock = threading.Lock()
+        self._closed = False
+        # SQLite不支持FTS5或trigram分词时为False，搜索退化为LIKE匹配
+        self.fts_enabled = False
+
+        try:
+            self._writer_conn = self._connect()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"打开数据库失败: {str(e)}")
+
+        self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self._writer.start()
+
         try:
             self.init_db()
         except Exception as e:
+            self.close()
             raise DatabaseError(f"初始化数据库失败: {str(e)}")
 
+    def _connect(self, readonly=False):
+        """创建数据库连接"""
+        if readonly:
+            uri = Path(self.db_path).absolute().as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False)
+        else:
+            # isolation_level=None: 事务由写线程显式控制
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _writer_loop(self):
+        """写线程主循环：批量取出写任务并在同一事务中执行"""
+        conn = self._writer_conn
+        stopping = False
+        while not stopping:
+            task = self._write_queue.get()
+            if task is None:
+                break
+            batch = [task]
+            while len(batch) < self.write_batch_size:
+                try:
+                    task = self._write_queue.get_nowait()
+                except Empty:
+                    break
+                if task is None:
+                    stopping = True
+                    break
+                batch.append(task)
+            self._run_write_batch(conn, batch)
+        conn.close()
+
+    def _run_write_batch(self, conn, batch):
+        """执行一批写任务，每个任务使用独立的SAVEPOINT，失败只回滚自身"""
+        if self.metrics is not None:
+            started = time.perf_counter()
+            for _, _, _, queued_at in batch:
+                self.metrics.observe('queue_wait_seconds', started - queued_at, queue='db_writer')
+            self.metrics.count('db_write_tasks', len(batch))
+            self.metrics.count('db_write_batches')
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        outcomes = []
+        for fn, args, future, _ in batch:
+            conn.execute('SAVEPOINT write_task')
+            try:
+                result = fn(conn, *args)
+                conn.execute('RELEASE write_task')
+                outcomes.append((future, result, None))
+            except Exception as e:
+                conn.execute('ROLLBACK TO write_task')
+                conn.execute('RELEASE write_task')
+                outcomes.append((future, None, e))
+
+        try:
+            if self.metrics is not None:
+                with self.metrics.timer('db_commit_seconds'):
+                    conn.execute('COMMIT')
+            else:
+                conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            outcomes = [(future, None, e) for future, _, _ in outcomes]
+
+        # 事务提交之后再通知调用方，保证返回即已落盘
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _write(self, fn, *args):
+        """把写操作交给写线程执行并等待结果
+
+        Args:
+            fn: 可调用对象，签名为 fn(conn, *args)
+        """
+        if self._closed:
+            raise DatabaseError("数据库已关闭")
+        future = Future()
+        self._write_queue.put((fn, args, future, time.perf_counter()))
+        return future.result()
+
+    @contextmanager
+    def _reader(self):
+        """从连接池借出一个只读连接"""
+        if self._closed:
+            raise DatabaseError("数据库已关闭")
+        requested_at = time.perf_counter()
+        try:
+            conn = self._read_pool.get_nowait()
+        except Empty:
+            conn = None
+            with self._read_lock:
+                if len(self._read_conns) < self.read_pool_size:
+                    conn = self._connect(readonly=True)
+                    self._read_conns.append(conn)
+            if conn is None:
+                try:
+                    conn = self._read_pool.get(timeout=self.read_timeout)
+                except Empty:
+                    raise DatabaseError(f"等待只读连接超时（{self.read_timeout}秒，连接池大小 {self.read_pool_size}）")
+        if self.metrics is not None:
+            self.metrics.observe('queue_wait_seconds', time.perf_counter() - requested_at, queue='db_reader_pool')
+        try:
+            yield conn
+        finally:
+            self._read_pool.put(conn)
+
+    @contextmanager
+    def _iter_reader(self):
+        """为流式遍历单独打开一个只读连接，用完即关闭
+
+        生成器在调用方遍历期间一直持有连接，如果从连接池借出，调用方在遍历中再读数据库
+        （或其他线程读数据库）时可能等不到连接。
+        """
+        if self._closed:
+            raise DatabaseError("数据库已关闭")
+        conn = self._connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        """等待写队列清空后关闭所有连接"""
+        if self._closed:
+            return
+        self._closed = True
+        self._write_queue.put(None)
+        self._writer.join()
+        with self._read_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns = []
+
     def init_db(self):
         """初始化数据库，创建必要的表"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 创建仓库表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS repositories (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT UNIQUE,
-                        description TEXT,
-                        language TEXT,
-                        topics TEXT,
-                        url TEXT,
-                        readme TEXT,
-                        category TEXT,
-                        ai_summary TEXT,
-                        created_at TIMESTAMP,
-                        updated_at TIMESTAMP
-                    )
-                ''')
-                
-                conn.commit()
+            self.fts_enabled = self._write(self._init_schema)
         except sqlite3.Error as e:
             raise DatabaseError(f"创建数据库表失败: {str(e)}")
 
+    @staticmethod
+    def _init_schema(conn):
+        # 创建仓库表
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS repositories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE,
+                description TEXT,
+                language TEXT,
+                topics TEXT,
+                url TEXT,
+                readme TEXT,
+                category TEXT,
+                ai_summary TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP
+            )
+        ''')
+
+        # 为旧数据库补充后续版本新增的列
+        Database._add_missing_columns(conn, 'repositories', {
+            'pushed_at': 'TEXT',
+            'readme_etag': 'TEXT',
+            'classify_fingerprint': 'TEXT',
+            'classify_source': 'TEXT',
+            'category_version': 'INTEGER',
+            'confidence': 'REAL',
+        })
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_repositories_category '
+                     'ON repositories(category, name COLLATE NOCASE)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_repositories_updated_at ON repositories(updated_at)')
+
+        # LLM响应缓存表，key为请求参数（模型、采样参数、提示词）的哈希
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT,
+                size INTEGER,
+                created_at TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache(created_at)')
+
+        # 上次生成文档时每个输出文件的内容哈希，内容未变化时跳过重写；
+        # signature为生成时数据的签名，签名不变时连渲染也跳过
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS render_state (
+                path TEXT PRIMARY KEY,
+                hash TEXT,
+                updated_at TIMESTAMP
+            )
+        ''')
+        Database._add_missing_columns(conn, 'render_state', {'signature': 'TEXT'})
+
+        # 分类列表的版本：每次分类列表变化时新增一个版本，renames为相对上一版本改名的分类（旧名 -> 新名）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS category_sets (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                categories TEXT NOT NULL,
+                renames TEXT,
+                created_at TIMESTAMP
+            )
+        ''')
+
+        # 每个GitHub用户star了哪些仓库；仓库信息和分类只在repositories中保存一份
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_stars (
+                user TEXT NOT NULL,
+                repo_name TEXT NOT NULL,
+                starred_at TEXT,
+                fetched_at TIMESTAMP,
+                PRIMARY KEY (user, repo_name)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_user_stars_repo ON user_stars(repo_name)')
+
+        # 持久化的任务队列：多个进程通过租约（lease）认领任务，进程退出后未完成的任务可被重新认领
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                kind TEXT NOT NULL,
+                repo_name TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                available_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (kind, repo_name)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(kind, status, available_at)')
+
+        return Database._init_fts(conn)
+
+    @staticmethod
+    def _init_fts(conn):
+        """全文索引及同步触发器
+
+        使用trigram分词，中英文都可以按子串匹配；索引自带内容副本，
+        删除未被索引的行是空操作，旧数据库可以随时用 reindex 增量补齐。
+        SQLite没有FTS5或trigram分词时不创建索引，并删除已有的同步触发器，
+        否则每次写入仓库都会失败。
+
+        Returns:
+            bool: 全文索引是否可用
+        """
+        columns = ', '.join(FTS_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+        changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in FTS_COLUMNS)
+        try:
+            conn.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS repositories_fts
+                USING fts5({columns}, tokenize='{FTS_TOKENIZER}')
+            ''')
+            # 索引由支持FTS5的SQLite创建、当前SQLite不支持时，建表语句不会报错，查询才会
+            conn.execute('SELECT 1 FROM repositories_fts LIMIT 0')
+        except sqlite3.OperationalError:
+            for trigger in FTS_TRIGGERS:
+                conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            return False
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS repositories_fts_insert AFTER INSERT ON repositories BEGIN
+                INSERT INTO repositories_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS repositories_fts_delete AFTER DELETE ON repositories BEGIN
+                DELETE FROM repositories_fts WHERE rowid = old.id;
+            END
+        ''')
+        # fetch会重写所有列，只有被索引的列真正变化时才更新索引
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS repositories_fts_update AFTER UPDATE OF {columns} ON repositories
+            WHEN {changed} BEGIN
+                DELETE FROM repositories_fts WHERE rowid = old.id;
+                INSERT INTO repositories_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        return True
+
+    @staticmethod
+    def _add_missing_columns(conn, table, columns):
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for column, column_type in columns.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
     def repo_exists(self, repo_name):
         """检查仓库是否已存在"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM repositories WHERE name = ?', (repo_name,))
+            with self._reader() as conn:
+                cursor = conn.execute('SELECT COUNT(*) FROM repositories WHERE name = ?', (repo_name,))
                 return cursor.fetchone()[0] > 0
         except sqlite3.Error as e:
             raise DatabaseError(f"检查仓库是否存在失败: {str(e)}")
 
     def save_repo(self, repo_data):
         """保存或更新仓库信息"""
+        self.save_repos([repo_data])
+
+    def save_repos(self, repos):
+        """批量保存或更新仓库信息，整批在同一个事务中完成
+
+        readme 或 readme_etag 为 None 时保留数据库中已有的值（README未变化）。
+
+        Args:
+            repos: 可迭代的仓库信息字典
+
+        Returns:
+            int: 写入的仓库数量
+        """
+        try:
+            now = datetime.now()
+            rows = [
+                (
+                    repo_data['name'],
+                    repo_data['description'],
+                    repo_data['language'],
+                    # 将topics列表转换为JSON字符串
+                    json.dumps(repo_data['topics'], ensure_ascii=False),
+                    repo_data['url'],
+                    repo_data['readme'],
+                    repo_data.get('pushed_at'),
+                    repo_data.get('readme_etag'),
+                    now,
+                    now
+                )
+                for repo_data in repos
+            ]
+        except (TypeError, ValueError) as e:
+            raise DatabaseError(f"JSON序列化失败: {str(e)}")
+        if not rows:
+            return 0
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 将topics列表转换为JSON字符串
-                topics_json = json.dumps(repo_data['topics'], ensure_ascii=False)
-                
-                # 检查仓库是否存在
-                if self.repo_exists(repo_data['name']):
-                    # 更新现有记录
-                    cursor.execute('''
-                        UPDATE repositories 
-                        SET description = ?, language = ?, topics = ?, url = ?, readme = ?, updated_at = ?
-                        WHERE name = ?
-                    ''', (
-                        repo_data['description'],
-                        repo_data['language'],
-                        topics_json,
-                        repo_data['url'],
-                        repo_data['readme'],
-                        datetime.now(),
-                        repo_data['name']
+            self._write(self._executemany, '''
+                INSERT INTO repositories
+                (name, description, language, topics, url, readme, pushed_at, readme_etag,
+                 created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    description = excluded.description,
+                    language = excluded.language,
+                    topics = excluded.topics,
+                    url = excluded.url,
+                    readme = COALESCE(excluded.readme, repositories.readme),
+                    pushed_at = COALESCE(excluded.pushed_at, repositories.pushed_at),
+                    readme_etag = COALESCE(excluded.readme_etag, repositories.readme_etag),
+                    updated_at = excluded.updated_at
+            ''', rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"保存仓库信息失败: {str(e)}")
+
+    def save_user_stars(self, user, stars):
+        """记录用户star的仓库，并刷新其最近一次出现在star列表中的时间
+
+        Args:
+            user (str): GitHub用户名
+            stars: 可迭代的 (repo_name, starred_at)，starred_at未知时为None
+
+        Returns:
+            int: 写入的记录数量
+        """
+        now = datetime.now()
+        rows = [(user, repo_name, starred_at, now) for repo_name, starred_at in stars]
+        if not rows:
+            return 0
+        try:
+            self._write(self._executemany, '''
+                INSERT INTO user_stars (user, repo_name, starred_at, fetched_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(user, repo_name) DO UPDATE SET
+                    starred_at = COALESCE(excluded.starred_at, user_stars.starred_at),
+                    fetched_at = excluded.fetched_at
+            ''', rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"保存star记录失败: {str(e)}")
+
+    def get_user_starred_names(self, user, names):
+        """names中已记录为该用户star过的仓库
+
+        Returns:
+            set: 仓库名集合
+        """
+        names = list(names)
+        if not names:
+            return set()
+        try:
+            with self._reader() as conn:
+                starred = set()
+                for start in range(0, len(names), 500):
+                    chunk = names[start:start + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    starred.update(row[0] for row in conn.execute(
+                        f'SELECT repo_name FROM user_stars WHERE user = ? AND repo_name IN ({placeholders})',
+                        [user, *chunk]
                     ))
+                return starred
+        except sqlite3.Error as e:
+            raise DatabaseError(f"查询star记录失败: {str(e)}")
+
+    def prune_user_stars(self, user, timestamp):
+        """删除该用户在timestamp之后的完整获取中没有再出现的star（已取消star）
+
+        Returns:
+            int: 删除的记录数量
+        """
+        try:
+            return self._write(self._execute, 'DELETE FROM user_stars WHERE user = ? AND fetched_at < ?',
+                               (user, timestamp))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"清理star记录失败: {str(e)}")
+
+    def get_star_users(self):
+        """所有用户及其star数量
+
+        Returns:
+            list: (user, count)，按用户名排序
+        """
+        try:
+            with self._reader() as conn:
+                return conn.execute(
+                    'SELECT user, COUNT(*) FROM user_stars GROUP BY user ORDER BY user'
+                ).fetchall()
+        except sqlite3.Error as e:
+            raise DatabaseError(f"查询用户失败: {str(e)}")
+
+    def get_repo_fetch_state(self, names=None):
+        """获取仓库的增量同步状态
+
+        Args:
+            names: 仓库名列表，为None时返回所有仓库
+
+        Returns:
+            dict: {repo_name: (pushed_at, readme_etag)}
+        """
+        try:
+            with self._reader() as conn:
+                if names is None:
+                    cursor = conn.execute('SELECT name, pushed_at, readme_etag FROM repositories')
                 else:
-                    # 插入新记录
-                    cursor.execute('''
-                        INSERT INTO repositories 
-                        (name, description, language, topics, url, readme, created_at, updated_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        repo_data['name'],
-                        repo_data['description'],
-                        repo_data['language'],
-                        topics_json,
-                        repo_data['url'],
-                        repo_data['readme'],
-                        datetime.now(),
-                        datetime.now()
-                    ))
-                
-                conn.commit()
+                    names = list(names)
+                    if not names:
+                        return {}
+                    placeholders = ', '.join('?' * len(names))
+                    cursor = conn.execute(
+                        f'SELECT name, pushed_at, readme_etag FROM repositories WHERE name IN ({placeholders})',
+                        names
+                    )
+                return {name: (pushed_at, readme_etag) for name, pushed_at, readme_etag in cursor}
         except sqlite3.Error as e:
-            raise DatabaseError(f"保存仓库信息失败: {str(e)}")
-        except json.JSONDecodeError as e:
-            raise DatabaseError(f"JSON序列化失败: {str(e)}")
+            raise DatabaseError(f"获取仓库同步状态失败: {str(e)}")
+
+    def iter_repos(self, columns=None, where=None, params=(), order_by=None, batch_size=500):
+        """流式读取仓库记录
+
+        Args:
+            columns: 需要的列名，默认读取所有列；不需要README时应显式指定以减少IO
+            where (str): SQL过滤条件，如 Database.UNCATEGORIZED
+            params: where中占位符对应的参数
+            order_by (str): SQL排序
+            batch_size (int): 每次从游标取出的行数
+
+        Yields:
+            Repo: 仓库记录
+        """
+        sql = f"SELECT {', '.join(columns) if columns else '*'} FROM repositories"
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        try:
+            with self._iter_reader() as conn:
+                cursor = conn.execute(sql, params)
+                index = {description[0]: position for position, description in enumerate(cursor.description)}
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    for row in rows:
+                        yield Repo(index, row)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取仓库列表失败: {str(e)}")
+
+    def count_repos(self, where=None, params=()):
+        """统计满足条件的仓库数量"""
+        sql = 'SELECT COUNT(*) FROM repositories'
+        if where:
+            sql += f" WHERE {where}"
+        try:
+            with self._reader() as conn:
+                return conn.execute(sql, params).fetchone()[0]
+        except sqlite3.Error as e:
+            raise DatabaseError(f"统计仓库数量失败: {str(e)}")
+
+    def iter_repos_by_names(self, names, columns=None, chunk_size=500):
+        """按仓库名分块流式读取仓库记录"""
+        names = list(names)
+        for start in range(0, len(names), chunk_size):
+            chunk = names[start:start + chunk_size]
+            yield from self.iter_repos(columns, f"name IN ({', '.join('?' * len(chunk))})", chunk)
+
+    def get_repos_by_names(self, names):
+        """按仓库名批量获取仓库信息"""
+        return list(self.iter_repos_by_names(names))
 
     def get_all_repos(self):
         """获取所有仓库信息"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM repositories')
-                columns = [description[0] for description in cursor.description]
-                repos = []
-                
-                for row in cursor.fetchall():
-                    repo = dict(zip(columns, row))
-                    try:
-                        # 将JSON字符串转换回列表
-                        repo['topics'] = json.loads(repo['topics'])
-                    except json.JSONDecodeError:
-                        repo['topics'] = []
-                    repos.append(repo)
-                
-                return repos
-        except sqlite3.Error as e:
-            raise DatabaseError(f"获取仓库列表失败: {str(e)}")
+        return list(self.iter_repos())
 
     def update_repo_category(self, repo_name, category):
         """更新仓库的分类"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE repositories 
-                    SET category = ?, updated_at = ?
-                    WHERE name = ?
-                ''', (category, datetime.now(), repo_name))
-                conn.commit()
+            self._write(self._execute, '''
+                UPDATE repositories
+                SET category = ?, updated_at = ?
+                WHERE name = ?
+            ''', (category, datetime.now(), repo_name))
         except sqlite3.Error as e:
             raise DatabaseError(f"更新仓库分类失败: {str(e)}")
 
     def update_repo_summary(self, repo_name, summary):
         """更新仓库的AI总结"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE repositories 
-                    SET ai_summary = ?, updated_at = ?
-                    WHERE name = ?
-                ''', (summary, datetime.now(), repo_name))
-                conn.commit()
+            self._write(self._execute, '''
+                UPDATE repositories
+                SET ai_summary = ?, updated_at = ?
+                WHERE name = ?
+            ''', (summary, datetime.now(), repo_name))
         except sqlite3.Error as e:
             raise DatabaseError(f"更新仓库总结失败: {str(e)}")
 
+    def update_repo_classification(self, results, source='llm', job_owner=None, category_version=None):
+        """批量更新仓库的分类和AI总结
+
+        Args:
+            results: 可迭代的 (repo_name, category, summary, fingerprint, confidence) 元组，
+                fingerprint为分类时输入的指纹，输入不变时可跳过重新分类；confidence可以为None
+            source (str): 分类来源，'llm'、'batch' 或 'local'（本地分类器）
+            job_owner (str): 指定时在同一事务中把该进程认领的对应分类任务标记为完成
+            category_version (int): 分类时使用的分类列表版本
+
+        Returns:
+            int: 提交的记录数量
+        """
+        now = datetime.now()
+        rows = [
+            (category, summary, fingerprint, source, confidence, category_version, now, repo_name)
+            for repo_name, category, summary, fingerprint, confidence in results
+        ]
+        if not rows:
+            return 0
+        try:
+            self._write(self._update_repo_classification, rows, job_owner, now)
+            return len(rows)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"更新仓库分类结果失败: {str(e)}")
+
+    @staticmethod
+    def _update_repo_classification(conn, rows, job_owner, now):
+        conn.executemany('''
+            UPDATE repositories
+            SET category = ?, ai_summary = ?, classify_fingerprint = ?, classify_source = ?, confidence = ?,
+                category_version = ?, updated_at = ?
+            WHERE name = ?
+        ''', rows)
+        if job_owner:
+            conn.executemany('''
+                UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE kind = 'classify' AND repo_name = ? AND status = 'running' AND lease_owner = ?
+            ''', [(now, row[-1], job_owner) for row in rows])
+
+    def get_category_sets(self):
+        """所有分类列表版本
+
+        Returns:
+            list: 按版本升序的 (version, categories, renames)
+        """
+        try:
+            with self._reader() as conn:
+                rows = conn.execute('SELECT version, categories, renames FROM category_sets ORDER BY version')
+                return [(version, json.loads(categories), json.loads(renames or '{}'))
+                        for version, categories, renames in rows]
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取分类版本失败: {str(e)}")
+
+    def register_category_set(self, categories, renames=None):
+        """分类列表与最新版本不同时新增一个版本
+
+        Args:
+            categories (list): 当前的分类列表
+            renames (dict): 旧分类名 -> 新分类名，只保留新名在当前列表中、旧名不在当前列表中的项
+
+        Returns:
+            tuple: (version, created)
+        """
+        try:
+            return self._write(self._register_category_set, list(categories), dict(renames or {}))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"保存分类版本失败: {str(e)}")
+
+    @staticmethod
+    def _register_category_set(conn, categories, renames):
+        latest = conn.execute('SELECT version, categories FROM category_sets ORDER BY version DESC LIMIT 1').fetchone()
+        # 只有分类的集合变化才算新版本，调整顺序不影响已有的分类结果
+        if latest and set(json.loads(latest[1])) == set(categories):
+            return latest[0], False
+        renames = {old: new for old, new in renames.items() if new in categories and old not in categories}
+        cursor = conn.execute(
+            'INSERT INTO category_sets (categories, renames, created_at) VALUES (?, ?, ?)',
+            (json.dumps(categories, ensure_ascii=False), json.dumps(renames, ensure_ascii=False), datetime.now())
+        )
+        return cursor.lastrowid, True
+
+    def migrate_repo_categories(self, rows):
+        """不调用LLM，直接把仓库的分类迁移到新版本（沿用或按改名映射）
+
+        Args:
+            rows: 可迭代的 (category, category_version, classify_fingerprint, repo_name)
+
+        Returns:
+            int: 更新的记录数量
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        try:
+            self._write(self._executemany, '''
+                UPDATE repositories SET category = ?, category_version = ?, classify_fingerprint = ?
+                WHERE name = ?
+            ''', rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"迁移仓库分类失败: {str(e)}")
+
+    def get_job_counts(self, kind):
+        """各状态的任务数量
+
+        Returns:
+            dict: {status: count}
+        """
+        try:
+            with self._reader() as conn:
+                rows = conn.execute('SELECT status, COUNT(*) FROM jobs WHERE kind = ? GROUP BY status', (kind,))
+                return dict(rows.fetchall())
+        except sqlite3.Error as e:
+            raise DatabaseError(f"查询任务状态失败: {str(e)}")
+
+    def reset_jobs(self, kind, names):
+        """清空该类型的任务并为names重新建立待处理任务
+
+        检查和重建在同一个写事务中完成：已有未完成的任务（如另一个进程刚刚建立的队列）时不做修改。
+
+        Returns:
+            int: 新建的任务数量；已有未完成的任务时返回None
+        """
+        now = datetime.now()
+        try:
+            return self._write(self._reset_jobs, kind, [(kind, name, now) for name in names])
+        except sqlite3.Error as e:
+            raise DatabaseError(f"创建任务失败: {str(e)}")
+
+    @staticmethod
+    def _reset_jobs(conn, kind, rows):
+        if conn.execute("SELECT 1 FROM jobs WHERE kind = ? AND status IN ('pending', 'running') LIMIT 1",
+                        (kind,)).fetchone():
+            return None
+        conn.execute('DELETE FROM jobs WHERE kind = ?', (kind,))
+        return conn.executemany('INSERT INTO jobs (kind, repo_name, updated_at) VALUES (?, ?, ?)', rows).rowcount
+
+    def claim_jobs(self, kind, owner, limit, lease_seconds):
+        """认领可执行的任务：到了重试时间的待处理任务，以及租约已过期的运行中任务
+
+        认领在写事务中完成（BEGIN IMMEDIATE），多个进程同时认领也不会拿到同一个任务。
+        对应仓库已被删除的任务在认领时一并删除。
+
+        Returns:
+            list: 认领到的仓库名
+        """
+        try:
+            return self._write(self._claim_jobs, kind, owner, limit, lease_seconds)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"认领任务失败: {str(e)}")
+
+    @staticmethod
+    def _claim_jobs(conn, kind, owner, limit, lease_seconds):
+        now = time.time()
+        names = []
+        while len(names) < limit:
+            rows = conn.execute('''
+                SELECT j.repo_name, r.name IS NOT NULL FROM jobs j
+                LEFT JOIN repositories r ON r.name = j.repo_name
+                WHERE j.kind = ? AND ((j.status = 'pending' AND j.available_at <= ?)
+                                      OR (j.status = 'running' AND j.lease_expires < ?))
+                ORDER BY j.available_at
+                LIMIT ?
+            ''', (kind, now, now, limit - len(names))).fetchall()
+            # 仓库已从数据库删除的任务直接丢弃，不进入退避重试
+            gone = [(kind, name) for name, exists in rows if not exists]
+            conn.executemany('DELETE FROM jobs WHERE kind = ? AND repo_name = ?', gone)
+            claimed = [name for name, exists in rows if exists]
+            conn.executemany('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?,
+                                updated_at = ?
+                WHERE kind = ? AND repo_name = ?
+            ''', [(owner, now + lease_seconds, datetime.now(), kind, name) for name in claimed])
+            names.extend(claimed)
+            if not gone:
+                break
+        return names
+
+    def renew_job_leases(self, kind, owner, lease_seconds):
+        """延长该进程所有运行中任务的租约
+
+        Returns:
+            int: 续约的任务数量
+        """
+        try:
+            return self._write(self._execute, '''
+                UPDATE jobs SET lease_expires = ?
+                WHERE kind = ? AND status = 'running' AND lease_owner = ?
+            ''', (time.time() + lease_seconds, kind, owner))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"续约任务失败: {str(e)}")
+
+    def release_unfinished_jobs(self, kind, owner, error, max_attempts=5, backoff_base=10, backoff_max=300):
+        """把该进程认领但未完成的任务放回队列，按尝试次数指数退避；次数用尽的标记为失败
+
+        Returns:
+            tuple: (等待重试的任务数, 失败的任务数)
+        """
+        try:
+            return self._write(self._release_unfinished_jobs, kind, owner, error, max_attempts,
+                               backoff_base, backoff_max)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"释放任务失败: {str(e)}")
+
+    @staticmethod
+    def _release_unfinished_jobs(conn, kind, owner, error, max_attempts, backoff_base, backoff_max):
+        now = time.time()
+        failed = conn.execute('''
+            UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, last_error = ?,
+                            updated_at = ?
+            WHERE kind = ? AND status = 'running' AND lease_owner = ? AND attempts >= ?
+        ''', (error, datetime.now(), kind, owner, max_attempts)).rowcount
+        # 第n次失败后等待 backoff_base * 2^(n-1) 秒，不超过backoff_max
+        retrying = conn.execute('''
+            UPDATE jobs SET status = 'pending', lease_owner = NULL, lease_expires = NULL, last_error = ?,
+                            available_at = ? + MIN(?, ? * (1 << (attempts - 1))), updated_at = ?
+            WHERE kind = ? AND status = 'running' AND lease_owner = ?
+        ''', (error, now, backoff_max, backoff_base, datetime.now(), kind, owner)).rowcount
+        return retrying, failed
+
+    def next_job_delay(self, kind):
+        """距离下一个任务可以被认领还有多少秒
+
+        包括退避中的待处理任务，以及其他进程持有、租约到期后可以接手的运行中任务。
+
+        Returns:
+            float: 秒数，已有可认领的任务时为0；没有未完成的任务时返回None
+        """
+        try:
+            with self._reader() as conn:
+                ready_at = conn.execute('''
+                    SELECT MIN(CASE status WHEN 'pending' THEN available_at ELSE lease_expires END)
+                    FROM jobs WHERE kind = ? AND status IN ('pending', 'running')
+                ''', (kind,)).fetchone()[0]
+        except sqlite3.Error as e:
+            raise DatabaseError(f"查询任务状态失败: {str(e)}")
+        if ready_at is None:
+            return None
+        return max(0.0, ready_at - time.time())
+
+    @staticmethod
+    def _execute(conn, sql, params=()):
+        return conn.execute(sql, params).rowcount
+
+    @staticmethod
+    def _executemany(conn, sql, rows):
+        return conn.executemany(sql, rows).rowcount
+
+    def get_cached_response(self, key):
+        """读取缓存的LLM响应，未命中返回None"""
+        try:
+            with self._reader() as conn:
+                row = conn.execute('SELECT response FROM llm_cache WHERE key = ?', (key,)).fetchone()
+                return row[0] if row else None
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取LLM缓存失败: {str(e)}")
+
+    def put_cached_response(self, key, response):
+        """写入LLM响应缓存"""
+        try:
+            self._write(self._execute, '''
+                INSERT OR REPLACE INTO llm_cache (key, response, size, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (key, response, len(response.encode('utf-8')), datetime.now()))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"写入LLM缓存失败: {str(e)}")
+
+    def prune_llm_cache(self, max_age_days=30, max_bytes=100 * 1024 * 1024):
+        """按时间和总大小淘汰LLM缓存
+
+        先删除超过 max_age_days 的条目，总大小仍超过 max_bytes 时从最旧的开始删除。
+
+        Returns:
+            int: 删除的条目数量
+        """
+        try:
+            return self._write(self._prune_llm_cache, max_age_days, max_bytes)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"清理LLM缓存失败: {str(e)}")
+
+    @staticmethod
+    def _prune_llm_cache(conn, max_age_days, max_bytes):
+        deleted = conn.execute('DELETE FROM llm_cache WHERE created_at < ?',
+                               (datetime.now() - timedelta(days=max_age_days),)).rowcount
+        total_size = conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+        if total_size <= max_bytes:
+            return deleted
+
+        # 从最旧的条目开始累计，找到需要删除的分界时间
+        excess = total_size - max_bytes
+        cutoff = None
+        for created_at, size in conn.execute('SELECT created_at, size FROM llm_cache ORDER BY created_at'):
+            excess -= size
+            cutoff = created_at
+            if excess <= 0:
+                break
+        deleted += conn.execute('DELETE FROM llm_cache WHERE created_at <= ?', (cutoff,)).rowcount
+        return deleted
+
+    def get_category_counts(self, default='未分类', user=None):
+        """按分类统计仓库数量，未分类的仓库归入 default 并排在最后
+
+        Args:
+            user (str): 只统计该用户star的仓库，None为全部仓库
+
+        Returns:
+            list: (category, count)，顺序与 iter_render_rows 一致
+        """
+        user_filter, params = (f' AND {self.USER_FILTER}', (user,)) if user else ('', ())
+        try:
+            with self._reader() as conn:
+                counts = conn.execute(f'''
+                    SELECT category, COUNT(*) FROM repositories
+                    WHERE category IS NOT NULL AND category != ''{user_filter}
+                    GROUP BY category
+                    ORDER BY category
+                ''', params).fetchall()
+                uncategorized = conn.execute(
+                    f"SELECT COUNT(*) FROM repositories WHERE (category IS NULL OR category = ''){user_filter}",
+                    params
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            raise DatabaseError(f"统计分类失败: {str(e)}")
+        if uncategorized:
+            counts.append((default, uncategorized))
+        return counts
+
+    def iter_render_rows(self, default='未分类', batch_size=500, user=None):
+        """按分类、名称顺序流式读取生成文档所需的列，不加载README等大字段
+
+        已分类的仓库沿 (category, name) 索引顺序读取，无需排序；未分类的仓库排在最后。
+
+        Args:
+            user (str): 只读取该用户star的仓库，None为全部仓库
+
+        Yields:
+            tuple: (name, url, category, ai_summary, description)
+        """
+        columns = ('name', 'url', 'category', 'ai_summary', 'description')
+        user_filter, params = (f' AND {self.USER_FILTER}', (user,)) if user else ('', ())
+        for where, order_by in (
+            ("category IS NOT NULL AND category != ''", 'category, name COLLATE NOCASE'),
+            ("(category IS NULL OR category = '')", 'name COLLATE NOCASE'),
+        ):
+            for repo in self.iter_repos(columns, where + user_filter, params, order_by=order_by,
+                                        batch_size=batch_size):
+                name, url, category, ai_summary, description = repo._values
+                yield name, url, category or default, ai_summary, description
+
+    def get_render_hashes(self):
+        """获取上次生成的各文档文件的内容哈希 {path: hash}"""
+        try:
+            with self._reader() as conn:
+                return dict(conn.execute('SELECT path, hash FROM render_state'))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取文档状态失败: {str(e)}")
+
+    def get_render_signature(self, path):
+        """上次生成该文档时的数据签名，没有记录时返回None"""
+        try:
+            with self._reader() as conn:
+                row = conn.execute('SELECT signature FROM render_state WHERE path = ?', (path,)).fetchone()
+                return row[0] if row else None
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取文档状态失败: {str(e)}")
+
+    def save_render_signature(self, path, signature):
+        """记录生成该文档时的数据签名"""
+        try:
+            self._write(self._execute, '''
+                INSERT INTO render_state (path, signature, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET signature = excluded.signature
+            ''', (path, signature, datetime.now()))
+        except sqlite3.Error as e:
+            raise DatabaseError(f"保存文档状态失败: {str(e)}")
+
+    def get_repos_signature(self, user=None):
+        """文档所需数据的签名：仓库数量和最近更新时间，按用户生成时还包括该用户的star记录
+
+        仓库的新增、删除、重新获取和分类都会改变签名，只需一次聚合查询，不读取仓库内容。
+        """
+        user_filter, params = (f' WHERE {self.USER_FILTER}', (user,)) if user else ('', ())
+        try:
+            with self._reader() as conn:
+                parts = conn.execute(
+                    f'SELECT COUNT(*), MAX(updated_at) FROM repositories{user_filter}', params
+                ).fetchone()
+                if user:
+                    parts += conn.execute(
+                        'SELECT COUNT(*), MAX(fetched_at) FROM user_stars WHERE user = ?', (user,)
+                    ).fetchone()
+                return '|'.join(str(part) for part in parts)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取仓库签名失败: {str(e)}")
+
+    def save_render_hashes(self, hashes, removed=()):
+        """记录文档文件的内容哈希，并删除已不再生成的文件记录"""
+        now = datetime.now()
+        try:
+            self._write(self._save_render_hashes, [(path, digest, now) for path, digest in hashes.items()],
+                        [(path,) for path in removed])
+        except sqlite3.Error as e:
+            raise DatabaseError(f"保存文档状态失败: {str(e)}")
+
+    @staticmethod
+    def _save_render_hashes(conn, rows, removed):
+        conn.executemany('INSERT OR REPLACE INTO render_state (path, hash, updated_at) VALUES (?, ?, ?)', rows)
+        conn.executemany('DELETE FROM render_state WHERE path = ?', removed)
+
     def get_repos_by_category(self, category):
         """获取指定分类的所有仓库"""
+        return list(self.iter_repos(where='category = ?', params=(category,)))
+
+    def search_repos(self, query, category=None, language=None, limit=20):
+        """全文搜索仓库，按BM25相关度排序
+
+        trigram分词要求词至少3个字符，更短的词退化为对名称、描述和总结的LIKE匹配；
+        全文索引不可用时所有词都使用LIKE匹配，结果按名称排序。
+
+        Args:
+            query (str): 空格分隔的关键词，所有关键词都需要匹配
+            category (str): 只返回该分类的仓库
+            language (str): 只返回该语言的仓库，不区分大小写
+            limit (int): 最多返回的结果数
+
+        Returns:
+            list: Repo记录，包含 name, url, category, language, description, ai_summary, score
+        """
+        terms = query.split()
+        min_length = 3 if self.fts_enabled else float('inf')
+        phrases = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= min_length]
+        short_terms = [term for term in terms if len(term) < min_length]
+
+        conditions = []
+        params = []
+        if phrases:
+            source = 'repositories_fts JOIN repositories r ON r.id = repositories_fts.rowid'
+            score = f"bm25(repositories_fts, {', '.join(map(str, FTS_WEIGHTS))})"
+            conditions.append('repositories_fts MATCH ?')
+            params.append(' '.join(phrases))
+        else:
+            source = 'repositories r'
+            score = '0'
+        for term in short_terms:
+            conditions.append('(r.name LIKE ? OR r.description LIKE ? OR r.ai_summary LIKE ?)')
+            params.extend([f'%{term}%'] * 3)
+        if category:
+            conditions.append('r.category = ?')
+            params.append(category)
+        if language:
+            conditions.append('r.language = ? COLLATE NOCASE')
+            params.append(language)
+        if not conditions:
+            return []
+
+        sql = f'''
+            SELECT r.name, r.url, r.category, r.language, r.description, r.ai_summary, {score} AS score
+            FROM {source}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score, r.name
+            LIMIT ?
+        '''
+        params.append(limit)
+        try:
+            with self._reader() as conn:
+                cursor = conn.execute(sql, params)
+                index = {description[0]: position for position, description in enumerate(cursor.description)}
+                return [Repo(index, row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            raise DatabaseError(f"搜索仓库失败: {str(e)}")
+
+    def _require_fts(self):
+        if not self.fts_enabled:
+            raise DatabaseError(f"当前SQLite（{sqlite3.sqlite_version}）不支持FTS5 trigram分词，全文索引不可用")
+
+    def get_fts_status(self):
+        """全文索引覆盖情况
+
+        Returns:
+            tuple: (已索引的仓库数, 仓库总数)
+        """
+        self._require_fts()
+        try:
+            with self._reader() as conn:
+                indexed = conn.execute('SELECT COUNT(*) FROM repositories_fts').fetchone()[0]
+                total = conn.execute('SELECT COUNT(*) FROM repositories').fetchone()[0]
+                return indexed, total
+        except sqlite3.Error as e:
+            raise DatabaseError(f"读取全文索引状态失败: {str(e)}")
+
+    def rebuild_fts(self, full=False, chunk_size=2000):
+        """补齐全文索引
+
+        默认只索引缺失的仓库并删除已不存在的仓库的索引，每块在单独的事务中提交，
+        不会长时间阻塞其他写操作。
+
+        Args:
+            full (bool): 是否清空后完整重建
+            chunk_size (int): 每个事务索引的仓库数量
+
+        Returns:
+            int: 新索引的仓库数量
+        """
+        self._require_fts()
+        try:
+            self._write(self._prune_fts, full)
+            indexed = 0
+            while True:
+                count = self._write(self._index_missing_fts, chunk_size)
+                indexed += count
+                if count < chunk_size:
+                    break
+            self._write(self._execute, "INSERT INTO repositories_fts (repositories_fts) VALUES ('optimize')")
+            return indexed
+        except sqlite3.Error as e:
+            raise DatabaseError(f"重建全文索引失败: {str(e)}")
+
+    def rewrite_readmes(self, transform, chunk_size=500):
+        """用transform重新处理已保存的README，只写回有变化的仓库
+
+        用于把旧版本以原文保存的README转换为摘录，每块在单独的事务中提交。
+
+        Args:
+            transform: 接收README文本并返回新文本的函数
+            chunk_size (int): 每个事务更新的仓库数量
+
+        Returns:
+            int: 更新的仓库数量
+        """
+        updated = 0
+        rows = []
+        for repo in self.iter_repos(('name', 'readme'), "readme IS NOT NULL AND readme != ''"):
+            readme = transform(repo['readme'])
+            if readme != repo['readme']:
+                rows.append((readme, repo['name']))
+            if len(rows) >= chunk_size:
+                updated += self._update_readmes(rows)
+                rows = []
+        return updated + self._update_readmes(rows)
+
+    def _update_readmes(self, rows):
+        if not rows:
+            return 0
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM repositories WHERE category = ?', (category,))
-                columns = [description[0] for description in cursor.description]
-                repos = []
-                
-                for row in cursor.fetchall():
-                    repo = dict(zip(columns, row))
-                    try:
-                        repo['topics'] = json.loads(repo['topics'])
-                    except json.JSONDecodeError:
-                        repo['topics'] = []
-                    repos.append(repo)
-                
-                return repos
-        except sqlite3.Error as e:
-            raise DatabaseError(f"获取分类仓库失败: {str(e)}")
+            return self._write(self._executemany, 'UPDATE repositories SET readme = ? WHERE name = ?', rows)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"更新README失败: {str(e)}")
+
+    @staticmethod
+    def _prune_fts(conn, full):
+        if full:
+            conn.execute('DELETE FROM repositories_fts')
+        else:
+            conn.execute('DELETE FROM repositories_fts WHERE rowid NOT IN (SELECT id FROM repositories)')
+
+    @staticmethod
+    def _index_missing_fts(conn, chunk_size):
+        columns = ', '.join(FTS_COLUMNS)
+        return conn.execute(f'''
+            INSERT INTO repositories_fts (rowid, {columns})
+            SELECT id, {columns} FROM repositories
+            WHERE id NOT IN (SELECT rowid FROM repositories_fts)
+            LIMIT ?
+        ''', (chunk_size,)).rowcount
 
     def delete_repos_not_updated_since(self, timestamp, threshold_days=7):
-        """删除在指定时间之前更新的仓库
-        
+        """删除在指定时间之前更新、且已没有任何用户star的仓库
+
         Args:
             timestamp: datetime对象，表示时间点
             threshold_days: int，删除超过多少天未更新的仓库
-        
+
         Returns:
             tuple: (deleted_count, skipped_count) 删除的仓库数量和跳过的仓库数量
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # 首先获取可能要删除的仓库数量
-                cursor.execute('''
-                    SELECT COUNT(*) FROM repositories 
-                    WHERE updated_at < ?
-                ''', (timestamp,))
-                total_outdated = cursor.fetchone()[0]
-                
-                # 计算阈值时间
-                threshold_time = timestamp - timedelta(days=threshold_days)
-                
-                # 删除超过阈值时间的仓库
-                cursor.execute('''
-                    DELETE FROM repositories 
-                    WHERE updated_at < ?
-                ''', (threshold_time,))
-                deleted_count = cursor.rowcount
-                
-                conn.commit()
-                return deleted_count, total_outdated - deleted_count
-        except sqlite3.Error as e:
-            raise DatabaseError(f"删除旧仓库失败: {str(e)}") 
\ No newline at end of file
+            return self._write(self._delete_repos_not_updated_since, timestamp, threshold_days)
+        except sqlite3.Error as e:
+            raise DatabaseError(f"删除旧仓库失败: {str(e)}")
+
+    @staticmethod
+    def _delete_repos_not_updated_since(conn, timestamp, threshold_days):
+        # 首先获取可能要删除的仓库数量
+        cursor = conn.execute(f'''
+            SELECT COUNT(*) FROM repositories
+            WHERE updated_at < ? AND {Database.UNSTARRED}
+        ''', (timestamp,))
+        total_outdated = cursor.fetchone()[0]
+
+        # 计算阈值时间
+        threshold_time = timestamp - timedelta(days=threshold_days)
+
+        # 删除超过阈值时间的仓库
+        cursor = conn.execute(f'''
+            DELETE FROM repositories
+            WHERE updated_at < ? AND {Database.UNSTARRED}
+        ''', (threshold_time,))
+        deleted_count = cursor.rowcount
+
+        return deleted_count, total_outdated - deleted_count
+
+# 所有公开方法的调用耗时记为 db_call_seconds{method=...}
+instrument_public_methods(Database, 'db_call_seconds')
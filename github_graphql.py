@@ -0,0 +1,135 @@
+import requests
+from readme_digest import digest_readme
+
+STARRED_REPOS_QUERY = '''
+query($first: Int!, $cursor: String) {
+  viewer {
+    starredRepositories(first: $first, after: $cursor, orderBy: {field: STARRED_AT, direction: DESC}) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      edges {
+        starredAt
+      }
+      nodes {
+        nameWithOwner
+        description
+        url
+        pushedAt
+        primaryLanguage {
+          name
+        }
+        repositoryTopics(first: 20) {
+          nodes {
+            topic {
+              name
+            }
+          }
+        }
+        readme: object(expression: "HEAD:README.md") {
+          ... on Blob {
+            text
+          }
+        }
+        readmeLower: object(expression: "HEAD:readme.md") {
+          ... on Blob {
+            text
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+def starred_repos_query(login=None):
+    """查询指定用户（默认为token对应的用户）star的仓库"""
+    if login is None:
+        return STARRED_REPOS_QUERY
+    return STARRED_REPOS_QUERY.replace(
+        'query($first: Int!, $cursor: String)', 'query($first: Int!, $cursor: String, $login: String!)'
+    ).replace('  viewer {', '  user(login: $login) {', 1)
+
+class GraphQLError(Exception):
+    """GitHub GraphQL API调用异常"""
+    pass
+
+class GraphQLStarFetcher:
+    """使用GitHub GraphQL API获取Star仓库
+
+    每页一次请求即可拿到描述、语言、topics和README，
+    不再需要为每个仓库单独调用REST接口。GraphQL无法只取Blob的一部分，
+    README全文在本地清洗为不超过 readme_max_tokens 的摘录。
+    指定login时获取该用户公开的star，否则获取token对应用户的star。
+    """
+
+    def __init__(self, token, api_url='https://api.github.com/graphql', page_size=100,
+                 readme_max_tokens=200, session=None, login=None, timeout=(10, 30)):
+        self.api_url = api_url
+        self.login = login
+        self.timeout = timeout
+        self.page_size = min(max(1, page_size), 100)
+        self.readme_max_tokens = readme_max_tokens
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            "Authorization": f"bearer {token}",
+            "Content-Type": "application/json"
+        })
+
+    def _query(self, query, variables):
+        """发送GraphQL查询并返回data字段"""
+        response = self.session.post(self.api_url, json={"query": query, "variables": variables},
+                                     timeout=self.timeout)
+        if response.status_code != 200:
+            raise GraphQLError(f"GraphQL请求失败: {response.status_code} {response.text}")
+        body = response.json()
+        if body.get('errors'):
+            messages = '; '.join(error.get('message', '') for error in body['errors'])
+            raise GraphQLError(f"GraphQL查询错误: {messages}")
+        return body['data']
+
+    def normalize(self, node):
+        """将GraphQL节点转换为Database.save_repo使用的repo_data格式"""
+        readme_blob = node.get('readme') or node.get('readmeLower') or {}
+        topics = (node.get('repositoryTopics') or {}).get('nodes') or []
+        return {
+            "name": node['nameWithOwner'],
+            "description": node.get('description') or "",
+            "language": (node.get('primaryLanguage') or {}).get('name') or "",
+            "topics": [item['topic']['name'] for item in topics],
+            "url": node['url'],
+            "readme": digest_readme(readme_blob.get('text') or "", self.readme_max_tokens),
+            "pushed_at": node.get('pushedAt'),
+        }
+
+    def iter_pages(self):
+        """按游标逐页获取Star仓库
+
+        Yields:
+            list: 每页的repo_data列表
+        """
+        query = starred_repos_query(self.login)
+        variables = {"first": self.page_size}
+        if self.login:
+            variables["login"] = self.login
+        cursor = None
+        while True:
+            data = self._query(query, {**variables, "cursor": cursor})
+            owner = data['user' if self.login else 'viewer']
+            if owner is None:
+                raise GraphQLError(f"GitHub用户不存在: {self.login}")
+            starred = owner['starredRepositories']
+            edges = starred.get('edges') or [{}] * len(starred['nodes'])
+            page = []
+            for edge, node in zip(edges, starred['nodes']):
+                if node:
+                    repo_data = self.normalize(node)
+                    repo_data['starred_at'] = (edge or {}).get('starredAt')
+                    page.append(repo_data)
+            yield page
+
+            page_info = starred['pageInfo']
+            if not page_info['hasNextPage']:
+                break
+            cursor = page_info['endCursor']
@@ -0,0 +1,191 @@
+import re
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from metrics import mask_secret
+
+class RateLimitError(Exception):
+    """所有GitHub token都被限流且重试次数用尽"""
+    pass
+
+class _TokenState:
+    """单个token的配额和令牌桶状态"""
+
+    def __init__(self, token, requests_per_second, burst):
+        self.token = token
+        self.rate = requests_per_second
+        self.capacity = burst
+        self.bucket = float(burst)
+        self.last_refill = time.monotonic()
+        self.remaining = None  # 首次响应前未知
+        self.reset_at = 0.0  # X-RateLimit-Reset，epoch秒
+        self.blocked_until = 0.0  # 冷却结束时间，epoch秒
+
+    def refill(self, now):
+        self.bucket = min(self.capacity, self.bucket + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def quota(self, wall):
+        """当前可用的剩余配额，配额重置时间已过则视为已恢复"""
+        if self.remaining is None or wall >= self.reset_at:
+            return float('inf')
+        return self.remaining
+
+class GitHubScheduler:
+    """按剩余配额在多个token之间调度GitHub请求
+
+    每个token有独立的令牌桶控制请求速率；根据响应中的
+    X-RateLimit-Remaining/Reset 和二级限流的 Retry-After 让token进入冷却，
+    选择剩余配额最多的可用token发出下一个请求。
+    结果与调用者有关的请求（viewer查询、/user/starred）可以通过 acquire(token) 固定使用某个token。
+    """
+
+    def __init__(self, tokens, requests_per_second=10, burst=20, reserve=10, secondary_wait=60):
+        if not tokens:
+            raise ValueError("未配置GitHub token")
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.tokens = [_TokenState(token, requests_per_second, burst) for token in tokens]
+        # 不在token池中、只被固定使用的token，不参与轮换
+        self._pinned = {}
+        self.reserve = reserve
+        self.secondary_wait = secondary_wait
+        self._cond = threading.Condition()
+
+    def _state_for(self, token):
+        for state in self.tokens:
+            if state.token == token:
+                return state
+        if token not in self._pinned:
+            self._pinned[token] = _TokenState(token, self.requests_per_second, self.burst)
+        return self._pinned[token]
+
+    def acquire(self, token=None):
+        """阻塞直到有token可以发出请求，返回该token的状态对象
+
+        Args:
+            token (str): 只使用该token（同样按其配额和令牌桶限速），默认在token池中选择
+        """
+        with self._cond:
+            candidates = [self._state_for(token)] if token else self.tokens
+            while True:
+                now = time.monotonic()
+                wall = time.time()
+                usable = [
+                    state for state in candidates
+                    if wall >= state.blocked_until and state.quota(wall) > self.reserve
+                ]
+                if usable:
+                    for state in usable:
+                        state.refill(now)
+                    ready = [state for state in usable if state.bucket >= 1]
+                    if ready:
+                        state = max(ready, key=lambda s: s.quota(wall))
+                        state.bucket -= 1
+                        if state.remaining is not None and wall < state.reset_at:
+                            state.remaining -= 1
+                        return state
+                    wait = min((1 - state.bucket) / state.rate for state in usable)
+                else:
+                    # 所有token都在冷却或配额耗尽，等到最早恢复的那个
+                    wait = min(
+                        max(state.blocked_until, state.reset_at if state.quota(wall) <= self.reserve else 0) - wall
+                        for state in candidates
+                    )
+                self._cond.wait(max(wait, 0.01))
+
+    def record(self, state, response):
+        """根据响应头更新token状态
+
+        Returns:
+            bool: 该响应是否为限流响应（需要重试）
+        """
+        headers = response.headers
+        wall = time.time()
+        with self._cond:
+            if 'X-RateLimit-Remaining' in headers:
+                try:
+                    state.remaining = int(headers['X-RateLimit-Remaining'])
+                    state.reset_at = float(headers.get('X-RateLimit-Reset', wall + 3600))
+                except ValueError:
+                    pass
+
+            limited = False
+            if response.status_code in (403, 429):
+                retry_after = headers.get('Retry-After')
+                if retry_after is not None:
+                    state.blocked_until = wall + float(retry_after)
+                    limited = True
+                elif state.remaining == 0:
+                    state.blocked_until = state.reset_at
+                    limited = True
+                elif response.status_code == 429 or 'rate limit' in response.text.lower():
+                    # 二级限流未给出Retry-After时，GitHub建议至少等待一分钟
+                    state.blocked_until = wall + self.secondary_wait
+                    limited = True
+            self._cond.notify_all()
+            return limited
+
+    def total_remaining(self):
+        """所有token已知的剩余配额之和"""
+        wall = time.time()
+        with self._cond:
+            return sum(
+                state.remaining if state.remaining is not None and wall < state.reset_at else 0
+                for state in self.tokens
+            )
+
+class RateLimitedSession(requests.Session):
+    """由GitHubScheduler调度的requests会话
+
+    每个请求都会经过调度器选择token并按令牌桶限速，
+    遇到限流响应时换token重试，重试用尽后抛出RateLimitError。
+    只有结果与调用者无关的请求（README、仓库信息）适合在token之间轮换；
+    指定token时所有请求固定使用该token，遇到限流时等待它恢复后重试。
+    指定limiter（AdaptiveLimiter）时，每个限流响应和超时都会让其减小并发上限。
+    timeout 为未单独指定timeout的请求使用的 (连接, 读取) 超时秒数。
+    """
+
+    def __init__(self, scheduler, max_retries=5, metrics=None, limiter=None, token=None, timeout=None):
+        super().__init__()
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.limiter = limiter
+        self.token = token
+        self.timeout = timeout
+
+    @staticmethod
+    def _endpoint(url):
+        """指标标签用的接口路径，仓库名替换为占位符避免标签数量随仓库数增长"""
+        return re.sub(r'^/repos/[^/]+/[^/]+', '/repos/{owner}/{repo}', urlparse(url).path)
+
+    def request(self, method, url, **kwargs):
+        headers = dict(kwargs.pop('headers', None) or {})
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        for _ in range(self.max_retries + 1):
+            waited_at = time.perf_counter()
+            state = self.scheduler.acquire(self.token)
+            started = time.monotonic()
+            headers['Authorization'] = f"Bearer {state.token}"
+            try:
+                if self.metrics is None:
+                    response = super().request(method, url, headers=headers, **kwargs)
+                else:
+                    self.metrics.observe('queue_wait_seconds', time.perf_counter() - waited_at,
+                                         queue='github_token')
+                    labels = {'service': 'github', 'endpoint': self._endpoint(url), 'key': mask_secret(state.token)}
+                    with self.metrics.timer('http_request_seconds', 'http_requests', **labels) as extra:
+                        response = super().request(method, url, headers=headers, **kwargs)
+                        extra['status'] = response.status_code
+            except requests.Timeout:
+                if self.limiter is not None:
+                    self.limiter.backoff('timeout', started)
+                raise
+            if not self.scheduler.record(state, response):
+                return response
+            if self.limiter is not None:
+                self.limiter.backoff(str(response.status_code), started)
+        raise RateLimitError(f"请求被限流，已重试 {self.max_retries} 次: {url}")
@@ -0,0 +1,76 @@
+import threading
+from collections import deque
+
+class HedgePolicy:
+    """LLM对冲请求策略
+
+    在滑动窗口中记录成功请求的延迟，对冲阈值为窗口内延迟的percentile分位数（不低于min_delay）。
+    请求超过阈值仍未返回时，可以用另一个key发送一份副本，取先成功返回的结果；
+    对冲请求数与请求总数之比不超过max_ratio，限制额外的成本。
+    """
+
+    def __init__(self, percentile=0.95, min_delay=1.0, max_ratio=0.05, window=500, min_samples=20):
+        """
+        Args:
+            percentile (float): 对冲阈值使用的延迟分位数
+            min_delay (float): 对冲阈值的下限（秒）
+            max_ratio (float): 对冲请求数占请求总数的比例上限
+            window (int): 参与计算分位数的最近成功请求数
+            min_samples (int): 样本数少于该值时不对冲
+        """
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.min_samples = max(1, min_samples)
+        self._samples = deque(maxlen=max(self.min_samples, window))
+        self._threshold = None
+        self._stale = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def observe(self, latency):
+        """记录一次成功请求的延迟"""
+        with self._lock:
+            self._samples.append(latency)
+            self._stale += 1
+
+    def delay(self):
+        """本次请求的对冲阈值（秒）并计入请求总数，样本不足时返回None（不对冲）"""
+        with self._lock:
+            self.requests += 1
+            if len(self._samples) < self.min_samples:
+                return None
+            # 每积累一定数量的新样本才重新排序
+            if self._threshold is None or self._stale >= 10:
+                ordered = sorted(self._samples)
+                index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+                self._threshold = max(self.min_delay, ordered[index])
+                self._stale = 0
+            return self._threshold
+
+    def allow(self):
+        """占用一次对冲额度，超过max_ratio时返回False"""
+        with self._lock:
+            if self.hedges + 1 > self.max_ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def refund(self):
+        """归还allow()占用的额度（没有可用于对冲的key时）"""
+        with self._lock:
+            self.hedges -= 1
+
+    def record_win(self):
+        """对冲请求先于原请求成功返回"""
+        with self._lock:
+            self.wins += 1
+
+    def summary(self):
+        with self._lock:
+            ratio = self.hedges / self.requests if self.requests else 0
+            threshold = f"{self._threshold:.2f}s" if self._threshold is not None else "样本不足"
+            return (f"对冲请求 {self.hedges}/{self.requests} 次（{ratio:.1%}），"
+                    f"其中 {self.wins} 次先于原请求返回，当前阈值 {threshold}")
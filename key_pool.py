@@ -0,0 +1,180 @@
+import asyncio
+import re
+import threading
+import time
+from collections import deque
+
+class NoAvailableKeyError(Exception):
+    """所有API key都已失效（如401）"""
+    pass
+
+def parse_reset_duration(value):
+    """解析 x-ratelimit-reset-* 头，如 "1s"、"6m0s"、"20ms"，返回秒数"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+class _KeyState:
+    """单个API key的健康状态"""
+
+    def __init__(self, key, rpm=0, tpm=0):
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self.in_flight = 0
+        self.latency = None  # 延迟的指数移动平均，秒
+        self.throttled = 0  # 最近连续429次数
+        self.cooldown_until = 0.0
+        self.disabled = False
+        self.requests = deque()  # 最近60秒的请求时间
+        self.tokens = deque()  # 最近60秒的 (时间, token数)
+
+    def _trim(self, now):
+        while self.requests and now - self.requests[0] >= 60:
+            self.requests.popleft()
+        while self.tokens and now - self.tokens[0][0] >= 60:
+            self.tokens.popleft()
+
+    def wait_time(self, now, estimated_tokens, max_in_flight):
+        """距离该key可以接收新请求还需等待的秒数，0表示立即可用"""
+        self._trim(now)
+        wait = max(0.0, self.cooldown_until - now)
+        if self.rpm and len(self.requests) >= self.rpm:
+            wait = max(wait, 60 - (now - self.requests[0]))
+        if self.tpm and self.tokens:
+            used = sum(count for _, count in self.tokens)
+            if used + estimated_tokens > self.tpm:
+                wait = max(wait, 60 - (now - self.tokens[0][0]))
+        if max_in_flight and self.in_flight >= max_in_flight:
+            wait = max(wait, 0.05)
+        return wait
+
+class ApiKeyPool:
+    """按健康状况调度API key
+
+    记录每个key的在途请求数、延迟、429次数以及响应中的
+    Retry-After / x-ratelimit-* 头；被限流的key进入冷却，
+    新请求路由到在途请求最少、延迟最低的健康key，并遵守每个key的RPM/TPM上限。
+    """
+
+    def __init__(self, keys, rpm=0, tpm=0, cooldown=10, max_cooldown=300):
+        """
+        Args:
+            keys: API key列表，元素可以是字符串或 {key, rpm, tpm} 字典（单独覆盖限额）
+            rpm (int): 每个key每分钟请求上限，0表示不限制
+            tpm (int): 每个key每分钟token上限，0表示不限制
+            cooldown (float): 429未给出等待时间时的初始冷却秒数，连续429时指数增长
+        """
+        self.keys = []
+        for item in keys:
+            if isinstance(item, dict):
+                self.keys.append(_KeyState(item['key'], item.get('rpm', rpm), item.get('tpm', tpm)))
+            else:
+                self.keys.append(_KeyState(item, rpm, tpm))
+        if not self.keys:
+            raise ValueError("未配置OpenAI API keys")
+        self._by_key = {state.key: state for state in self.keys}
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cond = threading.Condition()
+
+    def try_acquire(self, estimated_tokens=0, exclude=(), max_in_flight=None, strict=False):
+        """尝试选取一个key
+
+        Args:
+            estimated_tokens (int): 本次请求预估消耗的token数，用于TPM限额
+            exclude: 优先避开的key（如本次请求已失败过的key），没有其他可用key时忽略
+            max_in_flight (int): 每个key的在途请求上限
+            strict (bool): 为True时不回退到exclude中的key，没有其他key时返回 (None, 0)
+
+        Returns:
+            tuple: (key, 0) 或 (None, 建议等待秒数)
+        """
+        with self._cond:
+            now = time.monotonic()
+            healthy = [state for state in self.keys if not state.disabled]
+            if not healthy:
+                raise NoAvailableKeyError("所有API key均已失效")
+            preferred = [state for state in healthy if state.key not in exclude]
+            if not preferred:
+                if strict:
+                    return None, 0
+                preferred = healthy
+
+            waits = {state.key: state.wait_time(now, estimated_tokens, max_in_flight) for state in preferred}
+            ready = [state for state in preferred if waits[state.key] == 0]
+            if not ready:
+                return None, min(waits.values())
+
+            # 在途请求最少优先，其次是延迟最低
+            state = min(ready, key=lambda s: (s.in_flight, s.latency or 0))
+            state.in_flight += 1
+            state.requests.append(now)
+            if estimated_tokens:
+                state.tokens.append((now, estimated_tokens))
+            return state.key, 0
+
+    def acquire(self, estimated_tokens=0, exclude=(), max_in_flight=None):
+        """阻塞直到获得一个可用的key"""
+        while True:
+            key, wait = self.try_acquire(estimated_tokens, exclude, max_in_flight)
+            if key is not None:
+                return key
+            with self._cond:
+                self._cond.wait(wait)
+
+    async def acquire_async(self, estimated_tokens=0, exclude=(), max_in_flight=None):
+        """acquire的asyncio版本，等待时不阻塞事件循环"""
+        while True:
+            key, wait = self.try_acquire(estimated_tokens, exclude, max_in_flight)
+            if key is not None:
+                return key
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, key, status=None, latency=None, headers=None, estimated_tokens=0, used_tokens=None):
+        """请求结束后归还key并根据结果更新健康状态
+
+        Args:
+            status (int): HTTP状态码，网络错误时为None
+            latency (float): 请求耗时，秒
+            headers: 响应头
+            used_tokens (int): 响应usage中的实际token数，用于修正TPM统计
+        """
+        headers = headers or {}
+        with self._cond:
+            state = self._by_key[key]
+            now = time.monotonic()
+            state.in_flight = max(0, state.in_flight - 1)
+
+            if latency is not None and status == 200:
+                state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            if used_tokens is not None and state.tpm:
+                state.tokens.append((now, used_tokens - estimated_tokens))
+
+            if status == 429:
+                state.throttled += 1
+                wait = parse_reset_duration(headers.get('Retry-After'))
+                if wait is None:
+                    wait = parse_reset_duration(headers.get('x-ratelimit-reset-requests'))
+                if wait is None:
+                    wait = min(self.cooldown * 2 ** (state.throttled - 1), self.max_cooldown)
+                state.cooldown_until = max(state.cooldown_until, now + wait)
+            elif status == 401:
+                state.disabled = True
+            elif status == 200:
+                state.throttled = 0
+                # 配额已用完时提前冷却，避免下一个请求再收到429
+                for kind in ('requests', 'tokens'):
+                    remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                    reset = parse_reset_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                    if remaining is not None and reset is not None and remaining.strip() == '0':
+                        state.cooldown_until = max(state.cooldown_until, now + reset)
+            self._cond.notify_all()
@@ -0,0 +1,261 @@
+import math
+import re
+import zlib
+import numpy as np
+
+_WORD_RE = re.compile(r'[a-z0-9][a-z0-9+#]*')
+_CJK_RE = re.compile(r'[一-鿿]+')
+
+class HashedTfidf:
+    """哈希n-gram + TF-IDF特征
+
+    用crc32把token哈希到固定维度，无需维护词表；每个仓库先转换为稀疏词频，
+    再按批构造稠密矩阵做向量化计算，内存占用只与批大小有关。
+    """
+
+    def __init__(self, n_features=2 ** 14, batch_size=512):
+        """
+        Args:
+            n_features (int): 哈希特征空间的维度
+            batch_size (int): 每批向量化处理的仓库数量
+        """
+        self.n_features = n_features
+        self.batch_size = batch_size
+        self.idf = None
+
+    @staticmethod
+    def _tokens(repo):
+        """提取 (token, 权重)：英文按单词和相邻词对，中文按字二元组，topics整体作为强特征"""
+        owner, _, name = repo['name'].partition('/')
+        fields = [
+            (name.replace('-', ' ').replace('_', ' '), 2.0),
+            (repo.get('description') or '', 1.5),
+            (repo.get('readme') or '', 1.0),
+        ]
+        for text, weight in fields:
+            text = text.lower()
+            words = _WORD_RE.findall(text)
+            for index, word in enumerate(words):
+                yield word, weight
+                if index:
+                    yield f"{words[index - 1]} {word}", weight
+            for run in _CJK_RE.findall(text):
+                for index in range(len(run) - 1):
+                    yield run[index:index + 2], weight
+        for topic in repo.get('topics') or []:
+            yield f"topic:{topic.lower()}", 3.0
+            for word in _WORD_RE.findall(topic.lower()):
+                yield word, 1.0
+
+    def _sparse(self, repo):
+        """仓库的稀疏词频向量 (indices, values)"""
+        counts = {}
+        for token, weight in self._tokens(repo):
+            index = zlib.crc32(token.encode('utf-8')) % self.n_features
+            counts[index] = counts.get(index, 0.0) + weight
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return indices, values
+
+    def _fit_idf(self, sparse_rows):
+        """根据文档频率计算平滑IDF"""
+        document_frequency = np.zeros(self.n_features, dtype=np.float32)
+        for indices, _ in sparse_rows:
+            document_frequency[indices] += 1
+        self.idf = (np.log((len(sparse_rows) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+
+    def _dense(self, sparse_rows):
+        """把一批稀疏向量转换为经过TF-IDF加权和L2归一化的稠密矩阵"""
+        matrix = np.zeros((len(sparse_rows), self.n_features), dtype=np.float32)
+        for row, (indices, values) in enumerate(sparse_rows):
+            # 次线性词频，避免长README淹没其他字段
+            matrix[row, indices] = 1.0 + np.log1p(values)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def _batches(self, repos):
+        """逐批产出 (起始下标, 特征矩阵)"""
+        for start in range(0, len(repos), self.batch_size):
+            yield start, self._dense([self._sparse(repo) for repo in repos[start:start + self.batch_size]])
+
+class LocalClassifier(HashedTfidf):
+    """基于哈希n-gram + TF-IDF的最近质心分类器
+
+    完全离线运行在CPU上。用已由LLM分类的仓库训练每个分类的质心，
+    对待分类仓库按批构造特征矩阵，一次矩阵乘法算出对所有分类的相似度。
+    """
+
+    def __init__(self, n_features=2 ** 14, temperature=0.05, min_examples=5, batch_size=512):
+        """
+        Args:
+            n_features (int): 哈希特征空间的维度
+            temperature (float): 把余弦相似度转换为置信度时softmax使用的温度
+            min_examples (int): 分类至少需要多少个训练样本才参与预测
+            batch_size (int): 每批向量化处理的仓库数量
+        """
+        super().__init__(n_features, batch_size)
+        self.temperature = temperature
+        self.min_examples = min_examples
+        self.labels = []
+        self.centroids = None
+
+    def fit(self, repos, categories):
+        """用已分类的仓库训练各分类的质心
+
+        Args:
+            repos: 可迭代的仓库信息字典，category字段为其分类
+            categories: 参与预测的分类列表
+
+        Returns:
+            int: 参与训练的仓库数量
+        """
+        wanted = set(categories)
+        rows = []
+        labels = []
+        for repo in repos:
+            if repo.get('category') in wanted:
+                rows.append(self._sparse(repo))
+                labels.append(repo['category'])
+
+        label_counts = {}
+        for label in labels:
+            label_counts[label] = label_counts.get(label, 0) + 1
+        self.labels = [category for category in categories if label_counts.get(category, 0) >= self.min_examples]
+        if len(self.labels) < 2:
+            self.centroids = None
+            return 0
+
+        self._fit_idf(rows)
+
+        label_index = {label: index for index, label in enumerate(self.labels)}
+        targets = np.array([label_index.get(label, -1) for label in labels])
+        centroids = np.zeros((len(self.labels), self.n_features), dtype=np.float32)
+        for start in range(0, len(rows), self.batch_size):
+            batch_targets = targets[start:start + self.batch_size]
+            keep = batch_targets >= 0
+            matrix = self._dense(rows[start:start + self.batch_size])[keep]
+            np.add.at(centroids, batch_targets[keep], matrix)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.maximum(norms, 1e-12)
+        return int((targets >= 0).sum())
+
+    def predict(self, repos):
+        """预测仓库的分类
+
+        Returns:
+            list: 与输入顺序一致的 (category, confidence)，未训练时返回空列表
+        """
+        if self.centroids is None:
+            return []
+        repos = list(repos)
+        predictions = []
+        for _, matrix in self._batches(repos):
+            # 一次矩阵乘法得到该批仓库对所有分类的余弦相似度
+            scores = matrix @ self.centroids.T
+            logits = (scores - scores.max(axis=1, keepdims=True)) / self.temperature
+            probabilities = np.exp(logits)
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+            best = probabilities.argmax(axis=1)
+            for row, index in enumerate(best):
+                predictions.append((self.labels[index], float(probabilities[row, index])))
+        return predictions
+
+def estimate_saved_calls(repo_count, batch_size=1):
+    """本地分类的仓库数量对应节省的LLM请求数"""
+    return math.ceil(repo_count / max(1, batch_size))
+
+class RepoClusterer(HashedTfidf):
+    """对仓库做球面k-means聚类（余弦相似度）
+
+    只在最多 max_samples 个随机样本上迭代求质心，再按批把全部仓库分配到最近的质心，
+    内存和耗时不随仓库总数线性膨胀。
+    """
+
+    def __init__(self, n_clusters=40, n_features=2 ** 13, max_samples=5000, iterations=20,
+                 batch_size=512, seed=0):
+        super().__init__(n_features, batch_size)
+        self.n_clusters = n_clusters
+        self.max_samples = max_samples
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+
+    def _init_centroids(self, matrix, k):
+        """k-means++初始化：新质心优先选与已有质心都不相似的样本"""
+        centroids = [matrix[self.rng.integers(len(matrix))]]
+        closest = 1 - matrix @ centroids[0]
+        for _ in range(1, k):
+            weights = np.maximum(closest, 0)
+            total = weights.sum()
+            index = self.rng.choice(len(matrix), p=weights / total) if total > 0 else self.rng.integers(len(matrix))
+            centroids.append(matrix[index])
+            closest = np.minimum(closest, 1 - matrix @ matrix[index])
+        return np.stack(centroids)
+
+    def fit(self, repos):
+        """在采样上求聚类质心
+
+        Returns:
+            int: 实际的簇数量
+        """
+        repos = list(repos)
+        if not repos:
+            return 0
+        sample_size = min(len(repos), self.max_samples)
+        sample = [repos[i] for i in self.rng.choice(len(repos), sample_size, replace=False)]
+        rows = [self._sparse(repo) for repo in sample]
+        self._fit_idf(rows)
+        matrix = self._dense(rows)
+
+        k = min(self.n_clusters, len(sample))
+        centroids = self._init_centroids(matrix, k)
+        assignment = None
+        for _ in range(self.iterations):
+            new_assignment = (matrix @ centroids.T).argmax(axis=1)
+            if assignment is not None and np.array_equal(new_assignment, assignment):
+                break
+            assignment = new_assignment
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, matrix)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空簇保留原质心
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self.centroids = centroids
+        return k
+
+    def assign(self, repos):
+        """把仓库分配到最近的簇
+
+        Returns:
+            tuple: (簇编号数组, 与所在簇质心的相似度数组)
+        """
+        repos = list(repos)
+        labels = np.empty(len(repos), dtype=np.int64)
+        similarities = np.empty(len(repos), dtype=np.float32)
+        for start, matrix in self._batches(repos):
+            scores = matrix @ self.centroids.T
+            best = scores.argmax(axis=1)
+            labels[start:start + len(best)] = best
+            similarities[start:start + len(best)] = scores[np.arange(len(best)), best]
+        return labels, similarities
+
+    def clusters(self, repos, representatives=8):
+        """聚类并为每个簇挑选最接近质心的代表仓库
+
+        Returns:
+            list: [{'size': 簇大小, 'repos': 代表仓库列表}]，按簇大小降序
+        """
+        repos = list(repos)
+        if not self.fit(repos):
+            return []
+        labels, similarities = self.assign(repos)
+        result = []
+        for cluster in range(len(self.centroids)):
+            members = np.flatnonzero(labels == cluster)
+            if not len(members):
+                continue
+            top = members[np.argsort(-similarities[members])[:representatives]]
+            result.append({'size': int(len(members)), 'repos': [repos[i] for i in top]})
+        result.sort(key=lambda item: -item['size'])
+        return result
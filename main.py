@@ -1,43 +1,211 @@
 import argparse
+import time
+import yaml
+from db import Database
+from readme_digest import digest_readme
 from star_classifier import StarClassifier
 from template_generator import TemplateGenerator
 
+def load_config():
+    with open('config.yaml', 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def open_database(config=None):
+    """只读取数据库配置打开数据库，搜索时无需初始化GitHub和OpenAI客户端"""
+    config = config or load_config()
+    return Database(config['database']['path'])
+
+def search(args):
+    db = open_database()
+    try:
+        if not db.fts_enabled:
+            print("当前SQLite不支持FTS5 trigram分词（需要3.34+），使用LIKE匹配，结果按名称排序")
+        else:
+            indexed, total = db.get_fts_status()
+            if indexed < total:
+                print(f"全文索引只覆盖了 {indexed}/{total} 个仓库，请运行 python main.py reindex")
+        start = time.perf_counter()
+        results = db.search_repos(' '.join(args.query), category=args.category,
+                                  language=args.language, limit=args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for repo in results:
+            print(f"{repo['name']} [{repo['category'] or '未分类'}] {repo['language'] or ''}")
+            print(f"    {repo['url']}")
+            summary = repo['ai_summary'] or repo['description']
+            if summary:
+                print(f"    {summary}")
+        print(f"\n找到 {len(results)} 个结果，耗时 {elapsed:.1f}ms")
+    finally:
+        db.close()
+
+def reindex(args):
+    config = load_config()
+    db = open_database(config)
+    try:
+        if args.readme:
+            # 旧版本保存的是README原文的前500字，按当前的清洗规则和token预算转换为摘录
+            max_tokens = config['github'].get('readme', {}).get('max_tokens', 200)
+            updated = db.rewrite_readmes(lambda text: digest_readme(text, max_tokens))
+            print(f"已重新清洗 {updated} 个仓库的README，之后运行 classify 会重新分类这些仓库")
+        if not db.fts_enabled:
+            print("当前SQLite不支持FTS5 trigram分词（需要3.34+），无法建立全文索引")
+            return
+        indexed = db.rebuild_fts(full=args.full)
+        print(f"全文索引已更新，新索引 {indexed} 个仓库")
+    finally:
+        db.close()
+
 def main():
     parser = argparse.ArgumentParser(description='GitHub Star 仓库分类工具')
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
     
     # 获取仓库子命令
     fetch_parser = subparsers.add_parser('fetch', help='获取GitHub Star的仓库信息')
+    fetch_parser.add_argument('--engine',
+                            choices=['rest', 'graphql'],
+                            default='rest',
+                            help='获取引擎：rest逐个仓库请求，graphql按页批量请求')
+    fetch_parser.add_argument('-i', '--incremental',
+                            action='store_true',
+                            help='增量获取：遇到连续已保存的仓库即停止，仅刷新有新push的仓库')
+    fetch_parser.add_argument('--user',
+                            dest='users',
+                            metavar='NAME',
+                            nargs='+',
+                            help='只获取这些用户的star，默认为配置中的所有账号；未配置的用户只获取公开的star')
     
     # 分类子命令
     classify_parser = subparsers.add_parser('classify', help='对仓库进行分类')
     classify_parser.add_argument('-u', '--uncategorized-only',
                                action='store_true',
                                help='仅处理未分类的仓库')
+    classify_parser.add_argument('--async',
+                               dest='use_async',
+                               action='store_true',
+                               help='使用asyncio引擎，单进程即可维持大量并发的LLM请求')
+    classify_parser.add_argument('-f', '--force',
+                               action='store_true',
+                               help='重新分类输入（仓库信息、分类列表、模型参数）未变化的仓库，并且不使用LLM响应缓存')
+    classify_parser.add_argument('-b', '--batch-size',
+                               type=int,
+                               default=1,
+                               help='每次请求打包分类的仓库数量，减少重复的提示词和请求次数')
+    classify_parser.add_argument('-l', '--local',
+                               action='store_true',
+                               help='先用本地分类器预分类，只把低置信度的仓库交给LLM')
+    classify_parser.add_argument('-w', '--worker',
+                               action='store_true',
+                               help='只处理任务队列中已有的分类任务，可在多个进程中同时运行')
+    batch_group = classify_parser.add_mutually_exclusive_group()
+    batch_group.add_argument('--export-batch',
+                           metavar='PATH',
+                           help='不调用API，把需要分类的仓库导出为Batch API请求文件（按大小分片为 PATH-001.jsonl ...）')
+    batch_group.add_argument('--import-batch',
+                           metavar='PATH',
+                           nargs='+',
+                           help='导入Batch API返回的结果文件')
+    
+    # 同步子命令：获取与分类重叠执行
+    sync_parser = subparsers.add_parser('sync', help='获取仓库信息的同时进行分类')
+    sync_parser.add_argument('--engine',
+                           choices=['rest', 'graphql'],
+                           default='rest',
+                           help='获取引擎：rest逐个仓库请求，graphql按页批量请求')
+    sync_parser.add_argument('-i', '--incremental',
+                           action='store_true',
+                           help='增量获取：遇到连续已保存的仓库即停止，仅刷新有新push的仓库')
+    sync_parser.add_argument('-f', '--force',
+                           action='store_true',
+                           help='重新分类输入未变化的仓库，并且不使用LLM响应缓存')
+    sync_parser.add_argument('--user',
+                           dest='users',
+                           metavar='NAME',
+                           nargs='+',
+                           help='只获取这些用户的star，默认为配置中的所有账号')
+    sync_parser.add_argument('--readme',
+                           action='store_true',
+                           help='同步完成后重新生成STAR.md，多个账号时为每个用户生成 STAR-<用户>.md')
     
     # 生成分类子命令
     categories_parser = subparsers.add_parser('gen-cat', help='使用AI生成合适的分类')
     
     # 生成文档子命令
     generate_parser = subparsers.add_parser('gen-readme', help='生成README文档')
+    generate_parser.add_argument('-o', '--output',
+                               default='STAR.md',
+                               help='输出文件，默认为STAR.md')
+    generate_parser.add_argument('--split',
+                               action='store_true',
+                               help='每个分类单独生成一个文件，输出文件作为索引')
+    generate_parser.add_argument('-f', '--force',
+                               action='store_true',
+                               help='数据未变化时也重新渲染（修改文档模板后使用）')
+    user_group = generate_parser.add_mutually_exclusive_group()
+    user_group.add_argument('--user',
+                          metavar='NAME',
+                          help='只包含该用户star的仓库')
+    user_group.add_argument('--per-user',
+                          action='store_true',
+                          help='为每个用户分别生成 <输出文件>-<用户>.md')
+    
+    # 全文搜索子命令
+    search_parser = subparsers.add_parser('search', help='全文搜索已保存的仓库')
+    search_parser.add_argument('query', nargs='+', help='关键词，多个关键词需同时匹配')
+    search_parser.add_argument('-c', '--category', help='只搜索该分类')
+    search_parser.add_argument('-l', '--language', help='只搜索该语言')
+    search_parser.add_argument('-n', '--limit', type=int, default=20, help='最多显示的结果数')
+    
+    # 重建全文索引子命令
+    reindex_parser = subparsers.add_parser('reindex', help='为旧数据库补齐全文索引')
+    reindex_parser.add_argument('--full',
+                              action='store_true',
+                              help='清空后完整重建全文索引')
+    reindex_parser.add_argument('--readme',
+                              action='store_true',
+                              help='把旧版本保存的README原文重新清洗为摘录')
     
     args = parser.parse_args()
     
     if not args.command:
         parser.print_help()
         return
+    
+    if args.command == 'search':
+        search(args)
+        return
+    if args.command == 'reindex':
+        reindex(args)
+        return
         
     classifier = StarClassifier()
     
     if args.command == 'fetch':
-        classifier.run('fetch_only')
+        classifier.run('fetch_only', engine=args.engine, incremental=args.incremental, users=args.users)
+    elif args.command == 'classify' and args.export_batch:
+        classifier.run('export_batch', uncategorized_only=args.uncategorized_only, force=args.force,
+                       local=args.local, batch_files=args.export_batch)
+    elif args.command == 'classify' and args.import_batch:
+        classifier.run('import_batch', batch_files=args.import_batch)
     elif args.command == 'classify':
-        classifier.run('classify', uncategorized_only=args.uncategorized_only)
+        classifier.run('classify', uncategorized_only=args.uncategorized_only, use_async=args.use_async,
+                       force=args.force, batch_size=args.batch_size, local=args.local, worker=args.worker)
+    elif args.command == 'sync':
+        classifier.run('sync', engine=args.engine, incremental=args.incremental, force=args.force,
+                       users=args.users)
+        if args.readme:
+            generator = TemplateGenerator()
+            if len(classifier._select_accounts(args.users)) > 1:
+                generator.generate_user_readmes('STAR.md')
+            else:
+                generator.generate_readme('STAR.md')
     elif args.command == 'gen-cat':
         classifier.run('getcategories')
     elif args.command == 'gen-readme':
         generator = TemplateGenerator()
-        generator.generate_readme('STAR.md')
+        if args.per_user:
+            generator.generate_user_readmes(args.output, split=args.split, force=args.force)
+        else:
+            generator.generate_readme(args.output, split=args.split, user=args.user, force=args.force)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,238 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# 延迟直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def mask_secret(secret):
+    """API key/token只保留末4位用作标签"""
+    if not secret:
+        return 'none'
+    return f"...{secret[-4:]}"
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count', 'min', 'max')
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, buckets, value):
+        index = 0
+        while index < len(buckets) and value > buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, buckets, fraction):
+        """按桶估算分位数，返回所在桶的上限"""
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return buckets[index] if index < len(buckets) else self.max
+        return self.max
+
+class Metrics:
+    """线程安全的指标收集器
+
+    记录延迟直方图、计数器和当前值（均带标签），运行结束时输出JSON报告和
+    Prometheus文本格式文件；可选地把每个仓库的处理过程逐行写入JSONL追踪文件。
+    """
+
+    def __init__(self, namespace='star_classifier', buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._trace_lock = threading.Lock()
+        self.started_at = datetime.now()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        """记录一次耗时（秒）"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(self.buckets, seconds)
+
+    def count(self, name, value=1, **labels):
+        """计数器累加"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """记录当前值（如并发上限），报告中保留最后一次的值"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    @contextmanager
+    def timer(self, name, counter=None, **labels):
+        """计时上下文，代码块中可以向返回的字典补充标签（如状态码）
+
+        代码块抛出异常时自动加上 status=error 标签；指定counter时同时以相同标签计数。
+        """
+        extra = {}
+        start = time.perf_counter()
+        try:
+            yield extra
+        except BaseException:
+            extra.setdefault('status', 'error')
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels, **extra)
+            if counter:
+                self.count(counter, **labels, **extra)
+
+    def start_trace(self, path):
+        """开启追踪，之后每次trace调用写入一行JSON"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._trace_file = open(path, 'a', encoding='utf-8')
+
+    def trace(self, kind, **fields):
+        if self._trace_file is None:
+            return
+        line = json.dumps({'ts': datetime.now().isoformat(timespec='milliseconds'), 'kind': kind, **fields},
+                          ensure_ascii=False, default=str)
+        with self._trace_lock:
+            self._trace_file.write(line + '\n')
+
+    def close(self):
+        with self._trace_lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def report(self):
+        """汇总为JSON可序列化的字典"""
+        with self._lock:
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': round(histogram.total, 6),
+                    'min': histogram.min,
+                    'max': histogram.max,
+                    'p50': histogram.quantile(self.buckets, 0.50),
+                    'p90': histogram.quantile(self.buckets, 0.90),
+                    'p99': histogram.quantile(self.buckets, 0.99),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._gauges.items())
+            ]
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'histograms': histograms,
+            'counters': counters,
+            'gauges': gauges,
+        }
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ''
+        escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                   for key, value in items)
+        return '{' + ','.join(escaped) + '}'
+
+    def prometheus(self):
+        """Prometheus文本格式（可供node_exporter的textfile collector读取）"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        typed = set()
+        for (name, labels), histogram in histograms:
+            metric = f"{self.namespace}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{self._format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{self._format_labels(labels)} {histogram.total}")
+            lines.append(f"{metric}_count{self._format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            metric = f"{self.namespace}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{self._format_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            metric = f"{self.namespace}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{self._format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_reports(self, output_dir, run_name='run'):
+        """写入 <run_name>-<时间>.json 报告，并覆盖 <namespace>.prom
+
+        Returns:
+            tuple: (json报告路径, prometheus文件路径)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        json_path = os.path.join(output_dir, f"{run_name}-{self.started_at:%Y%m%d-%H%M%S}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        prom_path = os.path.join(output_dir, f"{self.namespace}.prom")
+        # 先写临时文件再替换，避免采集器读到写了一半的文件
+        with open(prom_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(prom_path + '.tmp', prom_path)
+        return json_path, prom_path
+
+def timed_method(metric, method_name, method):
+    """包装实例方法，通过实例的 metrics 属性记录调用耗时"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = getattr(self, 'metrics', None)
+        if metrics is None:
+            return method(self, *args, **kwargs)
+        with metrics.timer(metric, method=method_name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def instrument_public_methods(cls, metric):
+    """为类的所有公开普通方法记录调用耗时（生成器方法除外，其耗时取决于调用方的消费速度）"""
+    for name, member in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(member) or inspect.isgeneratorfunction(member):
+            continue
+        setattr(cls, name, timed_method(metric, name, member))
+    return cls
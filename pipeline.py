@@ -0,0 +1,136 @@
+import threading
+import time
+from queue import Queue
+from tqdm import tqdm
+
+_STOP = object()
+
+class StreamPipeline:
+    """有界队列串联的流式处理管线
+
+    生产者线程遍历数据源（如分页列表）→ 有界队列 → N个工作线程 →
+    有界队列 → 调用线程按批写入数据库。队列满时上游阻塞（背压），
+    因此内存占用只与队列长度有关，与数据源大小无关。
+    """
+
+    def __init__(self, process, write, workers=5, queue_size=None, flush_size=100,
+                 retryable=(), desc="处理仓库", position=None):
+        """
+        Args:
+            process: 工作线程调用的处理函数，返回None表示处理失败
+            write: 批量写入函数，接收结果列表并返回写入数量
+            workers (int): 工作线程数
+            queue_size (int): 每个队列的容量，默认为工作线程数的4倍
+            flush_size (int): 攒够多少条结果后写入一次
+            retryable: 处理函数抛出这些异常时，条目被推迟而不是丢弃
+            desc (str): 进度条标题
+            position (int): 进度条所在行，多个管线同时运行时区分显示
+        """
+        self.process = process
+        self.write = write
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * 4
+        self.flush_size = flush_size
+        self.retryable = tuple(retryable)
+        self.desc = desc
+        self.position = position
+
+    def run(self, source):
+        """运行管线直到数据源耗尽
+
+        Args:
+            source: 可迭代的待处理条目
+
+        Returns:
+            tuple: (success_count, total, deferred)，deferred为被推迟的条目列表
+
+        Raises:
+            数据源或处理函数抛出的第一个意外异常（retryable之外的异常）
+        """
+        items = Queue(maxsize=self.queue_size)
+        results = Queue(maxsize=self.queue_size)
+        counts = {'listed': 0, 'processed': 0, 'written': 0}
+        errors = []
+        # 处理函数抛出意外异常后不再处理剩余条目，已完成的结果照常写入，最后在调用线程中抛出该异常
+        failed = threading.Event()
+        start = time.monotonic()
+
+        def produce():
+            try:
+                for item in source:
+                    # 出错后仍然遍历完数据源，上游（如sync的获取阶段）不会因为没人消费而阻塞
+                    if failed.is_set():
+                        continue
+                    items.put(item)
+                    counts['listed'] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                for _ in range(self.workers):
+                    items.put(_STOP)
+
+        def work():
+            try:
+                while True:
+                    item = items.get()
+                    if item is _STOP:
+                        return
+                    if failed.is_set():
+                        continue
+                    try:
+                        results.put((item, self.process(item), None))
+                    except self.retryable as e:
+                        results.put((item, None, e))
+                    except Exception as e:
+                        errors.append(e)
+                        failed.set()
+            finally:
+                results.put(_STOP)
+
+        threads = [threading.Thread(target=produce, name='pipeline-producer', daemon=True)]
+        threads += [
+            threading.Thread(target=work, name=f'pipeline-worker-{index}', daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # 写入阶段在调用线程中执行
+        buffer = []
+        deferred = []
+        finished_workers = 0
+        with tqdm(desc=self.desc, position=self.position) as progress:
+            while finished_workers < self.workers:
+                result = results.get()
+                if result is _STOP:
+                    finished_workers += 1
+                    continue
+                item, value, error = result
+                counts['processed'] += 1
+                progress.update(1)
+                if error is not None:
+                    deferred.append(item)
+                elif value:
+                    buffer.append(value)
+                if len(buffer) >= self.flush_size:
+                    counts['written'] += self.write(buffer)
+                    buffer = []
+                    progress.set_postfix(self._stage_rates(counts, start), refresh=False)
+            counts['written'] += self.write(buffer)
+            progress.set_postfix(self._stage_rates(counts, start))
+
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return counts['written'], counts['listed'], deferred
+
+    @staticmethod
+    def _stage_rates(counts, start):
+        """各阶段的吞吐量（条/秒）"""
+        elapsed = max(time.monotonic() - start, 1e-6)
+        return {
+            "读取": f"{counts['listed'] / elapsed:.1f}/s",
+            "处理": f"{counts['processed'] / elapsed:.1f}/s",
+            "写入": f"{counts['written'] / elapsed:.1f}/s",
+        }
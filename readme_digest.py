@@ -0,0 +1,75 @@
+import re
+
+# 中日韩文字大约每字一个token，其余文本大约每4个字符一个token
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]')
+_HTML_COMMENT = re.compile(r'<!--.*?(?:-->|$)', re.S)
+_HTML_TAG = re.compile(r'</?[a-zA-Z][^>]*>')
+_IMAGE = re.compile(r'!\[[^\]]*\](?:\([^)]*\)|\[[^\]]*\])')
+_EMPTY_LINK = re.compile(r'\[\s*\](?:\([^)]*\)|\[[^\]]*\])')
+_LINK = re.compile(r'\[([^\]]+)\](?:\([^)]*\)|\[[^\]]*\])')
+_LINK_DEFINITION = re.compile(r'^\s*\[[^\]]+\]:\s*\S+')
+_URL = re.compile(r'https?://\S+')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_TABLE_SEPARATOR = re.compile(r'^[\s|:\-]+$')
+_EMPHASIS = re.compile(r'(\*\*|__|\*|`)')
+_HEADING = re.compile(r'^\s*#{1,6}\s*')
+_LIST_MARKER = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+# 去掉标记后没有文字或数字的行（分隔线、只剩标点或emoji的行）
+_WORD = re.compile(r'\w')
+
+def estimate_tokens(text):
+    """粗略估算文本的token数"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _clean_line(line):
+    line = _IMAGE.sub('', line)
+    line = _EMPTY_LINK.sub('', line)
+    line = _LINK.sub(r'\1', line)
+    line = _URL.sub('', line)
+    line = _HEADING.sub('', line)
+    line = _LIST_MARKER.sub('', line)
+    line = _EMPHASIS.sub('', line)
+    line = line.replace('|', ' ').replace('&nbsp;', ' ')
+    return ' '.join(line.split())
+
+def iter_readme_lines(text):
+    """逐行生成README中对分类有用的文字：保留标题和正文，去掉徽章、图片、HTML、链接地址和代码块"""
+    in_fence = False
+    previous = None
+    # HTML标签可能跨行，先在全文上去掉
+    text = _HTML_TAG.sub(' ', _HTML_COMMENT.sub('', text))
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence or _LINK_DEFINITION.match(line) or _TABLE_SEPARATOR.match(line):
+            continue
+        line = _clean_line(line)
+        if not _WORD.search(line) or line == previous:
+            continue
+        previous = line
+        yield line
+
+def digest_readme(text, max_tokens=200):
+    """生成不超过max_tokens的README摘录
+
+    Args:
+        text (str): README原文（可以是截断的前N KB）
+        max_tokens (int): token预算
+
+    Returns:
+        str: 每行一段的纯文本摘录
+    """
+    lines = []
+    budget = max_tokens
+    for line in iter_readme_lines(text or ''):
+        tokens = estimate_tokens(line) + 1
+        if tokens > budget:
+            # 预算不够放下整行时按比例截取，剩余预算太少则直接结束
+            if budget >= 8:
+                lines.append(line[:max(1, len(line) * (budget - 1) // tokens)])
+            break
+        lines.append(line)
+        budget -= tokens
+    return '\n'.join(lines)
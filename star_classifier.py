@@ -1,13 +1,27 @@
 import json
 import yaml
 import os
+import hashlib
+import time
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from queue import Queue
 import requests
 from github import Github
 from tqdm import tqdm
 from db import Database, DatabaseError
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
-import threading
+from github_graphql import GraphQLStarFetcher
+from pipeline import StreamPipeline
+from github_scheduler import GitHubScheduler, RateLimitedSession, RateLimitError
+from key_pool import ApiKeyPool
+from metrics import Metrics, mask_secret
+from readme_digest import digest_readme
+from batch_api import BatchApi
+from concurrency_limit import AdaptiveLimiter
+from hedging import HedgePolicy
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime
 
 class StarClassifier:
@@ -22,97 +36,567 @@ class StarClassifier:
             if db_dir:
                 os.makedirs(db_dir, exist_ok=True)
             
+            # 指标：请求延迟、状态码、排队等待和token用量，运行结束时输出报告
+            self.metrics_config = self.config.get('metrics', {})
+            self.metrics = Metrics()
+            
             # 初始化GitHub客户端和数据库
-            self.github = Github(self.config['github']['token'])
+            self.github_api_url = self.config['github'].get('api_url', 'https://api.github.com').rstrip('/')
+            # GitHub请求的连接和读取超时（秒），超时的请求计入自适应并发的退避
+            github_timeout = self.config['github'].get('timeout', {})
+            self.github_timeout = (github_timeout.get('connect', 10), github_timeout.get('read', 30))
+            self.github = Github(self.config['github']['token'], base_url=self.github_api_url, per_page=100,
+                                 timeout=self.github_timeout[1])
+            # 逐仓库的REST请求走由token池调度的会话；304响应不计入rate limit
+            self.github_tokens = self.config['github'].get('tokens') or [self.config['github']['token']]
+            self.github_session = self._create_github_session()
+            self.github_session.headers.update({"Accept": "application/vnd.github+json"})
+            # README只下载前max_bytes字节，清洗后保留不超过max_tokens的摘录
+            readme_config = self.config['github'].get('readme', {})
+            self.readme_max_bytes = readme_config.get('max_bytes', 16 * 1024)
+            self.readme_max_tokens = readme_config.get('max_tokens', 200)
             self.session = requests.Session()
-            self.db = Database(self.config['database']['path'])
+            self.db = Database(
+                self.config['database']['path'],
+                read_pool_size=self.config['database'].get('read_pool_size', 4),
+                write_batch_size=self.config['database'].get('write_batch_size', 256),
+                metrics=self.metrics
+            )
             self.categories_data = {}
+            # 当前分类列表在数据库中的版本号，分类前注册；分类结果记录所用的版本
+            self.category_version = None
+            self.migration_config = self.config.get('category_migration', {})
             
-            # 初始化线程池和数据库锁
+            # 初始化线程池（数据库写入由Database的写线程串行化，无需额外加锁；
+            # 获取仓库使用pipeline中的流式管线，工作线程数为fetch_max_workers）
             self.fetch_max_workers = self.config.get('concurrency', {}).get('fetch', {}).get('max_workers', 1)
             self.classify_max_workers = self.config.get('concurrency', {}).get('classify', {}).get('max_workers', 1)
-            self.db_lock = threading.Lock()
-            self.fetch_executor = ThreadPoolExecutor(max_workers=self.fetch_max_workers)
-            self.classify_executor = ThreadPoolExecutor(max_workers=self.classify_max_workers)
+            self.flush_size = self.config['database'].get('flush_size', 100)
+            # 启用自适应并发时按上界准备工作线程，实际在途请求数由限制器控制，max_workers为初始值
+            self.fetch_limiter = self._create_limiter('fetch', self.fetch_max_workers)
+            self.classify_limiter = self._create_limiter('classify', self.classify_max_workers)
+            self.github_session.limiter = self.fetch_limiter
+            self.fetch_workers = self.fetch_limiter.max_limit if self.fetch_limiter else self.fetch_max_workers
+            self.classify_workers = (self.classify_limiter.max_limit if self.classify_limiter
+                                     else self.classify_max_workers)
+            self.classify_executor = ThreadPoolExecutor(max_workers=self.classify_workers)
             
-            # 初始化API key轮询
-            self.api_keys = self.config['openai'].get('api_keys', [])
-            self.current_api_key_index = 0
-            self.api_key_lock = threading.Lock()
+            # LLM响应缓存
+            self.llm_cache_config = self.config['openai'].get('cache', {})
+            self.llm_cache_enabled = self.llm_cache_config.get('enabled', True)
+            # classify/sync --force 时不读取缓存，重新请求的响应仍会写入缓存
+            self.llm_cache_refresh = False
             
+            # 初始化API key池：按在途请求数、延迟和限流状态选择key
+            self.api_keys = self.config['openai'].get('api_keys', [])
             if not self.api_keys:
                 raise ValueError("未配置OpenAI API keys")
+            key_pool_config = self.config['openai'].get('key_pool', {})
+            self.key_pool = ApiKeyPool(
+                self.api_keys,
+                rpm=key_pool_config.get('rpm', 0),
+                tpm=key_pool_config.get('tpm', 0),
+                cooldown=key_pool_config.get('cooldown', 10),
+                max_cooldown=key_pool_config.get('max_cooldown', 300)
+            )
+            self.max_attempts = key_pool_config.get('max_attempts', 3)
+            # 单个LLM请求的连接和读取超时（秒）
+            timeout_config = self.config['openai'].get('timeout', {})
+            self.openai_timeout = (timeout_config.get('connect', 10), timeout_config.get('read', 120))
+            # 对冲请求：超过延迟分位数仍未返回时用另一个key发送副本，原请求和副本各占一个线程
+            self.hedge = self._create_hedge_policy()
+            self.hedge_executor = (ThreadPoolExecutor(max_workers=self.classify_workers * 2,
+                                                      thread_name_prefix='llm-hedge')
+                                   if self.hedge else None)
+            
+            # 要获取star的账号；同一次获取中已由其他账号处理过的仓库不再重复请求详情
+            self.accounts = self._load_accounts()
+            self._claimed = set()
+            self._claimed_lock = threading.Lock()
+            
+            # 分类任务队列：多个进程共享同一个数据库时用租约区分各自认领的任务
+            self.jobs_config = self.config.get('jobs', {})
+            self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
         except Exception as e:
             print(f"初始化失败: {str(e)}")
             raise
 
-    def _get_next_api_key(self):
-        """获取下一个API key（线程安全）"""
-        with self.api_key_lock:
-            api_key = self.api_keys[self.current_api_key_index]
-            self.current_api_key_index = (self.current_api_key_index + 1) % len(self.api_keys)
-            return api_key
+    def _create_github_session(self, token=None):
+        """创建按剩余配额在多个token间调度、自动限速的GitHub会话，指定token时固定使用该token"""
+        rate_limit = self.config['github'].get('rate_limit', {})
+        scheduler = GitHubScheduler(
+            self.github_tokens,
+            requests_per_second=rate_limit.get('requests_per_second', 10),
+            burst=rate_limit.get('burst', 20),
+            reserve=rate_limit.get('reserve', 10),
+            secondary_wait=rate_limit.get('secondary_wait', 60)
+        )
+        return RateLimitedSession(scheduler, max_retries=rate_limit.get('max_retries', 5), metrics=self.metrics,
+                                  token=token, timeout=self.github_timeout)
+
+    def _create_limiter(self, stage, initial):
+        """concurrency.<stage>.adaptive.enabled 为true时创建AIMD并发限制器，否则返回None（固定并发数）"""
+        adaptive = self.config.get('concurrency', {}).get(stage, {}).get('adaptive', {})
+        if not adaptive.get('enabled', False):
+            return None
+        return AdaptiveLimiter(
+            stage,
+            initial,
+            min_limit=adaptive.get('min', 1),
+            max_limit=adaptive.get('max', max(initial, 32)),
+            decrease=adaptive.get('decrease', 0.5),
+            latency_tolerance=adaptive.get('latency_tolerance', 2.0),
+            metrics=self.metrics
+        )
+
+    def _create_hedge_policy(self):
+        """openai.hedge.enabled 为true且至少有两个API key时创建对冲策略，否则返回None"""
+        hedge = self.config['openai'].get('hedge', {})
+        if not hedge.get('enabled', False):
+            return None
+        if len(self.api_keys) < 2:
+            print("对冲请求需要至少两个API key，已禁用")
+            return None
+        return HedgePolicy(
+            percentile=hedge.get('percentile', 0.95),
+            min_delay=hedge.get('min_delay', 1.0),
+            max_ratio=hedge.get('max_ratio', 0.05),
+            window=hedge.get('window', 500),
+            min_samples=hedge.get('min_samples', 20)
+        )
+
+    def _report_hedging(self):
+        if self.hedge is not None:
+            print(f"\n{self.hedge.summary()}")
+
+    @staticmethod
+    def _limited(limiter, fn):
+        """每次调用fn前占用限制器的一个并发名额，未启用自适应并发时原样返回"""
+        if limiter is None:
+            return fn
+
+        def run(*args):
+            with limiter.slot():
+                return fn(*args)
+        return run
+
+    @staticmethod
+    def _report_limiter(limiter):
+        if limiter is not None:
+            print(f"\n{limiter.summary()}")
 
-    def _process_single_repo(self, repo):
-        """处理单个仓库的辅助方法"""
+    @staticmethod
+    def _format_pushed_at(pushed_at):
+        """统一pushed_at格式，与GraphQL返回的ISO 8601 UTC时间一致"""
+        if not pushed_at:
+            return None
+        return pushed_at.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _fetch_readme(self, repo_name, etag=None):
+        """获取README摘录，携带ETag时发送条件请求
+
+        请求原始格式（raw media type）并流式读取，超过 readme_max_bytes 的部分不下载。
+
+        Returns:
+            tuple: (readme, etag)；README未变化（304）时readme为None，仓库没有README（404）时为空字符串；
+                请求失败（5xx、429、网络错误等）时返回 (None, None)，由调用方保留已保存的README
+        """
+        headers = {"Accept": "application/vnd.github.raw+json"}
+        if etag:
+            headers["If-None-Match"] = etag
         try:
-            
+            with self.github_session.get(f"{self.github_api_url}/repos/{repo_name}/readme",
+                                         headers=headers, stream=True, timeout=self.github_timeout) as response:
+                if response.status_code == 304:
+                    return None, etag
+                if response.status_code == 404:
+                    return "", None
+                if response.status_code != 200:
+                    return None, None
+                content = self._read_limited(response, self.readme_max_bytes)
+            # 截断处可能切开多字节字符，忽略不完整的字节
+            readme = digest_readme(content.decode('utf-8', errors='ignore'), self.readme_max_tokens)
+            return readme, response.headers.get('ETag')
+        except RateLimitError:
+            raise
+        except Exception:
+            return None, None
+
+    @staticmethod
+    def _read_limited(response, max_bytes):
+        """读取响应体的前max_bytes字节，提前关闭连接不再接收剩余部分"""
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(chunk_size=8192):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+        return b''.join(chunks)[:max_bytes]
+
+    def _process_single_repo(self, repo, fetch_state=None):
+        """处理单个仓库的辅助方法
+
+        Args:
+            repo: PyGithub的Repository对象
+            fetch_state (tuple): 数据库中记录的 (pushed_at, readme_etag)，新仓库为None
+
+        Returns:
+            dict: 仓库信息，失败时返回None；由调用方批量写入数据库
+
+        Raises:
+            RateLimitError: 被限流且重试用尽，由调用方推迟后重试
+        """
+        start = time.perf_counter()
+        readme_state = 'unchanged'
+        try:
+            pushed_at = self._format_pushed_at(repo.pushed_at)
             repo_data = {
                 "name": repo.full_name,
                 "description": repo.description or "",
                 "language": repo.language or "",
-                "topics": repo.get_topics(),
+                # star列表的响应中已包含topics，无需再单独请求
+                "topics": repo.topics or [],
                 "url": repo.html_url,
+                "pushed_at": pushed_at,
             }
             
-            # 获取README内容
-            try:
-                readme = repo.get_readme()
-                content = readme.decoded_content.decode('utf-8')
-                repo_data["readme"] = content[:500] # 只取前500字
-            except:
-                repo_data["readme"] = ""
-            
-            # 使用锁保护数据库操作
-            with self.db_lock:
-                # 检查仓库是否存在
-                exists = self.db.repo_exists(repo.full_name)
-                self.db.save_repo(repo_data)
-            return True
+            # 获取README内容：仓库自上次同步后没有新的push时沿用已保存的README
+            stored_pushed_at, stored_etag = fetch_state or (None, None)
+            if fetch_state and pushed_at and stored_pushed_at == pushed_at:
+                repo_data["readme"], repo_data["readme_etag"] = None, None
+            else:
+                readme, readme_etag = self._fetch_readme(repo.full_name, stored_etag)
+                if readme is None and readme_etag is None:
+                    # 请求失败：保留已保存的README，也不更新pushed_at，下次获取时重新请求
+                    readme_state = 'error'
+                    repo_data["pushed_at"] = None
+                    readme = None if fetch_state else ""
+                else:
+                    readme_state = 'not_modified' if readme is None else 'fetched'
+                repo_data["readme"], repo_data["readme_etag"] = readme, readme_etag
+            
+            self._record_repo_fetch(repo.full_name, start, readme_state)
+            return repo_data
+        except RateLimitError:
+            self._record_repo_fetch(repo.full_name, start, 'rate_limited')
+            raise
         except Exception as e:
+            self._record_repo_fetch(repo.full_name, start, 'error')
             print(f"处理仓库 {repo.full_name} 时出错: {str(e)}")
-            return False
+            return None
+
+    def _record_repo_fetch(self, repo_name, start, readme_state):
+        """记录单个仓库的获取耗时，开启追踪时写入一行trace"""
+        seconds = time.perf_counter() - start
+        self.metrics.observe('repo_fetch_seconds', seconds, readme=readme_state)
+        self.metrics.trace('fetch', repo=repo_name, readme=readme_state, seconds=round(seconds, 4))
+
+    @staticmethod
+    def _chunked(iterable, size):
+        """把可迭代对象按固定大小分块"""
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _timed_pages(self, pages, token):
+        """记录PyGithub翻页请求的耗时（每块100个仓库恰好对应一页）
+
+        Args:
+            token (str): 翻页实际使用的token，用于指标标签
+        """
+        pages = iter(pages)
+        labels = {'service': 'github', 'endpoint': '/user/starred', 'key': mask_secret(token)}
+        while True:
+            start = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            except Exception as e:
+                # PyGithub的GithubException带有HTTP状态码，其他异常（如网络错误）记为error
+                status = getattr(e, 'status', None) or 'error'
+                self.metrics.observe('http_request_seconds', time.perf_counter() - start, **labels, status=status)
+                self.metrics.count('http_requests', **labels, status=status)
+                raise
+            self.metrics.observe('http_request_seconds', time.perf_counter() - start, **labels, status=200)
+            self.metrics.count('http_requests', **labels, status=200)
+            yield page
+
+    def _load_accounts(self):
+        """读取要获取star的GitHub账号
+
+        github.accounts 中每项为用户名，或包含 user/token 的字典（有token时可获取私有star）；
+        未配置时使用 github.username 和 github.token。
+        """
+        github_config = self.config['github']
+        accounts = []
+        for item in github_config.get('accounts') or []:
+            if isinstance(item, str):
+                item = {'user': item}
+            accounts.append({'user': item.get('user'), 'token': item.get('token')})
+        if not accounts:
+            accounts.append({'user': github_config.get('username'), 'token': github_config['token']})
+        return accounts
+
+    def _select_accounts(self, users=None):
+        """按用户名筛选账号，不在配置中的用户只获取其公开的star"""
+        if not users:
+            return self.accounts
+        configured = {account['user']: account for account in self.accounts}
+        return [configured.get(user, {'user': user, 'token': None}) for user in users]
+
+    def _github_user(self, account):
+        """账号对应的PyGithub用户对象，并补全账号的用户名"""
+        if not account.get('token'):
+            return self.github.get_user(account['user'])
+        if account['token'] == self.config['github']['token']:
+            github = self.github
+        else:
+            github = Github(account['token'], base_url=self.github_api_url, per_page=100)
+        user = github.get_user()
+        # star关系按token实际对应的用户名记录
+        account['user'] = user.login
+        return user
+
+    def _claim_repo(self, name):
+        """本次获取中第一个遇到该仓库的账号负责获取详情，其他账号只记录star关系"""
+        with self._claimed_lock:
+            if name in self._claimed:
+                return False
+            self._claimed.add(name)
+            return True
 
-    def fetch_starred_repos(self):
-        """获取用户star的所有仓库"""
-        # TODO 超出rate limit的解决方案
+    @staticmethod
+    def _merge_iterators(iterators, queue_size=100):
+        """每个可迭代对象在单独的线程中遍历，产出的条目合并为一个生成器
+
+        任一线程出错时，在其余线程结束后抛出第一个异常。
+        """
+        iterators = list(iterators)
+        if len(iterators) == 1:
+            yield from iterators[0]
+            return
+        merged = Queue(maxsize=queue_size)
+        done = object()
+        errors = []
+
+        def drain(iterator):
+            try:
+                for item in iterator:
+                    merged.put(item)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                merged.put(done)
+
+        for index, iterator in enumerate(iterators):
+            threading.Thread(target=drain, args=(iterator,), name=f'star-list-{index}', daemon=True).start()
+        remaining = len(iterators)
+        while remaining:
+            item = merged.get()
+            if item is done:
+                remaining -= 1
+            else:
+                yield item
+        if errors:
+            raise errors[0]
+
+    def _iter_starred_for_fetch(self, account, incremental=False):
+        """逐页遍历一个账号的Star列表，记录star关系并生成需要获取详情的 (repo, fetch_state)
+
+        同步状态按页从数据库查询，内存占用与Star总数无关。
+
+        Args:
+            account (dict): 账号，包含 user 和可选的 token
+            incremental (bool): 遇到连续若干个该用户已star过的仓库后停止翻页
+        """
+        user = self._github_user(account)
+        login = account['user']
+        # /user/starred 默认按star时间倒序返回，最新star的仓库在最前面
+        starred_repos = user.get_starred()
+        stop_after = self.config['github'].get('incremental_stop_after', 30)
+        known_run = 0
+        
+        # 没有token的账号通过 self.github（github.token）获取公开的star
+        token = account.get('token') or self.config['github']['token']
+        for chunk in self._timed_pages(self._chunked(starred_repos, 100), token):
+            names = [repo.full_name for repo in chunk]
+            known = self.db.get_user_starred_names(login, names) if incremental else ()
+            self.db.save_user_stars(login, ((name, None) for name in names))
+            fetch_state = self.db.get_repo_fetch_state(names)
+            for repo in chunk:
+                state = fetch_state.get(repo.full_name)
+                if incremental:
+                    known_run = known_run + 1 if repo.full_name in known else 0
+                    if known_run >= stop_after:
+                        return
+                    # 已保存且没有新push的仓库无需刷新
+                    if state and state[0] == self._format_pushed_at(repo.pushed_at):
+                        continue
+                if self._claim_repo(repo.full_name):
+                    yield repo, state
+
+    def _save_fetched(self, batch, on_saved=None):
+        """写入一批获取到的仓库，写入后把仓库名交给 on_saved 回调"""
+        count = self.db.save_repos(batch)
+        if on_saved and batch:
+            on_saved([repo_data['name'] for repo_data in batch])
+        return count
+
+    def _fetch_starred_repos_rest(self, accounts, incremental=False, on_saved=None):
+        """通过REST API获取Star仓库，README仅在仓库有新push时通过条件请求刷新
+
+        翻页、详情获取和数据库写入通过有界队列组成流式管线，各阶段并行且内存占用恒定。
+        多个账号的star列表并行翻页，汇入同一个管线。
+
+        Args:
+            accounts (list): 要获取的账号
+            incremental (bool): 遇到连续若干个已保存的仓库后停止翻页
+            on_saved: 每批仓库写入数据库后的回调，参数为仓库名列表
+
+        Returns:
+            tuple: (success_count, total_repos)
+        """
+        pipeline = StreamPipeline(
+            process=self._limited(self.fetch_limiter, lambda item: self._process_single_repo(*item)),
+            write=lambda batch: self._save_fetched(batch, on_saved),
+            workers=self.fetch_workers,
+            queue_size=self.config.get('concurrency', {}).get('fetch', {}).get('queue_size'),
+            flush_size=self.flush_size,
+            retryable=(RateLimitError,),
+            desc="处理Starred仓库",
+            position=0
+        )
+        success_count, total_repos, deferred = pipeline.run(self._merge_iterators(
+            self._iter_starred_for_fetch(account, incremental) for account in accounts
+        ))
+        
+        # 被限流推迟的仓库在token配额恢复后自动重试，避免数据库留下空洞
+        max_rounds = self.config['github'].get('rate_limit', {}).get('max_deferred_rounds', 3)
+        pipeline.desc = "重试推迟的仓库"
+        for _ in range(max_rounds):
+            if not deferred:
+                break
+            print(f"\n{len(deferred)} 个仓库因限流被推迟，等待配额恢复后重试")
+            retried_count, _, deferred = pipeline.run(deferred)
+            success_count += retried_count
+        if deferred:
+            print(f"\n仍有 {len(deferred)} 个仓库因限流未能获取，下次fetch时会重新处理")
+        self._report_limiter(self.fetch_limiter)
+        return success_count, total_repos
+
+    def _iter_graphql_pages(self, account, incremental=False):
+        """逐页获取一个账号的Star仓库，记录star关系，生成需要写入的repo_data列表
+
+        Args:
+            account (dict): 账号，包含 user 和可选的 token
+            incremental (bool): 遇到连续若干个该用户已star过的仓库后停止翻页
+        """
+        github_config = self.config['github']
+        viewer = bool(account.get('token'))
+        if viewer:
+            self._github_user(account)
+        token = account.get('token') or github_config['token']
+        fetcher = GraphQLStarFetcher(
+            token,
+            api_url=github_config.get('graphql_url', 'https://api.github.com/graphql'),
+            page_size=github_config.get('graphql_page_size', 100),
+            readme_max_tokens=self.readme_max_tokens,
+            timeout=self.github_timeout,
+            # GraphQL与REST的配额相互独立，使用单独的调度会话；viewer查询的结果取决于token，
+            # 固定使用账号自己的token，查询公开的star时才在token池中轮换
+            session=self._create_github_session(token if viewer else None),
+            login=None if viewer else account['user']
+        )
+        login = account['user']
+        stop_after = github_config.get('incremental_stop_after', 30)
+        
+        known_run = 0
+        for page in fetcher.iter_pages():
+            names = [repo_data['name'] for repo_data in page]
+            known = self.db.get_user_starred_names(login, names) if incremental else ()
+            self.db.save_user_stars(login, ((repo_data['name'], repo_data.get('starred_at')) for repo_data in page))
+            if incremental:
+                changed = []
+                fetch_state = self.db.get_repo_fetch_state(names)
+                for repo_data in page:
+                    state = fetch_state.get(repo_data['name'])
+                    known_run = known_run + 1 if repo_data['name'] in known else 0
+                    if known_run >= stop_after:
+                        break
+                    if not state or state[0] != repo_data['pushed_at']:
+                        changed.append(repo_data)
+                page = changed
+            yield [repo_data for repo_data in page if self._claim_repo(repo_data['name'])]
+            if incremental and known_run >= stop_after:
+                return
+
+    def _fetch_starred_repos_graphql(self, accounts, incremental=False, on_saved=None):
+        """通过GraphQL API获取Star仓库，每页一次请求，逐页写入数据库
+
+        Args:
+            accounts (list): 要获取的账号，各账号并行翻页
+            incremental (bool): 遇到连续若干个已保存的仓库后停止翻页
+            on_saved: 每批仓库写入数据库后的回调，参数为仓库名列表
+
+        Returns:
+            tuple: (success_count, total_repos)
+        """
+        success_count = 0
+        total_repos = 0
+        with tqdm(desc="处理Starred仓库", position=0) as progress:
+            for page in self._merge_iterators(
+                self._iter_graphql_pages(account, incremental) for account in accounts
+            ):
+                total_repos += len(page)
+                success_count += self._save_fetched(page, on_saved)
+                progress.update(len(page))
+        return success_count, total_repos
+
+    def fetch_starred_repos(self, engine='rest', incremental=False, on_saved=None, users=None):
+        """获取用户star的所有仓库
+        
+        多个账号并行获取；同一个仓库在一次获取中只请求一次详情，star关系记录在user_stars中。
+        
+        Args:
+            engine (str): 'rest' 使用PyGithub逐个仓库获取；'graphql' 使用GraphQL API按页获取
+            incremental (bool): 只获取新star或有更新的仓库，遇到连续已保存的仓库即停止
+            on_saved: 每批仓库写入数据库后的回调，参数为仓库名列表
+            users (list): 只获取这些用户的star，默认为配置中的所有账号
+        """
         try:
             # 记录开始更新的时间
             update_start_time = datetime.now()
-            
-            user = self.github.get_user()
-            starred_repos = user.get_starred()
+            accounts = self._select_accounts(users)
+            self._claimed = set()
             
             print("\n获取到的Starred仓库列表：")
             print("=" * 80)
             
-            # 使用线程池并发处理仓库
-            futures = []
-            total_repos = 0
+            if engine == 'graphql':
+                success_count, total_repos = self._fetch_starred_repos_graphql(accounts, incremental, on_saved)
+            else:
+                success_count, total_repos = self._fetch_starred_repos_rest(accounts, incremental, on_saved)
             
-            # 处理分页列表
-            for repo in starred_repos:
-                future = self.fetch_executor.submit(self._process_single_repo, repo)
-                futures.append(future)
-                total_repos += 1
+            if len(accounts) > 1:
+                print(f"\n{len(accounts)} 个账号（{', '.join(account['user'] for account in accounts)}）"
+                      f"共 {len(self._claimed)} 个不重复的仓库")
+            if incremental:
+                # 增量模式没有遍历完整的star列表，无法判断哪些仓库已取消star
+                print(f"\n成功处理 {success_count}/{total_repos} 个新增或更新的仓库")
+                return
             
-            # 等待所有任务完成
-            success_count = 0
-            for future in tqdm(as_completed(futures), total=total_repos, desc="处理Starred仓库"):
-                if future.result():
-                    success_count += 1
+            # 本次没有出现在star列表中的star关系已取消
+            for account in accounts:
+                self.db.prune_user_stars(account['user'], update_start_time)
             
-            # 删除未更新的仓库（已取消star的）
+            # 删除未更新且已没有用户star的仓库
             threshold_days = self.config.get('database', {}).get('cleanup', {}).get('threshold_days', 7)
             deleted_count, skipped_count = self.db.delete_repos_not_updated_since(
                 update_start_time, 
@@ -129,60 +613,238 @@ class StarClassifier:
             print(f"获取Starred仓库失败: {str(e)}")
             raise
 
-    def _call_openai(self, prompt, response_format="", system_prompt=None):
-        """通用的OpenAI API调用方法
+    def _build_openai_payload(self, prompt, response_format="", max_tokens=None):
+        """构建chat completions请求参数
         
         Args:
             prompt (str): 用户提示词
-            response_format (str): 响应格式，默认为json_object
-            system_prompt (str): 系统提示词，可选
+            response_format (str): 响应格式，为json_object时要求模型返回JSON对象
+            max_tokens (int): 输出token上限，默认为 openai.max_tokens
         """
         system_prompt = "你只能返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹"
+        # 构建消息列表
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        # 构建请求参数
+        payload = {
+            "model": self.config['openai'].get('model', 'gpt-3.5-turbo'),
+            "stream": False,
+            "max_tokens": max_tokens or self.config['openai'].get('max_tokens', 512),
+            "temperature": self.config['openai'].get('temperature', 0.7),
+            "top_p": self.config['openai'].get('top_p', 0.7),
+            "top_k": self.config['openai'].get('top_k', 50),
+            "frequency_penalty": self.config['openai'].get('frequency_penalty', 0.5),
+            "n": 1,
+            "messages": messages
+        }
+        
+        # 如果是JSON响应，添加response_format
+        if response_format == "json_object":
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    @staticmethod
+    def _cache_key(payload):
+        """请求参数（模型、采样参数、系统和用户提示词）的内容哈希"""
+        canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _get_cached_result(self, payload):
+        """查询LLM响应缓存
+
+        Returns:
+            tuple: (cache_key, result)；未启用缓存时cache_key为None，未命中或强制刷新时result为None
+        """
+        if not self.llm_cache_enabled:
+            return None, None
+        cache_key = self._cache_key(payload)
+        if self.llm_cache_refresh:
+            self.metrics.count('llm_cache', result='refresh')
+            return cache_key, None
+        cached = self.db.get_cached_response(cache_key)
+        self.metrics.count('llm_cache', result='miss' if cached is None else 'hit')
+        return cache_key, json.loads(cached) if cached is not None else None
+
+    def _estimate_tokens(self, payload):
+        """粗略估算请求消耗的token数，用于TPM限额"""
+        prompt_chars = sum(len(message['content']) for message in payload['messages'])
+        return prompt_chars // 2 + payload.get('max_tokens', 0)
+
+    def _record_llm_call(self, api_key, status, latency, usage=None):
+        """记录一次LLM请求的延迟、状态码（按key区分）和响应usage中的token用量"""
+        key = mask_secret(api_key)
+        labels = {'service': 'openai', 'endpoint': '/chat/completions', 'key': key, 'status': status}
+        self.metrics.observe('http_request_seconds', latency, **labels)
+        self.metrics.count('http_requests', **labels)
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            if (usage or {}).get(kind):
+                self.metrics.count('llm_tokens', usage[kind], key=key, kind=kind)
+        self.metrics.trace('llm', key=key, status=status, seconds=round(latency, 4), usage=usage)
+
+    @staticmethod
+    def _is_retryable_status(status):
+        """换一个key重试可能成功的状态码"""
+        return status in (401, 403, 408, 429) or status >= 500
+
+    @staticmethod
+    def _response_json(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def _post_openai(self, api_key, payload, estimated_tokens):
+        """用api_key发送一次请求，结束后归还key并记录指标
+
+        Returns:
+            tuple: (状态码, 响应JSON, 响应文本, 开始时间)
+        """
+        start = time.monotonic()
         try:
-            # 构建消息列表
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-            
-            # 构建请求参数
-            payload = {
-                "model": self.config['openai'].get('model', 'gpt-3.5-turbo'),
-                "stream": False,
-                "max_tokens": self.config['openai'].get('max_tokens', 512),
-                "temperature": self.config['openai'].get('temperature', 0.7),
-                "top_p": self.config['openai'].get('top_p', 0.7),
-                "top_k": self.config['openai'].get('top_k', 50),
-                "frequency_penalty": self.config['openai'].get('frequency_penalty', 0.5),
-                "n": 1,
-                "messages": messages
-            }
-            
-            # 如果是JSON响应，添加response_format
-            if response_format == "json_object":
-                payload["response_format"] = {"type": "json_object"}
-            
-            # 获取下一个API key
-            api_key = self._get_next_api_key()
-            
-            # 发送请求
             response = self.session.post(
                 f"{self.config['openai']['api_base']}/chat/completions",
                 headers={
                     "Authorization": f"Bearer {api_key}",
                     "Content-Type": "application/json"
                 },
-                json=payload
+                json=payload,
+                timeout=self.openai_timeout
             )
+        except requests.RequestException:
+            self.key_pool.release(api_key, estimated_tokens=estimated_tokens)
+            self._record_llm_call(api_key, 'error', time.monotonic() - start)
+            raise
+        
+        body = self._response_json(response)
+        latency = time.monotonic() - start
+        self.key_pool.release(
+            api_key, response.status_code, latency, response.headers,
+            estimated_tokens, (body.get('usage') or {}).get('total_tokens')
+        )
+        self._record_llm_call(api_key, response.status_code, latency, body.get('usage'))
+        return response.status_code, body, response.text, start
+
+    def _observe_latency(self, result):
+        """把采用的响应的延迟计入对冲阈值的样本
+
+        对冲中落后的请求返回时其延迟已无意义，计入会抬高分位数和对冲阈值，只记录被采用的一方。
+        """
+        status, _, _, start = result
+        if status == 200:
+            self.hedge.observe(time.monotonic() - start)
+        return result
+
+    def _send_openai(self, api_key, payload, estimated_tokens):
+        """发送请求；启用对冲时，超过延迟阈值仍未返回就用另一个key发送副本，取先返回的200响应
+
+        先返回的是限流或服务端错误时继续等待另一个请求，两个请求都没有成功时返回先到的
+        错误响应。requests无法中断进行中的请求，落后的请求在后台线程中继续执行直到返回或
+        读取超时，结果被丢弃，key在其结束时归还。
+
+        Returns:
+            tuple: (先返回的请求使用的key, _post_openai的返回值)
+        """
+        if self.hedge is None:
+            return api_key, self._post_openai(api_key, payload, estimated_tokens)
+        delay = self.hedge.delay()
+        if delay is None:
+            return api_key, self._observe_latency(self._post_openai(api_key, payload, estimated_tokens))
+        
+        primary = self.hedge_executor.submit(self._post_openai, api_key, payload, estimated_tokens)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedge.allow():
+            return api_key, self._observe_latency(primary.result())
+        # 只使用另一个立即可用的key，没有时继续等待原请求
+        hedge_key, _ = self.key_pool.try_acquire(estimated_tokens, exclude={api_key}, strict=True)
+        if hedge_key is None:
+            self.hedge.refund()
+            self.metrics.count('llm_hedges', outcome='no_key')
+            return api_key, self._observe_latency(primary.result())
+        self.metrics.count('llm_hedges', outcome='sent')
+        secondary = self.hedge_executor.submit(self._post_openai, hedge_key, payload, estimated_tokens)
+        
+        futures = {primary: api_key, secondary: hedge_key}
+        fallback = None
+        error = None
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures.pop(future)
+                try:
+                    result = future.result()
+                except requests.RequestException as e:
+                    error = error or e
+                    continue
+                if result[0] != 200:
+                    fallback = fallback or (key, result)
+                    continue
+                for loser in futures:
+                    loser.cancel()
+                if future is secondary:
+                    self.hedge.record_win()
+                    self.metrics.count('llm_hedges', outcome='won')
+                return key, self._observe_latency(result)
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def _call_openai(self, prompt, response_format="", system_prompt=None, max_tokens=None):
+        """通用的OpenAI API调用方法
+        
+        Args:
+            prompt (str): 用户提示词
+            response_format (str): 响应格式，默认为json_object
+            system_prompt (str): 系统提示词，可选
+            max_tokens (int): 输出token上限，默认为 openai.max_tokens
+        """
+        result = None
+        try:
+            payload = self._build_openai_payload(prompt, response_format, max_tokens)
             
-            if response.status_code == 200:
-                result = response.text
-                content = response.json()["choices"][0]["message"]["content"]
-                return json.loads(content)
-            else:
-                print(f"API调用失败: {response.status_code}")
-                print(f"API调用失败: {response.text}")
-                return None
+            # 请求内容完全相同时直接复用缓存的响应
+            cache_key, cached = self._get_cached_result(payload)
+            if cached is not None:
+                return cached
+            
+            estimated_tokens = self._estimate_tokens(payload)
+            failed_keys = set()
+            for _ in range(self.max_attempts):
+                # 选择最空闲的健康key，优先避开本次已失败的key
+                waited_at = time.monotonic()
+                api_key = self.key_pool.acquire(estimated_tokens, exclude=failed_keys)
+                start = time.monotonic()
+                self.metrics.observe('queue_wait_seconds', start - waited_at, queue='openai_key_pool')
+                
+                # 发送请求（可能同时发送对冲请求，api_key为先返回的那个请求使用的key）
+                try:
+                    api_key, (status, body, text, start) = self._send_openai(api_key, payload, estimated_tokens)
+                except requests.RequestException as e:
+                    if isinstance(e, requests.Timeout) and self.classify_limiter is not None:
+                        self.classify_limiter.backoff('timeout', start)
+                    print(f"OpenAI API调用失败: {str(e)}")
+                    failed_keys.add(api_key)
+                    continue
+                
+                if status == 429 and self.classify_limiter is not None:
+                    self.classify_limiter.backoff('429', start)
+                
+                if status == 200:
+                    result = text
+                    content = body["choices"][0]["message"]["content"]
+                    parsed = json.loads(content)
+                    if cache_key:
+                        self.db.put_cached_response(cache_key, content)
+                    return parsed
+                
+                print(f"API调用失败: {status}")
+                print(f"API调用失败: {text}")
+                if not self._is_retryable_status(status):
+                    return None
+                failed_keys.add(api_key)
+            return None
                 
         except Exception as e:
             print(f"OpenAI API调用失败: {str(e)}")
@@ -198,9 +860,38 @@ class StarClassifier:
         Returns:
             bool: 是否成功处理
         """
+        result = self._classify_repo_result(repo)
+        if result:
+            self._save_classifications([result])
+            return True
+        return False
+
+    def _classify_repo_result(self, repo):
+        """使用OpenAI API对仓库进行分类和总结，不写数据库
+        
+        Args:
+            repo (dict): 仓库信息字典
+            
+        Returns:
+            tuple: (repo_name, category, summary, fingerprint, confidence)，失败时返回None
+        """
         try:
-            # 构建提示词
-            prompt = f"""
+            # 调用AI进行分类和总结
+            result = self._call_openai(self._build_classify_prompt(repo))
+            return self._parse_classification(repo, result, self._classify_fingerprint(repo))
+        except Exception as e:
+            print(f"处理仓库 {repo['name']} 时出错: {str(e)}")
+            return None
+
+    def _build_classify_prompt(self, repo, categories=None):
+        """构建单个仓库的分类提示词
+
+        Args:
+            categories (list): 可选的分类，默认为配置中的分类列表
+        """
+        if categories is None:
+            categories = self.config['categories']
+        return f"""
             请根据以下仓库信息，完成分类和总结任务：
             
             仓库名称：{repo['name']}
@@ -209,73 +900,340 @@ class StarClassifier:
             主题：{', '.join(repo['topics'])}
             README：{repo['readme']}...
             
-            可选的分类类别：{', '.join(self.config['categories'])}
+            可选的分类类别：{', '.join(categories)}
             
             请按照以下JSON格式返回结果，不要markdown包裹：
             {{
                 "category": "最合适的类别名称",
+                "confidence": 0.9,
                 "summary": "50字以内的仓库总结"
             }}
             
             注意：
-            1. category必须是以下之一：{', '.join(self.config['categories'])}
-            2. summary应该简明扼要地描述仓库的主要功能和特点
-            3. 只返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹
+            1. category必须是以下之一：{', '.join(categories)}
+            2. confidence为0到1之间的数字，表示该仓库属于所选类别的把握
+            3. summary应该简明扼要地描述仓库的主要功能和特点
+            4. 只返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹
             """
+
+    def _build_batch_classify_prompt(self, repos):
+        """构建多个仓库共用一次请求的分类提示词，分类列表只出现一次"""
+        repo_sections = "\n".join(
+            f"""
+            [{index}]
+            仓库名称：{repo['name']}
+            描述：{repo['description']}
+            语言：{repo['language']}
+            主题：{', '.join(repo['topics'])}
+            README：{repo['readme']}...
+            """
+            for index, repo in enumerate(repos, 1)
+        )
+        return f"""
+            请根据以下 {len(repos)} 个仓库的信息，分别完成分类和总结任务。
             
-            # 调用AI进行分类和总结
-            result = self._call_openai(prompt)
-            if result:
-                category = result.get("category", "其他")
-                summary = result.get("summary", "")
-                
-                # 验证分类是否有效
-                if category not in self.config['categories']:
-                    category = "其他"
-                
-                # 使用锁保护数据库操作
-                with self.db_lock:
-                    self.db.update_repo_category(repo['name'], category)
-                    self.db.update_repo_summary(repo['name'], summary)
-                
-                # 更新分类统计
-                if category not in self.categories_data:
-                    self.categories_data[category] = []
-                self.categories_data[category].append(repo["name"])
-                return True
-            return False
+            可选的分类类别：{', '.join(self.config['categories'])}
+            
+            仓库列表：
+            {repo_sections}
+            
+            请按照以下JSON格式返回结果，不要markdown包裹：
+            {{
+                "results": [
+                    {{
+                        "name": "仓库名称",
+                        "category": "最合适的类别名称",
+                        "confidence": 0.9,
+                        "summary": "50字以内的仓库总结"
+                    }}
+                ]
+            }}
+            
+            注意：
+            1. 每个仓库都必须返回一项，name必须与仓库名称完全一致
+            2. category必须是上面可选的分类类别之一
+            3. confidence为0到1之间的数字，表示该仓库属于所选类别的把握
+            4. summary应该简明扼要地描述仓库的主要功能和特点
+            5. 只返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹
+            """
+
+    def _batch_max_tokens(self, count):
+        """批量分类请求的输出token上限：按仓库数量放大，避免返回的JSON数组被截断"""
+        per_repo = self.config['openai'].get('max_tokens_per_repo', 200)
+        return max(self.config['openai'].get('max_tokens', 512), per_repo * count)
+
+    def _match_batch_results(self, repos, result):
+        """把批量请求的返回结果与仓库一一对应
+
+        Returns:
+            tuple: (results, missing)，missing为模型遗漏或返回格式错误的仓库
+        """
+        items = result.get("results") if isinstance(result, dict) else result
+        by_name = {}
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict) and isinstance(item.get("name"), str):
+                by_name[item["name"]] = item
+
+        results = []
+        missing = []
+        for repo in repos:
+            item = by_name.get(repo['name'])
+            if item and isinstance(item.get("category"), str) and isinstance(item.get("summary", ""), str):
+                results.append(self._parse_classification(repo, item, self._classify_fingerprint(repo)))
+            else:
+                missing.append(repo)
+        return results, missing
+
+    def _classify_batch_results(self, repos):
+        """一次请求分类多个仓库，遗漏的仓库二分后重试，单个仓库时退回逐个分类
+
+        Returns:
+            list: (repo_name, category, summary, fingerprint, confidence) 元组列表
+        """
+        if len(repos) == 1:
+            result = self._classify_repo_result(repos[0])
+            return [result] if result else []
+        try:
+            result = self._call_openai(self._build_batch_classify_prompt(repos),
+                                       max_tokens=self._batch_max_tokens(len(repos)))
+            results, missing = self._match_batch_results(repos, result)
         except Exception as e:
-            print(f"处理仓库 {repo['name']} 时出错: {str(e)}")
+            print(f"批量分类 {len(repos)} 个仓库时出错: {str(e)}")
+            results, missing = [], repos
+        if not missing:
+            return results
+        if len(missing) < len(repos):
+            # 只重试遗漏的仓库
+            return results + self._classify_batch_results(missing)
+        # 整批失败时二分
+        middle = len(repos) // 2
+        return self._classify_batch_results(repos[:middle]) + self._classify_batch_results(repos[middle:])
+
+    def _classify_fingerprint(self, repo):
+        """仓库分类输入的指纹：仓库信息或模型参数变化都会改变指纹
+
+        指纹不包含分类列表，分类列表的变化由分类版本（category_sets）单独处理。
+        """
+        return self._cache_key(self._build_openai_payload(self._build_classify_prompt(repo, categories=())))
+
+    def _needs_classification(self, repo):
+        """仓库的分类输入自上次分类后是否发生了变化"""
+        if repo.get('category') and repo.get('classify_fingerprint') and repo.get('category_version') is None:
+            # 分类版本化之前的结果指纹格式不同，由classify迁移到当前版本时沿用
             return False
+        return repo.get('classify_fingerprint') != self._classify_fingerprint(repo)
+
+    def _parse_classification(self, repo, result, fingerprint=None):
+        """校验模型返回的分类结果
+
+        Returns:
+            tuple: (repo_name, category, summary, fingerprint, confidence)，结果为空时返回None
+        """
+        if not result:
+            return None
+        category = result.get("category", "其他")
+        summary = result.get("summary", "")
+        try:
+            confidence = min(max(float(result["confidence"]), 0.0), 1.0)
+        except (KeyError, TypeError, ValueError):
+            confidence = None
+        
+        # 验证分类是否有效，模型给出列表之外的分类时按最低置信度记录
+        if category not in self.config['categories']:
+            category = "其他"
+            confidence = 0.0
+        
+        # 更新分类统计
+        self.categories_data.setdefault(category, []).append(repo["name"])
+        self.metrics.count('classified', category=category)
+        self.metrics.trace('classify', repo=repo['name'], category=category)
+        return repo['name'], category, summary, fingerprint, confidence
+
+    def _classify_repos_threaded(self, repos, batch_size=1, total=None):
+        """使用线程池并发分类仓库
+
+        在途任务数不超过并发数的2倍，仓库从可迭代对象中按需读取。
+
+        Args:
+            repos: 可迭代的仓库记录
+            batch_size (int): 每次请求打包的仓库数量
+            total (int): 仓库总数，用于显示进度
+
+        Returns:
+            int: 成功分类并写入数据库的仓库数量
+        """
+        pending = {}
+        buffer = []
+        success_count = 0
+        progress = tqdm(total=total, desc="分类仓库")
+
+        def collect():
+            # 分类结果攒够一批后统一写入数据库
+            nonlocal buffer, success_count
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                progress.update(pending.pop(future))
+                result = future.result()
+                if isinstance(result, list):
+                    buffer.extend(result)
+                elif result:
+                    buffer.append(result)
+            if len(buffer) >= self.flush_size:
+                success_count += self._save_classifications(buffer)
+                buffer = []
+
+        classify_batch = self._limited(self.classify_limiter, self._classify_batch_results)
+        classify_repo = self._limited(self.classify_limiter, self._classify_repo_result)
+        for batch in self._chunked(repos, batch_size):
+            if batch_size > 1:
+                future = self.classify_executor.submit(classify_batch, batch)
+            else:
+                future = self.classify_executor.submit(classify_repo, batch[0])
+            pending[future] = len(batch)
+            if len(pending) >= self.classify_workers * 2:
+                collect()
+        while pending:
+            collect()
+        progress.close()
+        self._report_limiter(self.classify_limiter)
+        success_count += self._save_classifications(buffer)
+        return success_count
+
+    def _save_classifications(self, results, source='llm'):
+        """写入分类结果并记录当前分类版本，同时把本进程认领的对应任务标记为完成"""
+        return self.db.update_repo_classification(results, source, job_owner=self.worker_id,
+                                                  category_version=self.category_version)
+
+    def _current_category_version(self):
+        """注册当前的分类列表（及 category_renames 改名映射），返回其版本号"""
+        version, created = self.db.register_category_set(self.config['categories'],
+                                                         self.config.get('category_renames'))
+        if created:
+            print(f"\n分类列表已变化，新的分类版本：{version}")
+        self.category_version = version
+        return version
+
+    def _category_resolver(self):
+        """返回 resolve(category, version)：按之后各版本的改名映射把分类迁移到当前版本
+
+        分类在之后的某个版本中被删除（且没有改名映射）时返回None。
+        """
+        category_sets = self.db.get_category_sets()
+        resolved = {}
+
+        def resolve(category, version):
+            key = (category, version)
+            if key not in resolved:
+                current = category
+                for set_version, categories, renames in category_sets:
+                    if version is not None and set_version <= version:
+                        continue
+                    if current not in categories:
+                        current = renames.get(current)
+                        if current is None:
+                            break
+                resolved[key] = current
+            return resolved[key]
+        return resolve
+
+    def _classify_locally(self, names, batch_size=1):
+        """用本地分类器预分类，高置信度的结果直接写入数据库
+
+        本地分类器只用LLM给出的分类训练（不含"其他"），避免用自身的预测强化错误。
+
+        Args:
+            names (list): 待分类的仓库名
+
+        Returns:
+            list: 置信度不足、仍需交给LLM分类的仓库名
+        """
+        from local_classifier import LocalClassifier, estimate_saved_calls
+        local_config = self.config.get('local_classifier', {})
+        threshold = local_config.get('threshold', 0.9)
+        classifier = LocalClassifier(
+            n_features=local_config.get('n_features', 2 ** 14),
+            temperature=local_config.get('temperature', 0.05),
+            min_examples=local_config.get('min_examples', 5)
+        )
+        categories = [category for category in self.config['categories'] if category != '其他']
+        trained = classifier.fit(
+            self.db.iter_repos(
+                ('name', 'description', 'topics', 'readme', 'category'),
+                where="category IS NOT NULL AND category != '其他' "
+                      "AND (classify_source IS NULL OR classify_source != 'local')"
+            ),
+            categories
+        )
+        if not trained:
+            print("\n已分类的仓库不足，跳过本地分类器")
+            return names
+
+        classified = 0
+        remaining = []
+        for chunk in self._chunked(self.db.iter_repos_by_names(names), classifier.batch_size):
+            results = []
+            for repo, (category, confidence) in zip(chunk, classifier.predict(chunk)):
+                if confidence >= threshold:
+                    # 本地分类不生成AI总结，沿用仓库描述
+                    fingerprint = self._classify_fingerprint(repo)
+                    results.append((repo['name'], category, repo.get('description') or '', fingerprint, confidence))
+                else:
+                    remaining.append(repo['name'])
+            classified += self._save_classifications(results, source='local')
+        print(f"\n本地分类器（{trained} 个训练样本）直接分类 {classified}/{len(names)} 个仓库，"
+              f"节省 {estimate_saved_calls(classified, batch_size)} 次LLM调用")
+        return remaining
 
-    def classify_all_repos(self, uncategorized_only=False):
+    def classify_all_repos(self, uncategorized_only=False, use_async=False, force=False, batch_size=1,
+                           local=False, worker=False):
         """对所有仓库进行分类
         
+        先流式扫描一遍筛选出需要分类的仓库名并写入任务队列（jobs表），再认领任务分块读取
+        完整记录进行分类，内存中不会同时保存所有仓库的README。上次运行中断时直接继续
+        未完成的任务；其他进程可以通过 worker=True 一起处理同一个队列。
+        
         Args:
             uncategorized_only (bool): 是否只处理未分类的仓库
+            use_async (bool): 是否使用asyncio引擎代替线程池
+            force (bool): 是否重新分类输入未变化的仓库
+            batch_size (int): 每次请求打包的仓库数量，大于1时使用批量提示词
+            local (bool): 是否先用本地分类器预分类，只把低置信度的仓库交给LLM
+            worker (bool): 只处理队列中已有的任务，不扫描仓库
         """
         try:
-            # 从数据库获取所有仓库
-            repos = self.db.get_all_repos()
-            
-            # 如果只处理未分类的仓库，进行过滤
-            if uncategorized_only:
-                repos = [repo for repo in repos if not repo['category'] or repo['category'] == '其他']
-                print(f"\n找到 {len(repos)} 个未分类的仓库")
-            
-            # 使用线程池并发处理仓库
-            futures = []
-            for repo in repos:
-                future = self.classify_executor.submit(self.classify_repo, repo)
-                futures.append(future)
+            self.llm_cache_refresh = force
+            self._current_category_version()
+            counts = self.db.get_job_counts('classify')
+            unfinished = counts.get('pending', 0) + counts.get('running', 0)
+            if worker:
+                if not unfinished:
+                    print("\n没有待处理的分类任务")
+                    return
+                print(f"\n队列中有 {unfinished} 个未完成的分类任务，开始处理（{self.worker_id}）")
+            elif unfinished:
+                print(f"\n发现 {unfinished} 个未完成的分类任务，继续上次的进度")
+                self._warn_selection_ignored(uncategorized_only, force, local)
+            else:
+                names = self._select_for_classification(uncategorized_only, force, local, batch_size)
+                created = self.db.reset_jobs('classify', names)
+                if created is None:
+                    # 筛选期间另一个classify进程已经建立了任务队列，改为一起处理该队列
+                    counts = self.db.get_job_counts('classify')
+                    unfinished = counts.get('pending', 0) + counts.get('running', 0)
+                    print(f"\n另一个进程已建立 {unfinished} 个分类任务，一起处理该队列")
+                    self._warn_selection_ignored(uncategorized_only, force, local)
+                else:
+                    unfinished = created
             
-            # 等待所有任务完成
-            success_count = 0
-            for future in tqdm(as_completed(futures), total=len(futures), desc="分类仓库"):
-                if future.result():
-                    success_count += 1
+            success_count = self._run_classify_jobs(use_async, batch_size)
+            print(f"\n成功处理 {success_count}/{unfinished} 个仓库")
+            self._report_hedging()
             
-            print(f"\n成功处理 {success_count}/{len(repos)} 个仓库")
+            if self.llm_cache_enabled:
+                self.db.prune_llm_cache(
+                    max_age_days=self.llm_cache_config.get('max_age_days', 30),
+                    max_bytes=self.llm_cache_config.get('max_size_mb', 100) * 1024 * 1024
+                )
             
         except DatabaseError as e:
             print(f"获取仓库列表失败: {str(e)}")
@@ -284,30 +1242,353 @@ class StarClassifier:
             print(f"分类过程出错: {str(e)}")
             raise
 
-    def generate_categories(self):
-        """使用AI分析仓库并生成合适的分类"""
+    def _select_for_classification(self, uncategorized_only=False, force=False, local=False, batch_size=1):
+        """流式扫描仓库，返回需要交给LLM分类的仓库名
+
+        分类列表变化后，旧版本下的分类结果若在新列表中仍然存在（或有改名映射）则直接迁移到当前版本；
+        只有所属分类已被删除、或置信度低于 category_migration.min_confidence 的仓库重新分类。
+
+        Args:
+            uncategorized_only (bool): 是否只处理未分类的仓库（包括分类已被删除的仓库）
+            force (bool): 是否包含输入未变化的仓库
+            local (bool): 是否先用本地分类器预分类，高置信度的仓库直接写入结果
+            batch_size (int): LLM分类时每次请求的仓库数量，用于估算本地分类节省的调用次数
+        """
+        version = self.category_version or self._current_category_version()
+        resolve = self._category_resolver()
+        min_confidence = self.migration_config.get('min_confidence', 0.6)
+        # 未分类和旧版本的过滤条件直接下推到SQL
+        where, params = None, ()
+        if uncategorized_only:
+            where, params = f"{Database.UNCATEGORIZED} OR category_version IS NOT ?", (version,)
+        columns = ('name', 'description', 'language', 'topics', 'readme', 'classify_fingerprint',
+                   'category', 'category_version', 'confidence')
+        total = 0
+        names = []
+        migrations = []
+        migrated = 0
+        renamed = 0
+        stale = 0
+        for repo in self.db.iter_repos(columns, where, params):
+            total += 1
+            fingerprint = self._classify_fingerprint(repo)
+            previous = repo['classify_fingerprint']
+            if repo['category'] and repo['category_version'] != version:
+                category = resolve(repo['category'], repo['category_version'])
+                low_confidence = repo['confidence'] is not None and repo['confidence'] < min_confidence
+                if category is None or low_confidence:
+                    stale += 1
+                    names.append(repo['name'])
+                    continue
+                if repo['category_version'] is None:
+                    # 分类版本化之前的结果指纹格式不同，沿用已有分类并更新为新格式的指纹
+                    previous = fingerprint
+                migrated += 1
+                renamed += category != repo['category']
+                migrations.append((category, version, previous, repo['name']))
+                if len(migrations) >= 1000:
+                    self.db.migrate_repo_categories(migrations)
+                    migrations = []
+            # 跳过输入指纹与上次分类时一致的仓库
+            if force or previous != fingerprint:
+                names.append(repo['name'])
+        self.db.migrate_repo_categories(migrations)
+        
+        if migrated or stale:
+            print(f"\n{migrated} 个仓库的分类沿用到版本 {version}（其中 {renamed} 个按改名映射迁移），"
+                  f"{stale} 个仓库的分类已删除或置信度低，需要重新分类")
+        if uncategorized_only:
+            print(f"\n找到 {total} 个未分类或分类已过期的仓库")
+        if total != len(names):
+            print(f"\n跳过 {total - len(names)} 个输入未变化的仓库")
+        
+        if local and names:
+            names = self._classify_locally(names, batch_size)
+        return names
+
+    def _create_batch_api(self):
+        batch_config = self.config['openai'].get('batch', {})
+        return BatchApi(
+            self,
+            max_requests=batch_config.get('max_requests', 50000),
+            max_bytes=batch_config.get('max_file_mb', 190) * 1024 * 1024,
+            url=batch_config.get('url', '/v1/chat/completions')
+        )
+
+    def export_batch(self, output, uncategorized_only=False, force=False, local=False):
+        """把需要分类的仓库导出为Batch API的请求文件
+
+        筛选规则与classify相同，每个仓库一个请求，提示词与classify_repo一致。
+        """
+        names = self._select_for_classification(uncategorized_only, force, local)
+        if not names:
+            print("\n没有需要分类的仓库")
+            return
+        shards = self._create_batch_api().export(names, output)
+        for path, count in shards:
+            print(f"{path}: {count} 个请求")
+        print(f"\n已导出 {len(names)} 个仓库的分类请求，批处理完成后使用 classify --import-batch 导入结果")
+
+    def import_batch(self, paths):
+        """导入Batch API的结果文件，写入分类和总结"""
+        self._current_category_version()
+        stats = self._create_batch_api().apply_results(paths)
+        for error in stats['errors']:
+            print(f"导入失败: {error}")
+        if stats['unknown']:
+            print(f"\n{stats['unknown']} 个结果对应的仓库不在数据库中，已跳过")
+        print(f"\n成功导入 {stats['applied']} 个仓库的分类结果，{stats['failed']} 个请求失败"
+              + ("（可再运行 classify 处理）" if stats['failed'] else ""))
+
+    @staticmethod
+    def _warn_selection_ignored(uncategorized_only, force, local):
+        """继续已有的任务队列时，本次指定的筛选条件不会生效"""
+        options = [name for name, value in (('-u', uncategorized_only), ('--force', force), ('--local', local))
+                   if value]
+        if options:
+            print(f"注意：队列中的任务按建立时的条件筛选，本次指定的 {' '.join(options)} 未生效；"
+                  f"需要按新条件分类时请在这些任务完成后重新运行")
+
+    def _iter_claimed_repos(self, names, claim_size, lease_seconds):
+        """从已认领的任务开始，逐块认领任务并读取仓库记录，直到队列中没有可执行的任务"""
+        while names:
+            yield from self.db.iter_repos_by_names(names)
+            names = self.db.claim_jobs('classify', self.worker_id, claim_size, lease_seconds)
+
+    @contextmanager
+    def _lease_heartbeat(self, lease_seconds):
+        """后台定期续约本进程认领的任务，分类耗时超过租约时任务不会被其他进程抢走"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    self.db.renew_job_leases('classify', self.worker_id, lease_seconds)
+                except DatabaseError as e:
+                    print(f"续约任务失败: {str(e)}")
+
+        thread = threading.Thread(target=renew, name='job-lease', daemon=True)
+        thread.start()
         try:
-            # 从数据库获取所有仓库
-            repos = self.db.get_all_repos()
-            
-            # 准备仓库信息用于分析
-            repos_info = []
-            for repo in repos:
-                repos_info.append({
-                    "name": repo['name'],
-                    "description": repo['description'][:50],
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _run_classify_jobs(self, use_async=False, batch_size=1):
+        """认领并执行分类任务，直到队列中的任务全部完成或失败
+
+        未能分类的任务按指数退避放回队列，重试次数用尽后标记为failed；
+        其他进程持有的任务租约过期前会等待，以便接手中途退出的进程留下的任务。
+
+        Returns:
+            int: 成功分类并写入数据库的仓库数量
+        """
+        lease_seconds = self.jobs_config.get('lease_seconds', 120)
+        claim_size = self.jobs_config.get('claim_size', 100)
+        max_attempts = self.jobs_config.get('max_attempts', 5)
+        backoff = (self.jobs_config.get('backoff_base', 10), self.jobs_config.get('backoff_max', 300))
+        poll_interval = self.jobs_config.get('poll_interval', 5)
+        engine = None
+        if use_async:
+            from async_classifier import AsyncClassifyEngine
+            engine = AsyncClassifyEngine(
+                self,
+                max_in_flight_per_key=self.config.get('concurrency', {}).get('classify', {}).get('max_in_flight_per_key', 50)
+            )
+
+        success_count = 0
+        with self._lease_heartbeat(lease_seconds):
+            while True:
+                names = self.db.claim_jobs('classify', self.worker_id, claim_size, lease_seconds)
+                if not names:
+                    delay = self.db.next_job_delay('classify')
+                    if delay is None:
+                        break
+                    time.sleep(min(max(delay, 0.1), poll_interval))
+                    continue
+                
+                counts = self.db.get_job_counts('classify')
+                total = counts.get('pending', 0) + len(names)
+                repos = self._iter_claimed_repos(names, claim_size, lease_seconds)
+                try:
+                    if engine:
+                        success_count += engine.run(repos, total=total, batch_size=batch_size)
+                    else:
+                        success_count += self._classify_repos_threaded(repos, batch_size, total=total)
+                    error = "LLM未返回有效的分类结果"
+                except BaseException:
+                    error = "分类进程异常退出"
+                    raise
+                finally:
+                    retrying, failed = self.db.release_unfinished_jobs(
+                        'classify', self.worker_id, error, max_attempts, *backoff
+                    )
+                    if retrying:
+                        print(f"\n{retrying} 个仓库分类失败，稍后重试")
+                    if failed:
+                        print(f"\n{failed} 个仓库重试 {max_attempts} 次后仍分类失败")
+        return success_count
+
+    def _iter_saved_for_classify(self, names_queue, force=False):
+        """从队列中取出刚写入数据库的仓库名，读取完整记录后交给分类阶段"""
+        while True:
+            names = names_queue.get()
+            if names is None:
+                return
+            for repo in self.db.get_repos_by_names(names):
+                if force or self._needs_classification(repo):
+                    yield repo
+
+    def sync(self, engine='rest', incremental=False, force=False, users=None):
+        """获取与分类重叠执行：每批仓库写入数据库后立即进入分类阶段
+        
+        两个阶段分别使用 concurrency.fetch / concurrency.classify 的并发数，
+        总耗时接近两者中较慢的一个，而不是两者之和。
+        
+        Args:
+            engine (str): 获取仓库使用的引擎，'rest' 或 'graphql'
+            incremental (bool): 是否增量获取仓库
+            force (bool): 是否重新分类输入未变化的仓库
+            users (list): 只获取这些用户的star，默认为配置中的所有账号
+        """
+        self.llm_cache_refresh = force
+        self._current_category_version()
+        # 有界队列：分类跟不上时反压获取阶段
+        names_queue = Queue(maxsize=self.classify_max_workers * 4)
+        classify_pipeline = StreamPipeline(
+            process=self._limited(self.classify_limiter, self._classify_repo_result),
+            write=self._save_classifications,
+            workers=self.classify_workers,
+            flush_size=self.flush_size,
+            desc="分类仓库",
+            position=1
+        )
+        outcome = {}
+        
+        def classify_stage():
+            try:
+                outcome['result'] = classify_pipeline.run(self._iter_saved_for_classify(names_queue, force))
+            except Exception as e:
+                outcome['error'] = e
+                # 分类阶段异常退出时继续消费队列，避免获取阶段阻塞
+                while names_queue.get() is not None:
+                    pass
+        
+        classify_thread = threading.Thread(target=classify_stage, name='sync-classify')
+        classify_thread.start()
+        try:
+            self.fetch_starred_repos(engine, incremental, on_saved=names_queue.put, users=users)
+        finally:
+            names_queue.put(None)
+            classify_thread.join()
+        
+        if 'error' in outcome:
+            print(f"分类过程出错: {str(outcome['error'])}")
+            raise outcome['error']
+        success_count, total, _ = outcome['result']
+        print(f"\n成功分类 {success_count}/{total} 个新增或有变化的仓库")
+        self._report_limiter(self.classify_limiter)
+        self._report_hedging()
+
+    def _name_clusters(self, clusters, offset):
+        """为一组簇命名（map阶段的单个请求）
+
+        Returns:
+            list: [{'name', 'description', 'size'}]
+        """
+        clusters_info = []
+        for index, cluster in enumerate(clusters, offset):
+            clusters_info.append({
+                "id": index,
+                "size": cluster['size'],
+                "repos": [
+                    f"{repo['name']}: {(repo['description'] or '')[:80]}"
+                    for repo in cluster['repos']
+                ],
+            })
+        prompt = f"""
+            以下是对GitHub仓库聚类得到的若干个簇，每个簇给出了仓库数量和最具代表性的几个仓库。
+            请为每个簇起一个概括其主题的分类名称，并给出简要说明：
+            
+            {json.dumps(clusters_info, ensure_ascii=False, indent=2)}
+            
+            请按照以下JSON格式返回结果，不要markdown包裹：
+            {{
+                "clusters": [
+                    {{"id": 簇的id, "name": "分类名称", "description": "该分类的简要说明"}},
+                    ...
+                ]
+            }}
+            
+            注意：
+            1. 分类名称使用中文，不超过4个字
+            2. 只返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹
+            """
+        result = self._call_openai(prompt)
+        sizes = {item['id']: item['size'] for item in clusters_info}
+        named = []
+        for item in (result or {}).get("clusters", []):
+            if isinstance(item, dict) and item.get("id") in sizes and item.get("name"):
+                named.append({
+                    "name": item["name"],
+                    "description": item.get("description", ""),
+                    "size": sizes[item["id"]],
                 })
+        return named
+
+    def generate_categories(self):
+        """使用AI分析仓库并生成合适的分类
+        
+        map-reduce流程，提示词大小与仓库总数无关：
+        1. 本地对仓库做k-means聚类，每个簇只保留最接近质心的几个代表仓库
+        2. 把簇分块并行请求LLM为每个簇命名
+        3. 一次合并请求把簇名去重归并为最终的5-10个分类
+        """
+        result = None
+        try:
+            from local_classifier import RepoClusterer
+            gen_config = self.config.get('gen_categories', {})
+            
+            # 从数据库获取所有仓库并在本地聚类
+            repos = list(self.db.iter_repos(('name', 'description', 'topics')))
+            clusterer = RepoClusterer(
+                n_clusters=gen_config.get('clusters', 40),
+                max_samples=gen_config.get('max_samples', 5000)
+            )
+            clusters = clusterer.clusters(repos, representatives=gen_config.get('representatives', 8))
+            print(f"\n{len(repos)} 个仓库聚类为 {len(clusters)} 个簇")
+            if not clusters:
+                return []
+            
+            # map：分块并行为簇命名
+            chunk_size = max(1, gen_config.get('clusters_per_request', 10))
+            futures = [
+                self.classify_executor.submit(self._limited(self.classify_limiter, self._name_clusters),
+                                              clusters[start:start + chunk_size], start)
+                for start in range(0, len(clusters), chunk_size)
+            ]
+            named = []
+            for future in tqdm(as_completed(futures), total=len(futures), desc="簇命名"):
+                named.extend(future.result())
+            if not named:
+                print("簇命名失败")
+                return []
             
-            # 构建提示词
+            # reduce：合并同义或过细的簇名
+            named.sort(key=lambda item: -item['size'])
             prompt = f"""
-            请分析以下GitHub仓库列表，生成5-10个合适的分类类别。每个类别应该：
+            以下是对GitHub仓库聚类后得到的候选分类，size为该分类覆盖的仓库数量。
+            请合并含义相近或过细的候选分类，生成5-10个合适的最终分类类别。每个类别应该：
             1. 具有明确的主题和范围
             2. 能够覆盖多个仓库
             3. 名称简洁明了
             4. 使用中文命名
             
-            仓库列表：
-            {json.dumps(repos_info, ensure_ascii=False, indent=2)}
+            候选分类：
+            {json.dumps(named, ensure_ascii=False, indent=2)}
+            
+            当前使用的分类：{', '.join(self.config['categories'])}
             
             请按照以下JSON格式返回结果，不要markdown包裹：
             {{
@@ -320,13 +1601,18 @@ class StarClassifier:
                     "分类1": "该分类的简要说明",
                     "分类2": "该分类的简要说明",
                     ...
+                }},
+                "renames": {{
+                    "当前分类": "范围基本相同的新分类"
                 }}
             }}
             
             注意：
             1. 分类名称应该简洁，不超过4个字
             2. 分类说明应该清晰描述该分类的用途和范围
-            3. 只返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹
+            3. 当前分类中范围基本不变的尽量保留原名；只是改名或被新分类完整包含的写入renames，
+               被拆分或范围变化较大的当前分类不要写入renames，这些分类下的仓库会重新分类
+            4. 只返回JSON格式数据，不要包含其他内容，不要格式化和markdown包裹
             """
             
             result = self._call_openai(prompt)
@@ -334,11 +1620,18 @@ class StarClassifier:
             if result:
                 categories = result.get("categories", [])
                 descriptions = result.get("category_descriptions", {})
+                renames = result.get("renames")
+                renames = {
+                    old: new for old, new in (renames if isinstance(renames, dict) else {}).items()
+                    if old in self.config['categories'] and old not in categories and new in categories
+                }
                 
-                # 更新配置文件
+                # 更新配置文件，并立即登记新的分类版本和改名映射
                 self.config['categories'] = categories
+                self.config['category_renames'] = renames
                 with open('config.yaml', 'w', encoding='utf-8') as f:
                     yaml.dump(self.config, f, allow_unicode=True, sort_keys=False)
+                self._current_category_version()
                 
                 # 打印生成的分类
                 print("\n生成的分类：")
@@ -346,6 +1639,9 @@ class StarClassifier:
                 for category in categories:
                     print(f"\n{category}:")
                     print(f"说明：{descriptions.get(category, '无说明')}")
+                for old, new in renames.items():
+                    print(f"\n{old} -> {new}")
+                print("\n运行 classify 时只重新分类所属分类已删除或置信度低的仓库")
                 
                 return categories
             return []
@@ -355,23 +1651,52 @@ class StarClassifier:
             print(f"生成分类失败: {result}")
             return []
 
-    def run(self, mode='fetch_only', uncategorized_only=False):
+    def run(self, mode='fetch_only', uncategorized_only=False, engine='rest', incremental=False,
+            use_async=False, force=False, batch_size=1, local=False, worker=False, batch_files=None,
+            users=None):
         """
         运行完整的分类流程
         mode: 'fetch_only' 只获取仓库信息并保存到数据库
               'classify' 对数据库中的仓库进行分类和总结
+              'sync' 获取仓库的同时对新写入的仓库进行分类
+              'export_batch' 把需要分类的仓库导出为Batch API请求文件
+              'import_batch' 导入Batch API的结果文件
               'getcategories' 使用AI生成合适的分类
         uncategorized_only: 是否只处理未分类的仓库
+        engine: 获取仓库使用的引擎，'rest' 或 'graphql'
+        incremental: 是否增量获取仓库
+        use_async: 分类时是否使用asyncio引擎
+        force: 分类时是否重新处理输入未变化的仓库
+        batch_size: 分类时每次请求打包的仓库数量
+        local: 分类时是否先用本地分类器预分类
+        worker: 分类时只处理任务队列中已有的任务
+        batch_files: export_batch的输出路径，或import_batch的结果文件列表
+        users: 获取仓库时只获取这些用户的star，默认为配置中的所有账号
         """
+        metrics_enabled = self.metrics_config.get('enabled', False)
+        output_dir = self.metrics_config.get('output_dir', 'data/metrics')
+        if metrics_enabled and self.metrics_config.get('trace', False):
+            trace_name = f"{mode}-{self.metrics.started_at:%Y%m%d-%H%M%S}.trace.jsonl"
+            self.metrics.start_trace(os.path.join(output_dir, trace_name))
         try:
             if mode == 'fetch_only':
                 print("开始获取Starred仓库信息...")
-                self.fetch_starred_repos()
+                self.fetch_starred_repos(engine, incremental, users=users)
                 print("仓库信息已保存到数据库")
             elif mode == 'classify':
                 print("开始对数据库中的仓库进行分类和总结...")
-                self.classify_all_repos(uncategorized_only)
+                self.classify_all_repos(uncategorized_only, use_async, force, batch_size, local, worker)
                 print("分类和总结完成")
+            elif mode == 'export_batch':
+                print("开始导出Batch API请求文件...")
+                self.export_batch(batch_files, uncategorized_only, force, local)
+            elif mode == 'import_batch':
+                print("开始导入Batch API结果...")
+                self.import_batch(batch_files)
+            elif mode == 'sync':
+                print("开始同步：获取Starred仓库的同时进行分类...")
+                self.sync(engine, incremental, force, users)
+                print("同步完成")
             elif mode == 'getcategories':
                 print("开始分析仓库并生成合适的分类...")
                 self.generate_categories()
@@ -382,8 +1707,22 @@ class StarClassifier:
         except Exception as e:
             print(f"运行失败: {str(e)}")
             raise
+        finally:
+            self.metrics.close()
+            if metrics_enabled:
+                self._write_metrics_report(output_dir, mode)
+
+    def _write_metrics_report(self, output_dir, mode):
+        """输出JSON报告和Prometheus文本文件，写入失败不影响运行结果"""
+        try:
+            json_path, prom_path = self.metrics.write_reports(output_dir, mode)
+            print(f"指标报告已写入 {json_path} 和 {prom_path}")
+        except OSError as e:
+            print(f"写入指标报告失败: {str(e)}")
 
     def __del__(self):
         """清理资源"""
-        self.fetch_executor.shutdown(wait=True)
-        self.classify_executor.shutdown(wait=True) 
\ No newline at end of file
+        self.classify_executor.shutdown(wait=True)
+        if self.hedge_executor is not None:
+            self.hedge_executor.shutdown(wait=False, cancel_futures=True)
+        self.db.close() 
\ No newline at end of file
@@ -1,8 +1,49 @@
+import hashlib
 import os
+import re
 import yaml
+from itertools import groupby
 from db import Database, DatabaseError
 from datetime import datetime
 
+UNCATEGORIZED = '未分类'
+
+FOOTER = """## 贡献
+
+欢迎提交Issue和Pull Request来帮助改进这个项目。
+
+## 许可证
+
+MIT License
+"""
+
+class _HashingWriter:
+    """写入临时文件的同时计算内容哈希，内容与上次一致时不替换目标文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        self.sha = hashlib.sha256()
+
+    def write(self, text):
+        self.file.write(text)
+        self.sha.update(text.encode('utf-8'))
+
+    def commit(self, previous_hash=None):
+        """完成写入
+
+        Returns:
+            str: 内容哈希
+        """
+        self.file.close()
+        digest = self.sha.hexdigest()
+        if digest == previous_hash and os.path.exists(self.path):
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, self.path)
+        return digest
+
 class TemplateGenerator:
     def __init__(self):
         try:
@@ -16,53 +57,28 @@ class TemplateGenerator:
             print(f"初始化失败: {str(e)}")
             raise
 
-    def generate_readme(self, output_file='README.md'):
-        """生成README文件"""
-        try:
-            # 获取所有仓库
-            all_repos = self.db.get_all_repos()
-            
-            # 按分类组织仓库
-            categorized_repos = {}
-            for repo in all_repos:
-                category = repo['category'] or '未分类'
-                if category not in categorized_repos:
-                    categorized_repos[category] = []
-                categorized_repos[category].append(repo)
-            
-            # 生成分类统计
-            category_stats = []
-            for category, category_repos in categorized_repos.items():
-                category_stats.append(f"- {category}: {len(category_repos)}个仓库")
-            
-            # 生成分类目录
-            category_toc = []
-            for category in sorted(categorized_repos.keys()):
-                category_toc.append(f"- [{category}](#{category})")
-            
-            # 生成分类内容
-            category_sections = []
-            for category, category_repos in sorted(categorized_repos.items()):
-                # 按名称排序仓库
-                category_repos.sort(key=lambda x: x['name'].lower())
-                
-                # 生成该分类的仓库列表
-                repo_list = []
-                for repo in category_repos:
-                    repo_list.append(f"- [{repo['name']}]({repo['url']}) - {repo.get('summary', repo['description'])}")
-                
-                # 添加分类标题和仓库列表
-                category_sections.append(f"## {category}\n\n" + "\n".join(repo_list) + "\n")
-            
-            # 生成完整的README内容
-            readme_content = f"""# GitHub Star 仓库分类
+    @staticmethod
+    def _repo_line(name, url, ai_summary, description):
+        return f"- [{name}]({url}) - {description or ai_summary or ''}\n"
+
+    @staticmethod
+    def _category_filename(category):
+        """分类名转换为安全的文件名"""
+        return re.sub(r'[\\/:*?"<>|\s]+', '_', category) + '.md'
+
+    @staticmethod
+    def _header(category_counts, category_toc, user=None):
+        total = sum(count for _, count in category_counts)
+        category_stats = [f"- {category}: {count}个仓库" for category, count in category_counts]
+        title = f"{user} 的 GitHub Star 仓库分类" if user else "GitHub Star 仓库分类"
+        return f"""# {title}
 
 这是一个使用AI对GitHub Star的仓库进行分类和总结的工具。
 
 ## 统计信息
 
-总仓库数：{len(all_repos)}个
-分类数：{len(categorized_repos)}个
+总仓库数：{total}个
+分类数：{len(category_counts)}个
 
 {chr(10).join(category_stats)}
 
@@ -70,24 +86,105 @@ class TemplateGenerator:
 
 {chr(10).join(category_toc)}
 
-## 分类详情
-
-{chr(10).join(category_sections)}
-
-## 贡献
-
-欢迎提交Issue和Pull Request来帮助改进这个项目。
+"""
 
-## 许可证
+    @staticmethod
+    def user_output_file(output_file, user):
+        """用户对应的输出文件：STAR.md -> STAR-<user>.md"""
+        stem, suffix = os.path.splitext(output_file)
+        return f"{stem}-{user}{suffix}"
+
+    def generate_user_readmes(self, output_file='STAR.md', split=False, force=False):
+        """为数据库中记录了star关系的每个用户分别生成README"""
+        users = self.db.get_star_users()
+        if not users:
+            print("数据库中没有用户的star记录，请先运行 fetch")
+            return
+        for user, _ in users:
+            self.generate_readme(self.user_output_file(output_file, user), split=split, user=user, force=force)
+
+    def _render_signature(self, split, user, category_counts):
+        """数据签名加上生成方式和分类统计，任何一项变化都需要重新渲染"""
+        header = self._header(category_counts, [], user) + FOOTER
+        digest = hashlib.sha256(header.encode('utf-8')).hexdigest()[:16]
+        return f"{'split' if split else 'single'}|{self.db.get_repos_signature(user)}|{digest}"
+
+    def generate_readme(self, output_file='README.md', split=False, user=None, force=False):
+        """生成README文件
+
+        先比较数据签名（仓库数量、最近更新时间、分类统计），与上次生成时一致且输出文件
+        都还在时直接跳过，不读取也不渲染仓库。否则按分类、名称顺序从数据库游标流式读取
+        仓库并直接写入文件；每个输出文件先写到临时文件并计算内容哈希，与上次生成时
+        一致则不替换原文件。修改了文档模板时用 force 强制重新渲染。
+
+        Args:
+            output_file (str): 输出文件；split为True时为索引文件
+            split (bool): 是否每个分类单独生成一个文件，存放在与索引文件同名的目录中
+            user (str): 只包含该用户star的仓库，默认包含所有仓库
+            force (bool): 忽略数据签名，重新渲染
+        """
+        try:
+            previous = self.db.get_render_hashes()
+            category_counts = self.db.get_category_counts(UNCATEGORIZED, user=user)
+            signature = self._render_signature(split, user, category_counts)
+            split_dir = os.path.splitext(output_file)[0]
+            outputs = [output_file]
+            if split:
+                outputs += [path for path in previous if path.startswith(os.path.join(split_dir, ''))]
+            if (not force and signature == self.db.get_render_signature(output_file)
+                    and all(os.path.exists(path) for path in outputs)):
+                print(f"数据未变化，跳过生成: {output_file}")
+                return
+            rows = self.db.iter_render_rows(UNCATEGORIZED, user=user)
+            hashes = {}
+            removed = []
+
+            if split:
+                os.makedirs(split_dir, exist_ok=True)
+                link_dir = os.path.basename(split_dir)
+                category_toc = [
+                    f"- [{category}]({link_dir}/{self._category_filename(category)}) ({count})"
+                    for category, count in category_counts
+                ]
+                writer = _HashingWriter(output_file)
+                writer.write(self._header(category_counts, category_toc, user))
+                writer.write(FOOTER)
+                hashes[output_file] = writer.commit(previous.get(output_file))
+
+                for category, category_rows in groupby(rows, key=lambda row: row[2]):
+                    path = os.path.join(split_dir, self._category_filename(category))
+                    writer = _HashingWriter(path)
+                    writer.write(f"# {category}\n\n")
+                    for name, url, _, ai_summary, description in category_rows:
+                        writer.write(self._repo_line(name, url, ai_summary, description))
+                    writer.write(f"\n[返回目录](../{os.path.basename(output_file)})\n")
+                    hashes[path] = writer.commit(previous.get(path))
+
+                # 删除已不存在的分类对应的文件
+                prefix = os.path.join(split_dir, '')
+                for path in previous:
+                    if path.startswith(prefix) and path not in hashes:
+                        if os.path.exists(path):
+                            os.remove(path)
+                        removed.append(path)
+            else:
+                category_toc = [f"- [{category}](#{category})" for category, _ in category_counts]
+                writer = _HashingWriter(output_file)
+                writer.write(self._header(category_counts, category_toc, user))
+                writer.write("## 分类详情\n\n")
+                for category, category_rows in groupby(rows, key=lambda row: row[2]):
+                    writer.write(f"## {category}\n\n")
+                    for name, url, _, ai_summary, description in category_rows:
+                        writer.write(self._repo_line(name, url, ai_summary, description))
+                    writer.write("\n")
+                writer.write(FOOTER)
+                hashes[output_file] = writer.commit(previous.get(output_file))
+
+            changed = {path: digest for path, digest in hashes.items() if digest != previous.get(path)}
+            self.db.save_render_hashes(changed, removed)
+            self.db.save_render_signature(output_file, signature)
+            print(f"README文件已生成: {output_file}（更新 {len(changed)}/{len(hashes)} 个文件）")
 
-MIT License
-"""
-            
-            # 写入README文件
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(readme_content)
-            print(f"README文件已生成: {output_file}")
-            
         except Exception as e:
             print(f"生成README失败: {str(e)}")
             raise
@@ -0,0 +1,42 @@
+import os
+import sys
+
+# 模块都在仓库根目录下
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import yaml
+from types import SimpleNamespace
+
+@pytest.fixture
+def make_classifier(tmp_path, monkeypatch):
+    """在临时目录中写入指向模拟服务的config.yaml并创建StarClassifier
+
+    overrides 中的每一项按点分路径覆盖配置，如 {'openai.hedge.enabled': True}。
+    """
+    from bench.run import bench_config
+    from star_classifier import StarClassifier
+    created = []
+
+    def make(github_url='http://127.0.0.1:9', openai_url='http://127.0.0.1:9', overrides=None):
+        args = SimpleNamespace(github_url=github_url, openai_url=openai_url, github_tokens=1, openai_keys=2,
+                               retry_after=0, fetch_workers=4, classify_workers=4, max_in_flight_per_key=4,
+                               adaptive=False, hedge=False, flush_size=50)
+        config = bench_config(args)
+        for path, value in (overrides or {}).items():
+            *parents, leaf = path.split('.')
+            node = config
+            for key in parents:
+                node = node.setdefault(key, {})
+            node[leaf] = value
+        monkeypatch.chdir(tmp_path)
+        with open('config.yaml', 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+        classifier = StarClassifier()
+        created.append(classifier)
+        return classifier
+
+    yield make
+    for classifier in created:
+        classifier.classify_executor.shutdown(wait=True)
+        classifier.db.close()
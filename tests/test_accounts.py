@@ -0,0 +1,61 @@
+import pytest
+from bench.mock_servers import MockGitHub, fake_repo
+
+@pytest.fixture
+def github():
+    server = MockGitHub(repo_count=30, latency=0, jitter=0,
+                        token_users={'token-alice': 'alice', 'token-bob': 'bob'}).start()
+    yield server
+    server.stop()
+
+def starred(classifier, user):
+    with classifier.db._reader() as conn:
+        return {row[0] for row in conn.execute('SELECT repo_name FROM user_stars WHERE user = ?', (user,))}
+
+@pytest.mark.parametrize('engine', ['rest', 'graphql'])
+def test_token_accounts_fetch_their_own_stars(make_classifier, github, engine):
+    classifier = make_classifier(github.url, overrides={
+        'github.graphql_page_size': 10,
+        'github.accounts': [{'user': 'alice', 'token': 'token-alice'}, {'user': 'bob', 'token': 'token-bob'}],
+    })
+    classifier.fetch_starred_repos(engine)
+
+    for user in ('alice', 'bob'):
+        offset = github.user_offset(user)
+        assert starred(classifier, user) == {fake_repo(offset + index)['name'] for index in range(30)}
+    # 两个账号的star有一半重叠，重叠的仓库只保存一次
+    assert classifier.db.count_repos() == 45
+
+def test_public_account_uses_login(make_classifier, github):
+    classifier = make_classifier(github.url, overrides={'github.accounts': ['carol']})
+    classifier.fetch_starred_repos('graphql')
+    offset = github.user_offset('carol')
+    assert starred(classifier, 'carol') == {fake_repo(offset + index)['name'] for index in range(30)}
+
+def star_page_requests(classifier):
+    """/user/starred 翻页请求计数 {(key, status): count}"""
+    counts = {}
+    for (name, labels), value in classifier.metrics._counters.items():
+        labels = dict(labels)
+        if name == 'http_requests' and labels.get('endpoint') == '/user/starred':
+            counts[labels['key'], labels['status']] = value
+    return counts
+
+def test_star_pages_are_labelled_with_the_account_token(make_classifier, github):
+    classifier = make_classifier(github.url, overrides={
+        'github.accounts': [{'user': 'alice', 'token': 'token-alice'}, {'user': 'bob', 'token': 'token-bob'}],
+    })
+    classifier.fetch_starred_repos('rest')
+    assert star_page_requests(classifier) == {('...lice', '200'): 1, ('...-bob', '200'): 1}
+
+def test_failed_star_page_records_its_status(make_classifier):
+    from github import GithubException
+    classifier = make_classifier()
+
+    def pages():
+        yield [1]
+        raise GithubException(502, 'bad gateway', None)
+
+    with pytest.raises(GithubException):
+        list(classifier._timed_pages(pages(), 'alice-token-1234'))
+    assert star_page_requests(classifier) == {('...1234', '200'): 1, ('...1234', '502'): 1}
@@ -0,0 +1,86 @@
+import json
+import os
+import pytest
+from bench.run import seed_database
+from batch_api import BatchApi
+
+@pytest.fixture
+def classifier(make_classifier):
+    classifier = make_classifier()
+    seed_database(classifier.db, 6, 6)
+    classifier._current_category_version()
+    return classifier
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def all_names(classifier):
+    return [repo['name'] for repo in classifier.db.iter_repos(('name',))]
+
+def test_export_shards_by_request_count(classifier, tmp_path):
+    names = all_names(classifier)
+    output = str(tmp_path / 'batch' / 'requests.jsonl')
+    shards = BatchApi(classifier, max_requests=4).export(names, output)
+    assert shards == [(str(tmp_path / 'batch' / 'requests-001.jsonl'), 4),
+                      (str(tmp_path / 'batch' / 'requests-002.jsonl'), 2)]
+
+    requests = [line for path, _ in shards for line in read_jsonl(path)]
+    assert sorted(request['custom_id'] for request in requests) == sorted(names)
+    repos = {repo['name']: repo for repo in classifier.db.get_all_repos()}
+    for request in requests:
+        assert request['method'] == 'POST' and request['url'] == '/v1/chat/completions'
+        # 请求体与classify发送的完全一致
+        repo = repos[request['custom_id']]
+        assert request['body'] == classifier._build_openai_payload(classifier._build_classify_prompt(repo))
+
+def test_export_shards_by_bytes(classifier, tmp_path):
+    names = all_names(classifier)
+    output = str(tmp_path / 'requests.jsonl')
+    single = BatchApi(classifier).export(names, output)
+    with open(single[0][0], 'rb') as f:
+        largest = max(len(line) for line in f)
+    os.remove(single[0][0])
+
+    max_bytes = largest * 2
+    shards = BatchApi(classifier, max_bytes=max_bytes).export(names, output)
+    assert len(shards) >= 3
+    assert sum(count for _, count in shards) == len(names)
+    assert all(os.path.getsize(path) <= max_bytes for path, _ in shards)
+
+def result_line(custom_id, content=None, status_code=200, error=None):
+    response = {'status_code': status_code, 'body': {'choices': [{'message': {'content': content}}]}}
+    return json.dumps({'custom_id': custom_id, 'response': None if error else response, 'error': error},
+                      ensure_ascii=False)
+
+def test_import_results(classifier, tmp_path):
+    names = all_names(classifier)
+    shards = BatchApi(classifier).export(names, str(tmp_path / 'requests.jsonl'))
+    ids = [request['custom_id'] for request in read_jsonl(shards[0][0])]
+
+    valid = json.dumps({'category': 'AI应用', 'summary': '总结', 'confidence': 0.8}, ensure_ascii=False)
+    lines = [
+        result_line(ids[0], valid),
+        # 列表之外的分类按"其他"、置信度0记录
+        result_line(ids[1], json.dumps({'category': '不存在', 'summary': '总结'}, ensure_ascii=False)),
+        result_line(ids[2], error={'code': 'server_error', 'message': 'boom'}),
+        result_line(ids[3], valid, status_code=500),
+        result_line(ids[4], 'not json'),
+        result_line(ids[5], '[1, 2]'),
+        result_line('ghost/repo', valid),
+        '',
+        '{broken',
+    ]
+    path = tmp_path / 'results.jsonl'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    stats = BatchApi(classifier, chunk_size=2).apply_results([str(path)])
+    assert (stats['applied'], stats['failed'], stats['unknown']) == (2, 5, 1)
+    assert len(stats['errors']) == 5
+
+    repos = {repo['name']: repo for repo in classifier.db.get_all_repos()}
+    assert (repos[ids[0]]['category'], repos[ids[0]]['confidence']) == ('AI应用', 0.8)
+    assert (repos[ids[1]]['category'], repos[ids[1]]['confidence']) == ('其他', 0.0)
+    assert {repos[name]['classify_source'] for name in ids[:2]} == {'batch'}
+    # 导入的指纹与classify一致，失败的仓库仍会被重新选中
+    assert sorted(classifier._select_for_classification()) == sorted(ids[2:])
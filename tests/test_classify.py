@@ -0,0 +1,157 @@
+import asyncio
+import re
+import pytest
+from bench.mock_servers import MockOpenAI
+from bench.run import seed_database
+
+@pytest.fixture
+def openai():
+    server = MockOpenAI(latency=0, jitter=0).start()
+    yield server
+    server.stop()
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_force_bypasses_response_cache(make_classifier, openai, use_async):
+    classifier = make_classifier(openai_url=openai.url, overrides={'openai.cache.enabled': True})
+    seed_database(classifier.db, 20, 10)
+    classifier.classify_all_repos(use_async=use_async)
+    assert openai.stats['requests'] == 20
+
+    # 输入未变化：跳过所有仓库
+    openai.reset_stats()
+    classifier.classify_all_repos(use_async=use_async)
+    assert openai.stats['requests'] == 0
+
+    # --force：重新请求，而不是重放缓存中的旧响应
+    classifier.classify_all_repos(use_async=use_async, force=True)
+    assert openai.stats['requests'] == 20
+
+def test_async_engine_keeps_sqlite_off_the_event_loop(make_classifier, openai):
+    classifier = make_classifier(openai_url=openai.url, overrides={'openai.cache.enabled': True})
+    seed_database(classifier.db, 30, 10)
+    on_loop = []
+
+    def watch(fn):
+        def wrapper(*args, **kwargs):
+            on_loop.append((fn.__name__, asyncio._get_running_loop() is not None))
+            return fn(*args, **kwargs)
+        return wrapper
+
+    def watch_iter(fn):
+        def wrapper(*args, **kwargs):
+            on_loop.append((fn.__name__, asyncio._get_running_loop() is not None))
+            yield from fn(*args, **kwargs)
+        return wrapper
+
+    db = classifier.db
+    db.claim_jobs = watch(db.claim_jobs)
+    db.get_cached_response = watch(db.get_cached_response)
+    db.iter_repos_by_names = watch_iter(db.iter_repos_by_names)
+    classifier.classify_all_repos(use_async=True)
+
+    called = {name for name, _ in on_loop}
+    assert {'claim_jobs', 'get_cached_response', 'iter_repos_by_names'} <= called
+    assert [name for name, running in on_loop if running] == []
+
+def test_category_change_reclassifies_only_affected_repos(make_classifier, openai):
+    classifier = make_classifier(openai_url=openai.url)
+    seed_database(classifier.db, 60, 20)
+    classifier.classify_all_repos()
+    columns = ('name', 'category', 'confidence', 'category_version')
+    before = {repo['name']: repo for repo in classifier.db.iter_repos(columns)}
+    stale = {name for name, repo in before.items() if repo['category'] == 'Web安全' or repo['confidence'] < 0.6}
+    renamed = {name for name, repo in before.items() if repo['category'] == 'DevOps'} - stale
+    assert stale and renamed
+
+    # 删除Web安全，DevOps改名为运维
+    categories = [category for category in classifier.config['categories'] if category not in ('Web安全', 'DevOps')]
+    classifier.config['categories'] = categories + ['运维']
+    classifier.config['category_renames'] = {'DevOps': '运维'}
+    openai.reset_stats()
+    classifier.classify_all_repos()
+    assert openai.stats['requests'] == len(stale)
+
+    after = {repo['name']: repo for repo in classifier.db.iter_repos(columns)}
+    assert {repo['category_version'] for repo in after.values()} == {2}
+    assert all(after[name]['category'] == '运维' for name in renamed)
+    assert all(after[name]['category'] == before[name]['category']
+               for name in before.keys() - stale - renamed)
+    assert not any(repo['category'] in ('Web安全', 'DevOps') for repo in after.values())
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_batch_request_scales_max_tokens(make_classifier, openai, use_async):
+    classifier = make_classifier(openai_url=openai.url, overrides={'openai.max_tokens': 512})
+    seed_database(classifier.db, 20, 20)
+    classifier.classify_all_repos(use_async=use_async, batch_size=20)
+    # 20个仓库的输出超过单个仓库的max_tokens，未放大时会被截断并二分重试
+    assert openai.stats['requests'] == 1
+    assert classifier.db.count_repos('classify_fingerprint IS NOT NULL') == 20
+
+def test_batch_retries_dropped_and_garbled_items(make_classifier):
+    server = MockOpenAI(latency=0, jitter=0, batch_error_rate=0.3).start()
+    try:
+        classifier = make_classifier(openai_url=server.url)
+        seed_database(classifier.db, 40, 20)
+        classifier.classify_all_repos(batch_size=10)
+        assert classifier.db.count_repos('classify_fingerprint IS NOT NULL') == 40
+        assert server.stats['requests'] > 4
+    finally:
+        server.stop()
+
+def test_match_batch_results(make_classifier):
+    classifier = make_classifier()
+    seed_database(classifier.db, 4, 4)
+    repos = classifier.db.get_all_repos()
+    names = [repo['name'] for repo in repos]
+    result = {'results': [
+        {'name': names[0], 'category': 'AI应用', 'summary': 'ok', 'confidence': 0.9},
+        {'name': names[1], 'category': None},
+        {'name': 'unknown/repo', 'category': 'AI应用', 'summary': 'ok'},
+        'garbage',
+    ]}
+    results, missing = classifier._match_batch_results(repos, result)
+    assert [row[:3] for row in results] == [(names[0], 'AI应用', 'ok')]
+    assert [repo['name'] for repo in missing] == names[1:]
+    assert classifier._match_batch_results(repos, None) == ([], repos)
+
+def test_failed_batch_is_bisected(make_classifier, monkeypatch):
+    classifier = make_classifier()
+    seed_database(classifier.db, 8, 8)
+    repos = classifier.db.get_all_repos()
+    sizes = []
+
+    def call_openai(prompt, response_format="", system_prompt=None, max_tokens=None):
+        names = re.findall(r'仓库名称：(\S+)', prompt)
+        sizes.append(len(names))
+        if len(names) > 2:
+            return None
+        return {'results': [{'name': name, 'category': 'AI应用', 'summary': 's'} for name in names]}
+
+    monkeypatch.setattr(classifier, '_call_openai', call_openai)
+    results = classifier._classify_batch_results(repos)
+    assert sorted(row[0] for row in results) == sorted(repo['name'] for repo in repos)
+    assert sizes == [8, 4, 2, 2, 4, 2, 2]
+
+def test_resume_warns_that_selection_is_ignored(make_classifier, openai, capsys):
+    classifier = make_classifier(openai_url=openai.url)
+    seed_database(classifier.db, 10, 10)
+    classifier.db.reset_jobs('classify', [repo['name'] for repo in classifier.db.iter_repos(('name',))][:3])
+    classifier.classify_all_repos(force=True)
+    assert '--force 未生效' in capsys.readouterr().out
+    assert openai.stats['requests'] == 3
+
+def test_concurrent_selection_joins_existing_queue(make_classifier, openai, monkeypatch, capsys):
+    classifier = make_classifier(openai_url=openai.url)
+    seed_database(classifier.db, 10, 10)
+    names = [repo['name'] for repo in classifier.db.iter_repos(('name',))]
+    select = classifier._select_for_classification
+
+    def select_while_other_process_resets(*args):
+        selected = select(*args)
+        classifier.db.reset_jobs('classify', names[:4])
+        return selected
+
+    monkeypatch.setattr(classifier, '_select_for_classification', select_while_other_process_resets)
+    classifier.classify_all_repos()
+    assert '另一个进程已建立 4 个分类任务' in capsys.readouterr().out
+    assert openai.stats['requests'] == 4
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+import pytest
+import concurrency_limit
+from concurrency_limit import AdaptiveLimiter
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(concurrency_limit, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+def complete(limiter, clock, latency=1.0):
+    with limiter.slot():
+        clock.now += latency
+
+def test_limit_increases_by_one_per_window(clock):
+    limiter = AdaptiveLimiter('test', initial=2, max_limit=4)
+    # 上限为n时约每完成n个请求加1
+    for _ in range(2):
+        complete(limiter, clock)
+    assert limiter.limit == 2
+    complete(limiter, clock)
+    assert limiter.limit == 3
+    for _ in range(20):
+        complete(limiter, clock)
+    assert limiter.limit == 4
+    assert [reason for _, _, reason in limiter.history] == ['initial', 'increase', 'increase']
+
+def test_slow_requests_do_not_increase_limit(clock):
+    limiter = AdaptiveLimiter('test', initial=2, max_limit=8, latency_tolerance=2.0)
+    complete(limiter, clock, latency=1.0)
+    for _ in range(10):
+        complete(limiter, clock, latency=5.0)
+    assert limiter.limit == 2
+
+@pytest.mark.parametrize('reason', ['429', 'timeout'])
+def test_throttle_halves_limit_once_per_wave(clock, reason):
+    limiter = AdaptiveLimiter('test', initial=16, min_limit=3)
+    started = [limiter.acquire() for _ in range(3)]
+    clock.now += 1
+    limiter.backoff(reason, started[0])
+    # 同一批在减小之前发出的请求报告的限流不再减小上限
+    limiter.backoff(reason, started[1])
+    assert limiter.limit == 8
+    clock.now += 1
+    limiter.backoff(reason)
+    assert limiter.limit == 4
+    clock.now += 1
+    limiter.backoff(reason)
+    assert limiter.limit == 3
+    assert limiter.throttled == 4
+    assert limiter.history[-1][2] == reason
+
+def test_throttled_slot_is_not_counted_as_success(clock):
+    limiter = AdaptiveLimiter('test', initial=1, max_limit=8)
+    for _ in range(5):
+        with limiter.slot():
+            clock.now += 1
+            limiter.backoff('429')
+    assert limiter.limit == 1
+    assert limiter.completed == 5
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import time
+import pytest
+from bench.mock_servers import MockOpenAI
+from bench.run import seed_database
+import db as db_module
+from db import Database, DatabaseError
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'stars.db'), read_pool_size=1, read_timeout=0.2)
+    seed_database(database, 50, 20)
+    yield database
+    database.close()
+
+def test_iter_repos_does_not_hold_pooled_reader(db):
+    seen = 0
+    for repo in db.iter_repos(('name',), batch_size=10):
+        # 遍历期间其他读操作仍能拿到连接池中唯一的连接
+        assert db.get_cached_response(repo['name']) is None
+        seen += 1
+    assert seen == 50
+
+def test_reader_times_out_instead_of_blocking(db):
+    borrowed = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with db._reader():
+            borrowed.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    try:
+        borrowed.wait(5)
+        with pytest.raises(DatabaseError):
+            db.count_repos()
+    finally:
+        release.set()
+        thread.join()
+    assert db.count_repos() == 50
+
+def test_classify_with_single_reader(make_classifier):
+    openai = MockOpenAI(latency=0, jitter=0).start()
+    try:
+        classifier = make_classifier(openai_url=openai.url, overrides={
+            'database.read_pool_size': 1,
+            # 工作线程在主线程遍历仓库期间查询LLM缓存
+            'openai.cache.enabled': True,
+        })
+        seed_database(classifier.db, 60, 20)
+        classifier.classify_all_repos(force=True)
+        assert classifier.db.count_repos('classify_fingerprint IS NOT NULL') == 60
+    finally:
+        openai.stop()
+
+def test_search_falls_back_to_like_without_fts(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_module, 'FTS_TOKENIZER', 'missing-tokenizer')
+    database = Database(str(tmp_path / 'stars.db'))
+    try:
+        assert not database.fts_enabled
+        seed_database(database, 20, 10)
+        results = database.search_repos('repo-1')
+        assert {repo['name'] for repo in results} >= {'owner1/repo-1', 'owner10/repo-10'}
+        with pytest.raises(DatabaseError):
+            database.rebuild_fts()
+    finally:
+        database.close()
+
+def test_stale_fts_triggers_are_dropped(tmp_path, monkeypatch):
+    path = str(tmp_path / 'stars.db')
+    Database(path).close()
+    # 旧数据库留下了同步触发器，但当前SQLite无法建立全文索引
+    conn = sqlite3.connect(path)
+    conn.execute('DROP TABLE repositories_fts')
+    conn.close()
+    monkeypatch.setattr(db_module, 'FTS_TOKENIZER', 'missing-tokenizer')
+    database = Database(path)
+    try:
+        assert not database.fts_enabled
+        seed_database(database, 5, 5)
+        assert database.count_repos() == 5
+    finally:
+        database.close()
+
+def test_category_set_versions_only_on_change(db):
+    assert db.register_category_set(['a', 'b']) == (1, True)
+    # 只调整顺序不算新版本
+    assert db.register_category_set(['b', 'a']) == (1, False)
+    # 改名映射只保留旧名已移除、新名在列表中的项
+    assert db.register_category_set(['a', 'c'], {'b': 'c', 'a': 'x', 'd': 'e'}) == (2, True)
+    assert db.get_category_sets() == [(1, ['a', 'b'], {}), (2, ['a', 'c'], {'b': 'c'})]
+
+def test_failed_write_task_rolls_back_only_itself(db):
+    started = threading.Event()
+    release = threading.Event()
+    names = [f'owner{index}/repo-{index}' for index in range(3)]
+
+    def block(conn):
+        started.set()
+        release.wait(5)
+
+    def update(conn, name, fail):
+        conn.execute("UPDATE repositories SET description = 'changed' WHERE name = ?", (name,))
+        if fail:
+            raise ValueError('boom')
+        return name
+
+    results = {}
+
+    def submit(name, fail):
+        try:
+            results[name] = db._write(update, name, fail)
+        except ValueError as e:
+            results[name] = e
+
+    blocker = threading.Thread(target=db._write, args=(block,))
+    blocker.start()
+    started.wait(5)
+    # 写线程被占用期间排队的任务会在同一个事务中执行
+    threads = [threading.Thread(target=submit, args=(name, index == 1)) for index, name in enumerate(names)]
+    for thread in threads:
+        thread.start()
+    while db._write_queue.qsize() < len(names):
+        time.sleep(0.01)
+    release.set()
+    for thread in [blocker] + threads:
+        thread.join()
+
+    assert results[names[0]] == names[0] and results[names[2]] == names[2]
+    assert isinstance(results[names[1]], ValueError)
+    descriptions = {repo['name']: repo['description'] for repo in db.get_repos_by_names(names)}
+    assert descriptions[names[0]] == descriptions[names[2]] == 'changed'
+    assert descriptions[names[1]] != 'changed'
+
+def test_upsert_keeps_stored_readme_when_none(db):
+    repo = {'name': 'owner/kept', 'description': 'old', 'language': 'Go', 'topics': ['a'], 'url': 'u',
+            'readme': 'original', 'pushed_at': '2024-01-01T00:00:00Z', 'readme_etag': '"etag-1"'}
+    db.save_repos([repo])
+    # README未变化（304）或请求失败时传入None
+    db.save_repos([{**repo, 'description': 'new', 'readme': None, 'pushed_at': None, 'readme_etag': None}])
+    stored = db.get_repos_by_names(['owner/kept'])[0]
+    assert (stored['description'], stored['readme'], stored['pushed_at'], stored['readme_etag']) == \
+        ('new', 'original', '2024-01-01T00:00:00Z', '"etag-1"')
+    # 空字符串表示仓库已没有README，覆盖已保存的值
+    db.save_repos([{**repo, 'readme': '', 'readme_etag': '"etag-2"'}])
+    stored = db.get_repos_by_names(['owner/kept'])[0]
+    assert (stored['readme'], stored['readme_etag']) == ('', '"etag-2"')
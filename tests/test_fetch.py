@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+import requests
+from bench.mock_servers import MockGitHub
+
+@pytest.fixture
+def github():
+    server = MockGitHub(repo_count=20, latency=0, jitter=0).start()
+    yield server
+    server.stop()
+
+def readmes(classifier):
+    return {repo['name']: repo['readme'] for repo in classifier.db.iter_repos(('name', 'readme'))}
+
+def test_network_error_does_not_erase_readme(make_classifier, github):
+    classifier = make_classifier(github.url)
+
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError('connection reset')
+
+    classifier.github_session.get = fail
+    classifier.fetch_starred_repos('rest')
+    assert set(readmes(classifier).values()) == {''}
+
+    # pushed_at没有随失败的请求保存，下一次完整获取会重新请求README
+    del classifier.github_session.get
+    classifier.fetch_starred_repos('rest')
+    assert github.stats['readme'] == 20
+    assert all(readmes(classifier).values())
+
+def test_server_error_keeps_stored_readme(make_classifier, github):
+    classifier = make_classifier(github.url)
+    classifier.fetch_starred_repos('rest')
+    stored = readmes(classifier)
+    assert all(stored.values())
+
+    # 模拟仓库有新的push
+    conn = sqlite3.connect(classifier.db.db_path)
+    conn.execute('UPDATE repositories SET pushed_at = NULL')
+    conn.commit()
+    conn.close()
+    github.readme_status = 503
+    classifier.fetch_starred_repos('rest')
+    assert readmes(classifier) == stored
+
+    github.readme_status = None
+    github.reset_stats()
+    classifier.fetch_starred_repos('rest')
+    assert github.stats['readme'] == 20
+    assert readmes(classifier) == stored
+
+def test_missing_readme_is_stored_as_empty(make_classifier, github):
+    classifier = make_classifier(github.url)
+    github.readme_status = 404
+    classifier.fetch_starred_repos('rest')
+    assert set(readmes(classifier).values()) == {''}
+
+    github.reset_stats()
+    classifier.fetch_starred_repos('rest')
+    assert github.stats['readme'] == 0
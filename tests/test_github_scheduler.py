@@ -0,0 +1,83 @@
+from unittest import mock
+import pytest
+import requests
+from github_scheduler import GitHubScheduler, RateLimitedSession, RateLimitError
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None, text=''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+def send(session, responses, count=1, url='https://api.github.com/repos/a/b/readme'):
+    """用session发送count个请求，返回每次实际使用的Authorization头"""
+    sent = []
+    responses = iter(responses)
+
+    def fake_request(self, method, url, headers=None, **kwargs):
+        sent.append(headers['Authorization'])
+        return next(responses, FakeResponse())
+
+    with mock.patch.object(requests.Session, 'request', fake_request):
+        for _ in range(count):
+            session.get(url)
+    return sent
+
+def test_pool_session_rotates_tokens():
+    scheduler = GitHubScheduler(['pool-a', 'pool-b'], requests_per_second=1000, burst=1, reserve=0)
+    sent = send(RateLimitedSession(scheduler), [], count=2)
+    assert sorted(sent) == ['Bearer pool-a', 'Bearer pool-b']
+
+def test_pinned_session_keeps_token_outside_pool():
+    scheduler = GitHubScheduler(['pool-a', 'pool-b'], reserve=0)
+    session = RateLimitedSession(scheduler, token='account-token')
+    sent = send(session, [], count=3, url='https://api.github.com/graphql')
+    assert sent == ['Bearer account-token'] * 3
+    # 固定使用的token不会被加入轮换
+    assert [state.token for state in scheduler.tokens] == ['pool-a', 'pool-b']
+
+def test_pinned_session_retries_on_same_token_after_rate_limit():
+    scheduler = GitHubScheduler(['pool-a', 'pool-b'], reserve=0)
+    session = RateLimitedSession(scheduler, token='pool-b')
+    sent = send(session, [FakeResponse(429, {'Retry-After': '0'}), FakeResponse(200)])
+    assert sent == ['Bearer pool-b', 'Bearer pool-b']
+
+def test_rate_limit_error_after_retries():
+    scheduler = GitHubScheduler(['pool-a'], reserve=0)
+    session = RateLimitedSession(scheduler, max_retries=2)
+    with pytest.raises(RateLimitError):
+        send(session, [FakeResponse(429, {'Retry-After': '0'})] * 3)
+
+class FakeLimiter:
+    def __init__(self):
+        self.reasons = []
+
+    def backoff(self, reason, started=None):
+        self.reasons.append(reason)
+
+def test_session_applies_default_timeout():
+    scheduler = GitHubScheduler(['pool-a'], reserve=0)
+    session = RateLimitedSession(scheduler, timeout=(3, 7))
+    timeouts = []
+
+    def fake_request(self, method, url, headers=None, **kwargs):
+        timeouts.append(kwargs.get('timeout'))
+        return FakeResponse()
+
+    with mock.patch.object(requests.Session, 'request', fake_request):
+        session.get('https://api.github.com/repos/a/b/readme')
+        session.get('https://api.github.com/repos/a/b/readme', timeout=1)
+    assert timeouts == [(3, 7), 1]
+
+def test_timeout_backs_off_limiter():
+    scheduler = GitHubScheduler(['pool-a'], reserve=0)
+    limiter = FakeLimiter()
+    session = RateLimitedSession(scheduler, limiter=limiter, timeout=1)
+
+    def fake_request(self, method, url, headers=None, **kwargs):
+        raise requests.ReadTimeout('read timed out')
+
+    with mock.patch.object(requests.Session, 'request', fake_request):
+        with pytest.raises(requests.Timeout):
+            session.get('https://api.github.com/repos/a/b/readme')
+    assert limiter.reasons == ['timeout']
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import pytest
+from async_classifier import AsyncClassifyEngine
+from hedging import HedgePolicy
+
+def test_no_hedge_until_enough_samples():
+    policy = HedgePolicy(min_samples=3, min_delay=0.1)
+    policy.observe(1.0)
+    policy.observe(2.0)
+    assert policy.delay() is None
+    policy.observe(3.0)
+    assert policy.delay() == 3.0
+
+def test_delay_is_floored_at_min_delay():
+    policy = HedgePolicy(min_samples=1, min_delay=0.5)
+    policy.observe(0.01)
+    assert policy.delay() == 0.5
+
+def test_hedge_ratio_is_capped_and_refundable():
+    policy = HedgePolicy(max_ratio=0.1, min_samples=1)
+    for _ in range(20):
+        policy.delay()
+    assert [policy.allow() for _ in range(3)] == [True, True, False]
+    policy.refund()
+    assert policy.allow()
+    assert policy.hedges == 2
+
+@pytest.fixture
+def hedged(make_classifier):
+    """两个key、对冲阈值50ms的分类器，请求结果由 responses[key] 决定：(延迟, 状态码)"""
+    classifier = make_classifier(overrides={'openai.hedge.enabled': True})
+    classifier.hedge = HedgePolicy(min_samples=1, min_delay=0.05, max_ratio=1)
+    classifier.hedge.observe(0.01)
+    primary, other = classifier.api_keys
+    responses = {}
+
+    def fake_post(api_key, payload, estimated_tokens):
+        start = time.monotonic()
+        delay, status = responses[api_key]
+        time.sleep(delay)
+        return status, {}, api_key, start
+
+    async def fake_post_async(http, api_key, payload, estimated_tokens):
+        delay, status = responses[api_key]
+        await asyncio.sleep(delay)
+        return status, {}, api_key
+
+    classifier._post_openai = fake_post
+    engine = AsyncClassifyEngine(classifier)
+    engine._post = fake_post_async
+    return classifier, engine, primary, other, responses
+
+def send(classifier, engine, primary, use_async):
+    if use_async:
+        return asyncio.run(engine._send(None, primary, {}, 0))
+    return classifier._send_openai(primary, {}, 0)
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_hedge_wins_when_primary_is_slow(hedged, use_async):
+    classifier, engine, primary, other, responses = hedged
+    responses.update({primary: (0.5, 200), other: (0.0, 200)})
+    key, result = send(classifier, engine, primary, use_async)
+    assert key == other and result[0] == 200
+    assert classifier.hedge.wins == 1
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_failed_hedge_does_not_win(hedged, use_async):
+    classifier, engine, primary, other, responses = hedged
+    responses.update({primary: (0.2, 200), other: (0.0, 429)})
+    key, result = send(classifier, engine, primary, use_async)
+    assert key == primary and result[0] == 200
+    assert classifier.hedge.wins == 0
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_first_error_is_returned_when_both_fail(hedged, use_async):
+    classifier, engine, primary, other, responses = hedged
+    responses.update({primary: (0.2, 500), other: (0.0, 429)})
+    key, result = send(classifier, engine, primary, use_async)
+    assert key == other and result[0] == 429
+
+def test_budget_is_refunded_without_spare_key(hedged):
+    classifier, engine, primary, other, responses = hedged
+    responses.update({primary: (0.2, 200), other: (0.0, 200)})
+    # 另一个key正在冷却，无法对冲
+    classifier.key_pool.release(other, 429, 0.1, {'Retry-After': '60'})
+    key, result = send(classifier, engine, primary, False)
+    assert key == primary
+    assert classifier.hedge.hedges == 0
+
+def test_losing_request_latency_is_not_observed(hedged):
+    classifier, engine, primary, other, responses = hedged
+    responses.update({primary: (0.3, 200), other: (0.0, 200)})
+    key, _ = classifier._send_openai(primary, {}, 0)
+    assert key == other
+    # 等落后的请求在后台结束，只有胜出一方的延迟进入样本
+    classifier.hedge_executor.shutdown(wait=True)
+    samples = list(classifier.hedge._samples)
+    assert len(samples) == 2 and max(samples) < 0.2
+
+def test_unhedged_request_latency_is_observed(hedged):
+    classifier, engine, primary, other, responses = hedged
+    responses.update({primary: (0.0, 200), other: (0.0, 200)})
+    classifier._send_openai(primary, {}, 0)
+    responses.update({primary: (0.0, 429)})
+    classifier._send_openai(primary, {}, 0)
+    assert len(classifier.hedge._samples) == 2
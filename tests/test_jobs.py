@@ -0,0 +1,58 @@
+import sqlite3
+import time
+import pytest
+from bench.run import seed_database
+from db import Database
+
+NAMES = [f'owner{i}/repo-{i}' for i in range(3)]
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'stars.db'))
+    seed_database(database, 3, 3)
+    database.reset_jobs('classify', NAMES)
+    yield database
+    database.close()
+
+def test_expired_lease_can_be_claimed_by_another_owner(db):
+    assert sorted(db.claim_jobs('classify', 'a', 10, 0.05)) == NAMES
+    assert db.claim_jobs('classify', 'b', 10, 60) == []
+    time.sleep(0.1)
+    assert sorted(db.claim_jobs('classify', 'b', 10, 60)) == NAMES
+    # 原进程的租约已被接手，续约和释放都不再影响这些任务
+    assert db.renew_job_leases('classify', 'a', 60) == 0
+    assert db.release_unfinished_jobs('classify', 'a', 'error') == (0, 0)
+
+def test_failed_job_backs_off(db):
+    db.claim_jobs('classify', 'a', 10, 60)
+    assert db.release_unfinished_jobs('classify', 'a', 'error', backoff_base=10) == (3, 0)
+    assert db.get_job_counts('classify') == {'pending': 3}
+    assert db.claim_jobs('classify', 'a', 10, 60) == []
+    assert 9 < db.next_job_delay('classify') <= 10
+
+def test_job_fails_after_max_attempts(db):
+    for _ in range(2):
+        assert len(db.claim_jobs('classify', 'a', 10, 60)) == 3
+        assert db.release_unfinished_jobs('classify', 'a', 'error', max_attempts=3, backoff_base=0) == (3, 0)
+    assert len(db.claim_jobs('classify', 'a', 10, 60)) == 3
+    assert db.release_unfinished_jobs('classify', 'a', 'error', max_attempts=3, backoff_base=0) == (0, 3)
+    assert db.get_job_counts('classify') == {'failed': 3}
+    assert db.next_job_delay('classify') is None
+
+def test_jobs_for_deleted_repos_are_dropped(db):
+    conn = sqlite3.connect(db.db_path)
+    conn.executemany('DELETE FROM repositories WHERE name = ?', [(name,) for name in NAMES[:2]])
+    conn.commit()
+    conn.close()
+    # 即使先选中的都是已删除仓库的任务，也会继续认领到limit个
+    assert db.claim_jobs('classify', 'a', 1, 60) == NAMES[2:]
+    assert db.get_job_counts('classify') == {'running': 1}
+
+def test_reset_keeps_unfinished_queue(db):
+    # 另一个进程已经建立了队列时不覆盖
+    assert db.reset_jobs('classify', NAMES[:1]) is None
+    assert db.get_job_counts('classify') == {'pending': 3}
+    db.claim_jobs('classify', 'a', 10, 60)
+    db.release_unfinished_jobs('classify', 'a', 'error', max_attempts=1)
+    assert db.reset_jobs('classify', NAMES[:1]) == 1
+    assert db.get_job_counts('classify') == {'pending': 1}
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+import pytest
+import key_pool
+from key_pool import ApiKeyPool, NoAvailableKeyError, parse_reset_duration
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(key_pool, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+@pytest.mark.parametrize('value, seconds', [
+    ('1s', 1), ('6m0s', 360), ('1m30s', 90), ('250ms', 0.25), ('1h2m', 3720), ('2.5', 2.5),
+    (None, None), ('soon', None),
+])
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == seconds
+
+def test_retry_after_cools_down_key(clock):
+    pool = ApiKeyPool(['a'])
+    assert pool.try_acquire() == ('a', 0)
+    pool.release('a', 429, headers={'Retry-After': '30'})
+    assert pool.try_acquire() == (None, 30)
+    clock.now += 30
+    assert pool.try_acquire() == ('a', 0)
+
+def test_rate_limit_reset_header_is_used_without_retry_after(clock):
+    pool = ApiKeyPool(['a'])
+    pool.try_acquire()
+    pool.release('a', 429, headers={'x-ratelimit-reset-requests': '1m30s'})
+    assert pool.try_acquire() == (None, 90)
+
+def test_consecutive_429_doubles_cooldown(clock):
+    pool = ApiKeyPool(['a'], cooldown=10, max_cooldown=25)
+    waits = []
+    for _ in range(3):
+        clock.now += 100
+        pool.try_acquire()
+        pool.release('a', 429)
+        waits.append(pool.try_acquire()[1])
+    assert waits == [10, 20, 25]
+    # 成功后重新从初始冷却时间开始
+    clock.now += 100
+    pool.try_acquire()
+    pool.release('a', 200, latency=0.1)
+    pool.try_acquire()
+    pool.release('a', 429)
+    assert pool.try_acquire() == (None, 10)
+
+def test_exhausted_quota_cools_down_before_429(clock):
+    pool = ApiKeyPool(['a'])
+    pool.try_acquire()
+    pool.release('a', 200, headers={'x-ratelimit-remaining-tokens': '0', 'x-ratelimit-reset-tokens': '250ms'})
+    assert pool.try_acquire() == (None, 0.25)
+
+def test_unauthorized_key_is_disabled(clock):
+    pool = ApiKeyPool(['a', 'b'])
+    key, _ = pool.try_acquire()
+    pool.release(key, 401)
+    other = 'b' if key == 'a' else 'a'
+    for _ in range(3):
+        assert pool.try_acquire() == (other, 0)
+    pool.release(other, 401)
+    with pytest.raises(NoAvailableKeyError):
+        pool.try_acquire()
+
+def test_rpm_budget_blocks_until_window_passes(clock):
+    pool = ApiKeyPool(['a'], rpm=2)
+    for _ in range(2):
+        assert pool.try_acquire() == ('a', 0)
+        pool.release('a', 200)
+        clock.now += 10
+    assert pool.try_acquire() == (None, 40)
+    clock.now += 40
+    assert pool.try_acquire() == ('a', 0)
+
+def test_tpm_budget_uses_actual_usage(clock):
+    pool = ApiKeyPool([{'key': 'a', 'tpm': 1000}])
+    assert pool.try_acquire(600) == ('a', 0)
+    assert pool.try_acquire(600) == (None, 60)
+    # 实际只用了100个token，修正后剩余的额度足够下一个请求
+    pool.release('a', 200, estimated_tokens=600, used_tokens=100)
+    assert pool.try_acquire(600) == ('a', 0)
+
+def test_routes_to_least_loaded_key_and_respects_exclude(clock):
+    pool = ApiKeyPool(['a', 'b'])
+    first, _ = pool.try_acquire()
+    second, _ = pool.try_acquire()
+    assert {first, second} == {'a', 'b'}
+    pool.release('a', 200)
+    assert pool.try_acquire(exclude={'a'}) == ('b', 0)
+    assert pool.try_acquire(exclude={'a', 'b'}, strict=True) == (None, 0)
+    assert pool.try_acquire(exclude={'a', 'b'}) == ('a', 0)
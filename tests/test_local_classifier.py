@@ -0,0 +1,86 @@
+import random
+import numpy as np
+from local_classifier import LocalClassifier, RepoClusterer
+
+GROUPS = {
+    'Web安全': ['xss', 'sqli', 'csrf', 'waf', 'burp', 'payload', 'webshell', 'ssrf'],
+    '云安全': ['kubernetes', 'docker', 'helm', 'terraform', 'aws', 'container', 'iam', 's3'],
+    'AI应用': ['llm', 'agent', 'prompt', 'embedding', 'rag', 'chatbot', 'finetune', 'openai'],
+}
+
+def make_repo(name, words, category=None):
+    return {'name': name, 'description': ' '.join(words[:4]), 'language': 'Python', 'topics': words[4:6],
+            'url': f'https://github.com/{name}', 'readme': ' '.join(words), 'category': category}
+
+def synthetic_repos(per_group=8, seed=0):
+    rng = random.Random(seed)
+    repos = []
+    for group, (category, vocab) in enumerate(GROUPS.items()):
+        for index in range(per_group):
+            words = rng.sample(vocab, 6) + rng.choices(vocab, k=10)
+            repos.append(make_repo(f'group{group}/tool-{index}', words, category))
+    return repos
+
+CLEAR = make_repo('new/xss-scanner', ['xss', 'sqli', 'waf', 'payload', 'burp', 'ssrf'])
+VAGUE = make_repo('new/notes', ['my', 'personal', 'notes'])
+
+def test_fit_uses_only_labelled_repos():
+    repos = synthetic_repos()
+    repos.append(make_repo('other/unlabelled', GROUPS['AI应用']))
+    repos.append(make_repo('other/misc', GROUPS['AI应用'], '其他'))
+    repos += [make_repo(f'rare/{index}', GROUPS['AI应用'], 'DevOps') for index in range(2)]
+    classifier = LocalClassifier(n_features=2 ** 10, min_examples=5)
+    # "其他"不在categories中，DevOps样本少于min_examples，未分类的仓库不参与训练
+    assert classifier.fit(repos, list(GROUPS) + ['DevOps']) == 24
+    assert classifier.labels == list(GROUPS)
+    assert classifier.centroids.shape == (3, 2 ** 10)
+
+def test_too_few_labels_disables_prediction():
+    repos = [repo for repo in synthetic_repos() if repo['category'] == 'Web安全']
+    classifier = LocalClassifier(n_features=2 ** 10)
+    assert classifier.fit(repos, list(GROUPS)) == 0
+    assert classifier.predict([CLEAR]) == []
+
+def test_predict_confidence():
+    classifier = LocalClassifier(n_features=2 ** 10)
+    classifier.fit(synthetic_repos(), list(GROUPS))
+    (clear_category, clear_confidence), (_, vague_confidence) = classifier.predict([CLEAR, VAGUE])
+    assert clear_category == 'Web安全' and clear_confidence >= 0.9
+    assert vague_confidence < 0.5
+
+def test_low_confidence_repos_fall_back_to_llm(make_classifier):
+    classifier = make_classifier(overrides={'local_classifier.threshold': 0.9})
+    classifier._current_category_version()
+    training = synthetic_repos()
+    classifier.db.save_repos(training + [CLEAR, VAGUE])
+    classifier.db.update_repo_classification(
+        [(repo['name'], repo['category'], 'summary', 'fingerprint', 0.9) for repo in training]
+    )
+    remaining = classifier._classify_locally([CLEAR['name'], VAGUE['name']])
+    assert remaining == [VAGUE['name']]
+    repo = classifier.db.get_repos_by_names([CLEAR['name']])[0]
+    assert (repo['category'], repo['classify_source']) == ('Web安全', 'local')
+
+def test_clusters_follow_topics():
+    repos = synthetic_repos(per_group=20)
+    clusters = RepoClusterer(n_clusters=3, n_features=2 ** 10, seed=0).clusters(repos, representatives=4)
+    assert sorted(cluster['size'] for cluster in clusters) == [20, 20, 20]
+    for cluster in clusters:
+        assert len(cluster['repos']) == 4
+        assert len({repo['category'] for repo in cluster['repos']}) == 1
+
+def test_clustering_is_deterministic_with_seed():
+    repos = synthetic_repos(per_group=20)
+
+    def run(seed):
+        clusterer = RepoClusterer(n_clusters=5, n_features=2 ** 10, max_samples=30, seed=seed)
+        clusters = clusterer.clusters(repos, representatives=3)
+        return clusterer.centroids, [(cluster['size'], [repo['name'] for repo in cluster['repos']])
+                                     for cluster in clusters]
+
+    centroids, clusters = run(0)
+    same_centroids, same_clusters = run(0)
+    assert np.array_equal(centroids, same_centroids)
+    assert clusters == same_clusters
+    # 只在max_samples个样本上求质心，但所有仓库都被分配
+    assert sum(size for size, _ in clusters) == len(repos)
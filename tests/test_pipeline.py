@@ -0,0 +1,67 @@
+import threading
+import pytest
+from pipeline import StreamPipeline
+
+class Deferred(Exception):
+    pass
+
+def run(process, source, workers=3, **kwargs):
+    written = []
+
+    def write(batch):
+        written.extend(batch)
+        return len(batch)
+
+    pipeline = StreamPipeline(process, write, workers=workers, queue_size=2, flush_size=5, **kwargs)
+    result = {}
+    # 出错时管线曾经永远阻塞，在线程中运行以便超时失败而不是挂起
+    thread = threading.Thread(target=lambda: result.update(outcome=_capture(pipeline.run, source)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "管线没有结束"
+    return result['outcome'], written
+
+def _capture(fn, *args):
+    try:
+        return fn(*args), None
+    except Exception as e:
+        return None, e
+
+def test_processes_every_item():
+    (value, error), written = run(lambda item: item + 1, range(50))
+    assert error is None
+    assert value == (50, 50, [])
+    assert sorted(written) == list(range(1, 51))
+
+def test_retryable_errors_are_deferred():
+    def process(item):
+        if item % 10 == 0:
+            raise Deferred()
+        return item
+
+    (value, error), written = run(process, range(50), retryable=(Deferred,))
+    assert error is None
+    success, total, deferred = value
+    assert (success, total) == (45, 50)
+    assert sorted(deferred) == [0, 10, 20, 30, 40]
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_unexpected_process_error_is_raised(workers):
+    def process(item):
+        if item == 7:
+            raise ValueError('boom')
+        return item
+
+    (value, error), written = run(process, range(200), workers=workers)
+    assert isinstance(error, ValueError)
+    # 出错前完成的结果仍然写入
+    assert written and 7 not in written
+
+def test_source_error_is_raised():
+    def source():
+        yield from range(10)
+        raise RuntimeError('listing failed')
+
+    (value, error), written = run(lambda item: item + 1, source())
+    assert isinstance(error, RuntimeError)
+    assert sorted(written) == list(range(1, 11))
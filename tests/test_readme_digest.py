@@ -0,0 +1,78 @@
+from db import Database
+from readme_digest import digest_readme, estimate_tokens, iter_readme_lines
+
+README = '''<!-- 徽章 -->
+<p align="center">
+  <img src="logo.png"
+       width="200">
+</p>
+
+# Awesome Scanner [![Build](https://img.shields.io/badge/build-passing-green.svg)](https://ci.example.com)
+
+[![PyPI](https://img.shields.io/pypi/v/scanner.svg)](https://pypi.org/project/scanner)
+![screenshot](docs/screenshot.png)
+
+A **fast** web vulnerability scanner. See the [docs](https://example.com/docs) or https://example.com.
+
+```bash
+pip install scanner --secret-flag
+```
+
+| Feature | Status |
+|---------|:------:|
+| XSS | yes |
+
+- Detects `xss` and sqli
+---
+[docs]: https://example.com/docs
+'''
+
+def test_strips_markup_and_keeps_prose():
+    assert list(iter_readme_lines(README)) == [
+        'Awesome Scanner',
+        'A fast web vulnerability scanner. See the docs or',
+        'Feature Status',
+        'XSS yes',
+        'Detects xss and sqli',
+    ]
+    digest = digest_readme(README)
+    for fragment in ('http', 'img', '<', 'pip install', 'secret-flag', 'shields', '徽章', '#', '**'):
+        assert fragment not in digest
+
+def total_tokens(digest):
+    return sum(estimate_tokens(line) + 1 for line in digest.splitlines())
+
+def test_ascii_budget():
+    text = '\n'.join(f'line {index} ' + 'word ' * 30 for index in range(50))
+    digest = digest_readme(text, max_tokens=100)
+    assert 90 <= total_tokens(digest) <= 100
+    assert digest.startswith('line 0 word')
+
+def test_cjk_budget():
+    text = '\n'.join('这是一个用于测试中文摘录长度的段落' * 3 for _ in range(20))
+    digest = digest_readme(text, max_tokens=60)
+    # 中文大约每字一个token
+    assert 50 <= total_tokens(digest) <= 60
+    assert len(digest.replace('\n', '')) <= 60
+
+def test_empty_and_tiny_budget():
+    assert digest_readme(None) == ''
+    assert digest_readme('![badge](https://x)\n```\ncode\n```') == ''
+    assert digest_readme('word ' * 100, max_tokens=5) == ''
+
+def test_rewrite_stored_raw_readmes(tmp_path):
+    db = Database(str(tmp_path / 'stars.db'))
+    try:
+        db.save_repos([
+            {'name': f'owner/repo-{index}', 'description': '', 'language': '', 'topics': [],
+             'url': '', 'readme': readme}
+            for index, readme in enumerate([README[:500], 'already clean', ''])
+        ])
+        digest = lambda text: digest_readme(text, 200)
+        assert db.rewrite_readmes(digest, chunk_size=1) == 1
+        repos = {repo['name']: repo['readme'] for repo in db.iter_repos(('name', 'readme'))}
+        assert repos == {'owner/repo-0': digest(README[:500]), 'owner/repo-1': 'already clean', 'owner/repo-2': ''}
+        # 摘录再清洗一次不会变化
+        assert db.rewrite_readmes(digest) == 0
+    finally:
+        db.close()
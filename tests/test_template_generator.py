@@ -0,0 +1,52 @@
+import os
+import pytest
+import yaml
+from bench.run import seed_database
+from template_generator import TemplateGenerator
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('config.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'database': {'path': 'stars.db'}}, f)
+    generator = TemplateGenerator()
+    seed_database(generator.db, 20, 10)
+    yield generator
+    generator.db.close()
+
+def rendered(generator, monkeypatch):
+    """记录 iter_render_rows 被调用的次数"""
+    calls = []
+    original = generator.db.iter_render_rows
+
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(generator.db, 'iter_render_rows', wrapper)
+    return calls
+
+@pytest.mark.parametrize('split', [False, True])
+def test_unchanged_data_skips_rendering(generator, monkeypatch, split):
+    calls = rendered(generator, monkeypatch)
+    generator.generate_readme('STAR.md', split=split)
+    generator.generate_readme('STAR.md', split=split)
+    assert len(calls) == 1
+
+    generator.generate_readme('STAR.md', split=split, force=True)
+    assert len(calls) == 2
+
+def test_changes_trigger_rendering(generator, monkeypatch):
+    calls = rendered(generator, monkeypatch)
+    generator.generate_readme('STAR.md')
+    name = 'owner1/repo-1'
+    generator.db.update_repo_classification([(name, 'AI应用', '新的总结', None, 0.9)])
+    generator.generate_readme('STAR.md')
+    assert len(calls) == 2
+    with open('STAR.md', encoding='utf-8') as f:
+        assert '## AI应用' in f.read()
+
+    # 输出文件被删除时重新生成
+    os.remove('STAR.md')
+    generator.generate_readme('STAR.md')
+    assert len(calls) == 3 and os.path.exists('STAR.md')